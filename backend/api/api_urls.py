@@ -19,6 +19,7 @@ router.register(r"buyed_product", views.ProductBuyedViewSet)
 router.register(r"deliver_reciep", views.DeliverReceipViewSet)
 router.register(r"product_received", views.ProductReceivedViewSet)
 router.register(r"package", views.PackageViewSet)
+router.register(r"commission", views.AgentCommissionViewSet)
 urlpatterns = [
     path("", include(router.urls)),
     path("verify_user/<verification_secret>", views.verify_user, name="verify_user"),
@@ -30,5 +31,16 @@ urlpatterns = [
         name="recover_password",
     ),
     path("image_upload/", views.ImageUploadApiView.as_view(), name="image_upload"),
+    path(
+        "image_upload/batch/",
+        views.ImageBatchUploadApiView.as_view(),
+        name="image_upload_batch",
+    ),
+    path(
+        "image_upload/<int:pk>/",
+        views.ImageUploadApiView.as_view(),
+        name="image_upload_status",
+    ),
+    path("report/", views.ReportRollupView.as_view(), name="report"),
     path("security/", views.Protection.as_view(), name="posting_management"),
 ]
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from api import signals  # noqa: F401
+
+        # Las vistas declaran de qué modelos dependen sus caches; también hace
+        # falta en los comandos, que no cargan las URLs
+        from api import views  # noqa: F401
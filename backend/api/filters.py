@@ -1,5 +1,8 @@
+import datetime
 import django_filters
-from django.db.models import Avg, Count, Min, Sum
+from django.db.models import Avg, Case, Count, IntegerField, Min, Q, Sum, Value, When
+from django.utils import timezone
+from django_filters.constants import EMPTY_VALUES
 
 from api.models import (
     CustomUser,
@@ -10,7 +13,56 @@ from api.models import (
     ProductBuyed,
     ProductReceived,
     ShoppingReceip,
+    normalized,
 )
+from api.utils import product_search
+
+
+def day_start(value):
+    """Start of the given day in the current time zone"""
+    return timezone.make_aware(datetime.datetime.combine(value, datetime.time.min))
+
+
+class DayFilter(django_filters.DateFilter):
+    """
+    Filter a datetime field by day with a range on the column itself.
+    `field__date` casts the column on every row and can't use its index.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        start = day_start(value)
+        end = day_start(value + datetime.timedelta(days=1))
+        if self.lookup_expr == "gte":
+            condition = {f"{self.field_name}__gte": start}
+        elif self.lookup_expr == "lte":
+            condition = {f"{self.field_name}__lt": end}
+        else:
+            condition = {f"{self.field_name}__gte": start, f"{self.field_name}__lt": end}
+        if self.distinct:
+            qs = qs.distinct()
+        return self.get_method(qs)(**condition)
+
+
+class NormalizedContainsFilter(django_filters.CharFilter):
+    """
+    Case-insensitive partial match over a lowercase shadow column.
+    The match runs on the narrow (column, id) index and only the matching
+    ids are read from the table.
+    """
+
+    def __init__(self, *args, normalized_field, **kwargs):
+        self.normalized_field = normalized_field
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        matches = qs.model._default_manager.filter(
+            **{f"{self.normalized_field}__contains": normalized(Value(value))}
+        ).values("pk")
+        return qs.filter(pk__in=matches)
 
 
 class UserFilter(django_filters.FilterSet):
@@ -31,65 +83,62 @@ class OrderFilter(django_filters.FilterSet):
         field_name="sales_manager", lookup_expr="name__icontains"
     )
     min_cost = django_filters.NumberFilter(
-        method="filter_total_cost_gte",
+        field_name="products_total_cost", lookup_expr="gte"
     )
     max_cost = django_filters.NumberFilter(
-        method="filter_total_cost_lte",
-    )
-    initial_date = django_filters.DateFilter(
-        field_name="creation_date", lookup_expr="date__gte"
-    )
-    final_date = django_filters.DateFilter(
-        field_name="creation_date", lookup_expr="date__lte"
+        field_name="products_total_cost", lookup_expr="lte"
     )
+    initial_date = DayFilter(field_name="creation_date", lookup_expr="gte")
+    final_date = DayFilter(field_name="creation_date", lookup_expr="lte")
 
     class Meta:
         model = Order
         fields = ["status"]
 
-    def filter_total_cost_gte(self, queryset, name, value):
-        # Annotate the queryset with total_cost
-        queryset = queryset.annotate(sum_of_cost=Sum("products__total_cost", default=0))
-
-        return queryset.filter(sum_of_cost__gte=value)
-
-    def filter_total_cost_lte(self, queryset, name, value):
-        # Annotate the queryset with total_cost
-        queryset = queryset.annotate(sum_of_cost=Sum("products__total_cost", default=0))
-
-        return queryset.filter(sum_of_cost__lte=value)
-
 
 class ProductFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(lookup_expr="icontains")
     description = django_filters.CharFilter(lookup_expr="icontains")
-    category = django_filters.CharFilter(lookup_expr="icontains")
+    category = NormalizedContainsFilter(normalized_field="category_normalized")
     order = django_filters.NumberFilter(field_name="order", lookup_expr="id__exact")
     client_id = django_filters.CharFilter(
         field_name="order", lookup_expr="client__id__exact"
     )
     min_cost = django_filters.NumberFilter(field_name="shop_cost", lookup_expr="gte")
     max_cost = django_filters.NumberFilter(field_name="shop_cost", lookup_expr="lte")
+    q = django_filters.CharFilter(method="filter_search")
 
     class Meta:
         model = Product
         fields = ["sku", "shop__name", "category", "status", "name"]
 
+    def filter_search(self, queryset, name, value):
+        # q es el último filtro declarado: recibe lo que dejaron los demás
+        # Sin índice de texto completo se recurre a icontains, sin ranking
+        if not product_search.is_supported(queryset.db):
+            return queryset.filter(
+                Q(name__icontains=value)
+                | Q(description__icontains=value)
+                | Q(category_normalized__contains=normalized(Value(value)))
+            )
+        ids = product_search.search_products(value, queryset)
+        if not ids:
+            return queryset.none()
+        rank = Case(
+            *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+            output_field=IntegerField(),
+        )
+        return queryset.filter(pk__in=ids).annotate(search_rank=rank).order_by("search_rank")
+
 
 class DeliverReceipFilter(django_filters.FilterSet):
     order = django_filters.NumberFilter(field_name="order", lookup_expr="id__exact")
     client = django_filters.CharFilter(
         field_name="order", lookup_expr="client__id__exact"
     )
-    deliver_date = django_filters.DateFilter(
-        field_name="deliver_date", lookup_expr="date"
-    )
-    initial_date = django_filters.DateFilter(
-        field_name="deliver_date", lookup_expr="date__gte"
-    )
-    final_date = django_filters.DateFilter(
-        field_name="deliver_date", lookup_expr="date__lte"
-    )
+    deliver_date = DayFilter(field_name="deliver_date")
+    initial_date = DayFilter(field_name="deliver_date", lookup_expr="gte")
+    final_date = DayFilter(field_name="deliver_date", lookup_expr="lte")
     min_weight = django_filters.NumberFilter(field_name="weight", lookup_expr="gte")
     max_weight = django_filters.NumberFilter(field_name="weight", lookup_expr="lte")
 
@@ -108,13 +157,9 @@ class ShoppingReceipFilter(django_filters.FilterSet):
     state = django_filters.CharFilter(
         field_name="status_of_shopping", lookup_expr="state__icontains"
     )
-    buy_date = django_filters.DateFilter(field_name="buy_date", lookup_expr="date")
-    initial_date = django_filters.DateFilter(
-        field_name="buy_date", lookup_expr="date__gte"
-    )
-    final_date = django_filters.DateFilter(
-        field_name="buy_date", lookup_expr="date__lte"
-    )
+    buy_date = DayFilter(field_name="buy_date")
+    initial_date = DayFilter(field_name="buy_date", lookup_expr="gte")
+    final_date = DayFilter(field_name="buy_date", lookup_expr="lte")
     min_cost = django_filters.NumberFilter(
         method="filter_total_cost_gte",
     )
@@ -149,7 +194,7 @@ class ShoppingReceipFilter(django_filters.FilterSet):
 
 
 class PackageFilter(django_filters.FilterSet):
-    agency_name = django_filters.CharFilter(lookup_expr="icontains")
+    agency_name = NormalizedContainsFilter(normalized_field="agency_name_normalized")
     contained_products = django_filters.ModelMultipleChoiceFilter(
         field_name="contained_products",
         to_field_name="id",
@@ -0,0 +1,96 @@
+"Medir los bytes y el tiempo que ahorra preparar las imágenes"
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+from api.utils.image_processing import pool_context, preprocess_image, remove_files
+
+
+def camera_photo(path, width=4000, height=3000):
+    """Noisy photo-like JPEG the size a phone camera produces"""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    photo = Image.merge("RGB", (gradient, noise, gradient.rotate(180)))
+    photo.save(path, "JPEG", quality=95)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the local preprocessing of images before upload"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths", nargs="*", help="Images to process; synthetic photos if none"
+        )
+        parser.add_argument(
+            "--count", type=int, default=8, help="Synthetic photos to generate"
+        )
+        parser.add_argument(
+            "--mbps",
+            type=float,
+            default=10,
+            help="Upload bandwidth used to estimate the transfer time",
+        )
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = options["paths"]
+            if not paths:
+                paths = [
+                    os.path.join(directory, f"photo{number}.jpg")
+                    for number in range(options["count"])
+                ]
+                for path in paths:
+                    camera_photo(path)
+            self.benchmark(paths, options["mbps"])
+
+    def benchmark(self, paths, mbps):
+        arguments = (
+            settings.IMAGE_MAX_DIMENSION,
+            settings.IMAGE_FORMAT,
+            settings.IMAGE_QUALITY,
+            settings.IMAGE_THUMBNAIL_SIZE,
+        )
+        original_bytes = processed_bytes = 0
+        started = time.perf_counter()
+        for path in paths:
+            image_path, thumbnail_path = preprocess_image(path, *arguments)
+            original_bytes += os.path.getsize(path)
+            processed_bytes += os.path.getsize(image_path)
+            processed_bytes += os.path.getsize(thumbnail_path)
+            remove_files(image_path, thumbnail_path)
+        sequential = time.perf_counter() - started
+
+        workers = max(settings.IMAGE_PROCESS_WORKERS, 1)
+        started = time.perf_counter()
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=pool_context()
+        ) as executor:
+            futures = [
+                executor.submit(preprocess_image, path, *arguments) for path in paths
+            ]
+            for future in futures:
+                remove_files(*future.result())
+        pooled = time.perf_counter() - started
+
+        def transfer(size):
+            return size * 8 / (mbps * 1_000_000)
+
+        saved = transfer(original_bytes) - transfer(processed_bytes)
+        self.stdout.write(f"Imágenes: {len(paths)}")
+        self.stdout.write(
+            f"Bytes: {original_bytes} originales, {processed_bytes} preparados "
+            f"({processed_bytes / original_bytes:.1%})"
+        )
+        self.stdout.write(
+            f"Preparación: {sequential:.2f}s en serie, "
+            f"{pooled:.2f}s con {workers} procesos"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Subida a {mbps:g} Mbps: {saved:.2f}s ahorrados "
+                f"({saved / len(paths):.2f}s por imagen)"
+            )
+        )
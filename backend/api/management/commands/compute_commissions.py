@@ -0,0 +1,22 @@
+"Calcular las comisiones de los agentes"
+from django.core.management.base import BaseCommand
+from api.utils.agent_commissions import compute_commissions
+
+
+class Command(BaseCommand):
+    help = "Compute the monthly commission statements of agents"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Recompute every month instead of only those that changed",
+        )
+
+    def handle(self, *args, **options):
+        created, updated, deleted = compute_commissions(full=options["full"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{created} estados creados, {updated} actualizados, {deleted} eliminados"
+            )
+        )
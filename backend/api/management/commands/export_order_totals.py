@@ -0,0 +1,33 @@
+"Exportar los totales contables de los pedidos"
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from api.utils.accounting_export import csv_lines, order_totals_rows, write_parquet
+
+
+class Command(BaseCommand):
+    help = "Export cost, received value and extra payments per order as CSV or Parquet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=["csv", "parquet"], default="csv", dest="file_format"
+        )
+        parser.add_argument(
+            "--output", help="Destination file, standard output by default (CSV only)"
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        rows = order_totals_rows(chunk_size=options["chunk_size"])
+        if options["file_format"] == "parquet":
+            if not options["output"]:
+                raise CommandError("El formato parquet necesita --output")
+            try:
+                write_parquet(rows, options["output"])
+            except ImportError as e:
+                raise CommandError("Instala pyarrow para exportar en parquet") from e
+            return
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as file:
+                file.writelines(csv_lines(rows))
+            return
+        sys.stdout.writelines(csv_lines(rows))
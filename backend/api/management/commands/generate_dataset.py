@@ -0,0 +1,81 @@
+"Generar datos sintéticos para pruebas de carga"
+import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.models import CustomUser
+from api.utils.dataset import EMAIL_DOMAIN, DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a reproducible set of clients, agents, orders "
+        "and their buys, receptions and deliveries"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--products",
+            type=int,
+            default=10000,
+            help="Number of products, e.g. 10000, 100000 or 1000000",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--clients", type=int, help="Defaults to one per 20 products"
+        )
+        parser.add_argument(
+            "--agents", type=int, help="Defaults to one per 2000 products"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Products written per transaction",
+        )
+        parser.add_argument(
+            "--start",
+            type=datetime.date.fromisoformat,
+            default=datetime.date(2024, 1, 1),
+            help="First day of the orders (YYYY-MM-DD)",
+        )
+        parser.add_argument("--months", type=int, default=12)
+        parser.add_argument(
+            "--yes",
+            action="store_true",
+            help=(
+                "Run with DEBUG off too; clients and agents get the known "
+                "password of the dataset"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["yes"]:
+            raise CommandError(
+                "DEBUG está desactivado: los clientes y agentes generados tienen "
+                "una contraseña conocida. Use --yes si es lo que desea"
+            )
+        if options["products"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("La cantidad de productos y el lote deben ser positivos")
+        if CustomUser.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}").exists():
+            raise CommandError(
+                f"Ya hay usuarios @{EMAIL_DOMAIN}, use una base de datos vacía"
+            )
+        generator = DatasetGenerator(
+            options["products"],
+            seed=options["seed"],
+            clients=options["clients"],
+            agents=options["agents"],
+            chunk_size=options["chunk_size"],
+            start=options["start"],
+            months=options["months"],
+        )
+        counts = generator.generate(
+            progress=lambda counts: self.stdout.write(
+                f"{counts['products']}/{options['products']} productos"
+            )
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                ", ".join(f"{count} {name}" for name, count in counts.items())
+            )
+        )
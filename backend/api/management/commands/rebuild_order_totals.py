@@ -0,0 +1,29 @@
+"Reconstruir el costo total almacenado de los pedidos"
+from django.core.management.base import BaseCommand, CommandError
+from api.utils.order_totals import refresh_order_totals, stale_orders
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify the stored products total cost of orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report orders whose stored total drifted, without writing",
+        )
+
+    def handle(self, *args, **options):
+        stale = stale_orders()
+        if options["check"]:
+            for order in stale:
+                self.stdout.write(
+                    f"Pedido {order.id}: guardado {order.products_total_cost}, "
+                    f"calculado {order.computed_total}"
+                )
+            if stale:
+                raise CommandError(f"{len(stale)} pedidos con costo desactualizado")
+            self.stdout.write(self.style.SUCCESS("Todos los costos son correctos"))
+            return
+        refresh_order_totals([order.id for order in stale])
+        self.stdout.write(self.style.SUCCESS(f"{len(stale)} pedidos corregidos"))
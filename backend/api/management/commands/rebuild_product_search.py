@@ -0,0 +1,13 @@
+"Reconstruir el índice de búsqueda de productos"
+from django.core.management.base import BaseCommand, CommandError
+from api.utils.product_search import index_products, is_supported
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of products"
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            raise CommandError("La base de datos no tiene índice de búsqueda")
+        index_products()
+        self.stdout.write(self.style.SUCCESS("Índice de búsqueda reconstruido"))
@@ -0,0 +1,32 @@
+"Reconstruir los totales acumulados de los productos"
+from django.core.management.base import BaseCommand, CommandError
+from api.utils.product_status import update_product_statuses
+from api.utils.product_totals import refresh_product_totals, stale_products
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify the stored bought, received and delivered totals of products"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report products whose stored totals drifted, without writing",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            stale = stale_products()
+            for product in stale:
+                self.stdout.write(f"Totales desactualizados en el producto {product.id}")
+            if stale:
+                raise CommandError(f"{len(stale)} productos con totales desactualizados")
+            self.stdout.write(self.style.SUCCESS("Todos los totales son correctos"))
+            return
+        stale = refresh_product_totals()
+        changed = update_product_statuses([product.id for product in stale])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(stale)} productos corregidos, {len(changed)} estados actualizados"
+            )
+        )
@@ -0,0 +1,27 @@
+"Reconstruir los resúmenes mensuales de reportes"
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from api.utils.report_rollups import rebuild_rollups, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the monthly report rollups, all of them or only some months"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--month",
+            action="append",
+            default=[],
+            help="Month to refresh as YYYY-MM; can be repeated",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            months = [
+                datetime.datetime.strptime(month, "%Y-%m").date()
+                for month in options["month"]
+            ]
+        except ValueError as e:
+            raise CommandError("Los meses deben tener el formato YYYY-MM") from e
+        periods = refresh_rollups(months) if months else rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f"{len(periods)} meses recalculados"))
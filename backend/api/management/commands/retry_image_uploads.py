@@ -0,0 +1,18 @@
+"Reintentar las subidas de imágenes pendientes"
+from django.core.management.base import BaseCommand
+from api.utils.image_uploads import requeue_uploads
+
+
+class Command(BaseCommand):
+    help = "Enqueue again the image uploads left pending, e.g. after a restart"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--failed",
+            action="store_true",
+            help="Also retry the uploads that ran out of attempts",
+        )
+
+    def handle(self, *args, **options):
+        ids = requeue_uploads(include_failed=options["failed"])
+        self.stdout.write(self.style.SUCCESS(f"{len(ids)} imágenes en cola"))
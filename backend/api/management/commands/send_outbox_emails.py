@@ -0,0 +1,47 @@
+"Enviar los correos de la bandeja de salida"
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.utils.email_outbox import RateLimiter, send_pending
+
+
+class Command(BaseCommand):
+    help = "Send the pending emails of the outbox, once or in a loop"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Emails claimed at a time (EMAIL_OUTBOX_BATCH_SIZE by default)",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=None,
+            help="Maximum emails per second (EMAIL_SEND_RATE by default)",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the outbox instead of exiting when it is empty",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds between polls with --loop",
+        )
+
+    def handle(self, *args, **options):
+        rate = options["rate"]
+        limiter = RateLimiter(settings.EMAIL_SEND_RATE if rate is None else rate)
+        while True:
+            sent, failed = send_pending(options["batch_size"], limiter)
+            if sent or failed or not options["loop"]:
+                self.stdout.write(
+                    self.style.SUCCESS(f"{sent} correos enviados, {failed} sin enviar")
+                )
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,29 @@
+"Enviar a los clientes el resumen de cambios de estado"
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.utils.status_notifications import send_status_digests
+
+
+class Command(BaseCommand):
+    help = (
+        "Queue one digest email per client with their pending status changes; "
+        "send_outbox_emails delivers them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Build a digest every STATUS_DIGEST_WINDOW seconds",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            read, queued = send_status_digests()
+            self.stdout.write(
+                self.style.SUCCESS(f"{read} cambios en {queued} resúmenes")
+            )
+            if not options["loop"]:
+                return
+            time.sleep(settings.STATUS_DIGEST_WINDOW)
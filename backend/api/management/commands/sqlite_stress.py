@@ -0,0 +1,43 @@
+"Probar el perfil de SQLite con escritores concurrentes"
+import os
+import tempfile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.utils.sqlite_stress import run_writers
+
+
+class Command(BaseCommand):
+    help = "Stress a temporary SQLite file with parallel writers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=16)
+        parser.add_argument("--writes", type=int, default=100)
+        parser.add_argument(
+            "--baseline",
+            action="store_true",
+            help="Also run with the stock SQLite settings to compare",
+        )
+
+    def handle(self, *args, **options):
+        profiles = [("perfil", settings.SQLITE_OPTIONS)]
+        if options["baseline"]:
+            profiles.append(("sin perfil", {}))
+        failed = False
+        for name, sqlite_options in profiles:
+            with tempfile.TemporaryDirectory() as directory:
+                result = run_writers(
+                    os.path.join(directory, "stress.sqlite3"),
+                    options["writers"],
+                    options["writes"],
+                    sqlite_options,
+                )
+            expected = options["writers"] * options["writes"]
+            self.stdout.write(
+                f"{name}: {result['committed']}/{expected} transacciones, "
+                f"{len(result['errors'])} errores, {result['seconds']:.2f}s "
+                f"({result['committed'] / result['seconds']:.0f} por segundo)"
+            )
+            failed |= name == "perfil" and result["committed"] != expected
+        if failed:
+            raise CommandError("El perfil de SQLite perdió escrituras")
+        self.stdout.write(self.style.SUCCESS("Todas las escrituras confirmadas"))
@@ -1,4 +1,7 @@
+from django.apps import apps
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import models
+from django.db.models import Prefetch
 from django.utils.translation import gettext_lazy as _
 
 
@@ -33,3 +36,40 @@ class CustomUserManager(BaseUserManager):
         if extra_fields.get("is_superuser") is not True:
             raise ValueError(_("Superuser must have is_superuser=True."))
         return self.create_user(name, email, password, **extra_fields)
+
+
+class OrderQuerySet(models.QuerySet):
+    """Queryset of orders with helpers for bulk serialization"""
+
+    def with_related_graph(self):
+        """
+        Load products, delivery receipts, delivered products, shops and
+        pictures of the orders with a fixed number of queries, so every
+        computed field of the serializer can be resolved in memory.
+        """
+        product_model = apps.get_model("api", "Product")
+        products = product_model.objects.select_related(
+            "shop", "order"
+        ).prefetch_related("product_pictures")
+        return self.select_related("client", "sales_manager").prefetch_related(
+            Prefetch("products", queryset=products),
+            "delivery_receipts__delivered_products",
+            Prefetch(
+                "delivery_receipts__delivered_products__original_product",
+                queryset=products,
+            ),
+        )
+
+
+class ShoppingReceipQuerySet(models.QuerySet):
+    """Queryset of shopping receips with helpers for bulk serialization"""
+
+    def with_related_graph(self):
+        """Load the buyed products of the receips and their original products"""
+        buyed_model = apps.get_model("api", "ProductBuyed")
+        buys = buyed_model.objects.select_related(
+            "order", "original_product__shop", "original_product__order"
+        ).prefetch_related("original_product__product_pictures")
+        return self.select_related("shopping_account", "shop_of_buy").prefetch_related(
+            Prefetch("buyed_products", queryset=buys)
+        )
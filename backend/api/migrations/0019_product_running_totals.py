@@ -0,0 +1,66 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:05
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_running_totals(apps, schema_editor):
+    Product = apps.get_model('api', 'Product')
+    ProductBuyed = apps.get_model('api', 'ProductBuyed')
+    ProductReceived = apps.get_model('api', 'ProductReceived')
+
+    def total(model, field, output_field):
+        totals = (
+            model.objects.filter(original_product=OuterRef('pk'))
+            .values('original_product')
+            .annotate(total=Sum(field))
+            .values('total')
+        )
+        return Coalesce(
+            Subquery(totals, output_field=output_field), 0, output_field=output_field
+        )
+
+    Product.objects.update(
+        total_amount_buyed=total(ProductBuyed, 'amount_buyed', models.IntegerField()),
+        total_cost_buyed=total(
+            ProductBuyed, 'actual_cost_of_product', models.FloatField()
+        ),
+        total_amount_received=total(
+            ProductReceived, 'amount_received', models.IntegerField()
+        ),
+        total_amount_delivered=total(
+            ProductReceived, 'amount_delivered', models.IntegerField()
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_shoppingreceip_store_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='total_amount_buyed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='total_amount_delivered',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='total_amount_received',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='total_cost_buyed',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(fill_running_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,130 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:16
+
+from django.db import migrations, models
+
+# Índices de trigramas para los filtros parciales, solo en PostgreSQL.
+# Las expresiones son las que genera Django: contains compara "col"::text e
+# icontains compara UPPER("col"::text).
+TRIGRAM_INDEXES = (
+    ('api_product', 'product_category_trgm_idx', '(category_normalized::text)'),
+    ('api_product', 'product_name_trgm_idx', '(UPPER(name::text))'),
+    ('api_package', 'package_agency_trgm_idx', '(agency_name_normalized::text)'),
+    ('api_customuser', 'user_name_trgm_idx', '(UPPER(name::text))'),
+)
+
+
+def fill_normalized_columns(apps, schema_editor):
+    Product = apps.get_model('api', 'Product')
+    Package = apps.get_model('api', 'Package')
+
+    # lower() de SQLite solo conoce ASCII, por eso se normaliza en Python
+    for model, source, target in (
+        (Product, 'category', 'category_normalized'),
+        (Package, 'agency_name', 'agency_name_normalized'),
+    ):
+        changed = []
+        for obj in model.objects.only('pk', source).iterator(chunk_size=2000):
+            setattr(obj, target, (getattr(obj, source) or '').lower())
+            changed.append(obj)
+        model.objects.bulk_update(changed, [target], batch_size=2000)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Las operaciones de extensiones de Django fallan al revertir en SQLite
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, name, expression in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'USING gin ({expression} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _table, name, _expression in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_product_running_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='agency_name_normalized',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='category_normalized',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='deliverreceip',
+            index=models.Index(fields=['status', 'deliver_date'], name='deliver_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deliverreceip',
+            index=models.Index(fields=['deliver_date', 'id'], name='deliver_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'creation_date'], name='order_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['creation_date', 'id'], name='order_creation_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['number_of_tracking'], name='package_tracking_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['status_of_processing'], name='package_processing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['agency_name_normalized', 'id'], name='package_agency_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['order', 'status'], name='product_order_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status'], name='product_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['sku'], name='product_sku_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category'], name='product_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category_normalized', 'id'], name='product_category_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productbuyed',
+            index=models.Index(fields=['buy_date', 'id'], name='buyed_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingreceip',
+            index=models.Index(fields=['status_of_shopping', 'buy_date'], name='shopping_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingreceip',
+            index=models.Index(fields=['buy_date', 'id'], name='shopping_date_idx'),
+        ),
+        migrations.RunPython(fill_normalized_columns, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
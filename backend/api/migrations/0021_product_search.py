@@ -0,0 +1,55 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:40
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        # remove_diacritics 2 iguala "cafe" y "café"; prefix acelera "zap*"
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE api_product_search USING fts5('
+            'product_id UNINDEXED, name, category, description, '
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        schema_editor.execute(
+            'INSERT INTO api_product_search (product_id, name, category, description) '
+            "SELECT id, name, COALESCE(category, ''), COALESCE(description, '') "
+            'FROM api_product'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+        schema_editor.execute(
+            'CREATE TABLE api_product_search ('
+            'product_id uuid PRIMARY KEY REFERENCES api_product (id) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX api_product_search_document_idx '
+            'ON api_product_search USING gin (document)'
+        )
+        schema_editor.execute(
+            'INSERT INTO api_product_search (product_id, document) '
+            'SELECT id, '
+            "setweight(to_tsvector('spanish', unaccent(name)), 'A') || "
+            "setweight(to_tsvector('spanish', unaccent(COALESCE(category, ''))), 'B') || "
+            "setweight(to_tsvector('spanish', unaccent(COALESCE(description, ''))), 'C') "
+            'FROM api_product'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS api_product_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:20
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_products_total_cost(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    Product = apps.get_model('api', 'Product')
+
+    totals = (
+        Product.objects.filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(total=Sum('total_cost'))
+        .values('total')
+    )
+    Order.objects.update(
+        products_total_cost=Coalesce(
+            Subquery(totals, output_field=models.FloatField()),
+            0.0,
+            output_field=models.FloatField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='products_total_cost',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['products_total_cost', 'id'], name='order_total_cost_idx'),
+        ),
+        migrations.RunPython(fill_products_total_cost, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('shop', 'Tienda'), ('buying_account', 'Cuenta de compra'), ('sales_manager', 'Agente')], max_length=20)),
+                ('key', models.CharField(blank=True, default='', max_length=100)),
+                ('spend', models.FloatField(default=0)),
+                ('revenue', models.FloatField(default=0)),
+                ('weight', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'period', 'key'), name='report_rollup_unique')],
+            },
+        ),
+    ]
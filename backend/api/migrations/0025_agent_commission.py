@@ -0,0 +1,41 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_report_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentCommission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('orders_count', models.IntegerField(default=0)),
+                ('sales', models.FloatField(default=0)),
+                ('rate', models.FloatField(default=0)),
+                ('commission', models.FloatField(default=0)),
+                ('stale', models.BooleanField(default=False)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='order_updated_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='agentcommission',
+            name='agent',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='commissions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='agentcommission',
+            constraint=models.UniqueConstraint(fields=('agent', 'period'), name='agent_commission_unique'),
+        ),
+    ]
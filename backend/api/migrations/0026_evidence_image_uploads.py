@@ -0,0 +1,38 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_agent_commission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evidenceimages',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='evidenceimages',
+            name='error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='evidenceimages',
+            name='local_path',
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='evidenceimages',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pendiente'), ('uploaded', 'Subida'), ('failed', 'Fallida')], default='uploaded', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='evidenceimages',
+            name='image_url',
+            field=models.URLField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_evidence_image_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evidenceimages',
+            name='thumbnail_public_id',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='evidenceimages',
+            name='thumbnail_url',
+            field=models.URLField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxemail',
+            name='kind',
+            field=models.CharField(choices=[('verification', 'Verificación de cuenta'), ('password_recovery', 'Recuperación de contraseña'), ('status_digest', 'Resumen de estados')], max_length=50),
+        ),
+        migrations.CreateModel(
+            name='StatusChangeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous_status', models.CharField(max_length=100)),
+                ('status', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to=settings.AUTH_USER_MODEL)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='api.order')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='api.product')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('notified_at', None)), fields=['id'], name='status_event_pending_idx')],
+            },
+        ),
+    ]
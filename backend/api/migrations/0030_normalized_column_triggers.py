@@ -0,0 +1,93 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:58
+
+from django.db import migrations
+
+
+# Las columnas en minúsculas pasan de save() a triggers, que cubren también
+# update(), bulk_create() y bulk_update(). En SQLite se disparan después de
+# cada INSERT y de cada UPDATE de la columna de origen o la normalizada que la
+# deje desfasada; en PostgreSQL, antes de cada INSERT y de cada UPDATE de esas
+# columnas. No se usa GeneratedField porque SQLite nunca usa como índice de
+# cobertura uno sobre una columna generada.
+#
+# El SQL queda copiado aquí para que la migración no cambie con el código de
+# api.utils.normalized_columns.
+NORMALIZED = (
+    "LOWER(COALESCE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE("
+    "{value}, 'Á', 'á'), 'É', 'é'), 'Í', 'í'), 'Ó', 'ó'), 'Ú', 'ú'), "
+    "'Ü', 'ü'), 'Ñ', 'ñ'), ''))"
+)
+
+COLUMNS = (
+    ('api_product', 'category', 'category_normalized'),
+    ('api_package', 'agency_name', 'agency_name_normalized'),
+)
+
+
+def sqlite_statements(table, source, target):
+    value = NORMALIZED.format(value=f'NEW.{source}')
+    normalize = f'UPDATE {table} SET {target} = {value} WHERE rowid = NEW.rowid;'
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS {table}_{target}_insert '
+        f'AFTER INSERT ON {table} BEGIN {normalize} END',
+        f'CREATE TRIGGER IF NOT EXISTS {table}_{target}_update '
+        f'AFTER UPDATE OF {source}, {target} ON {table} '
+        f'WHEN NEW.{target} IS NOT {value} BEGIN {normalize} END',
+    ]
+
+
+def postgresql_statements(table, source, target):
+    value = NORMALIZED.format(value=f'NEW.{source}')
+    return [
+        f'CREATE OR REPLACE FUNCTION {table}_{target}_fn() RETURNS trigger AS $$ '
+        f'BEGIN NEW.{target} := {value}; RETURN NEW; END; $$ LANGUAGE plpgsql',
+        f'CREATE OR REPLACE TRIGGER {table}_{target}_trigger '
+        f'BEFORE INSERT OR UPDATE OF {source}, {target} ON {table} '
+        f'FOR EACH ROW EXECUTE FUNCTION {table}_{target}_fn()',
+    ]
+
+
+STATEMENTS = {
+    'sqlite': sqlite_statements,
+    'postgresql': postgresql_statements,
+}
+
+
+def create_triggers(apps, schema_editor):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for table, source, target in COLUMNS:
+        for statement in statements(table, source, target):
+            schema_editor.execute(statement)
+        schema_editor.execute(
+            f'UPDATE {table} SET {target} = {NORMALIZED.format(value=source)}'
+        )
+
+
+def drop_triggers(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, _source, target in COLUMNS:
+        if vendor == 'sqlite':
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_{target}_insert')
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_{target}_update')
+        elif vendor == 'postgresql':
+            schema_editor.execute(
+                f'DROP TRIGGER IF EXISTS {table}_{target}_trigger ON {table}'
+            )
+            schema_editor.execute(f'DROP FUNCTION IF EXISTS {table}_{target}_fn()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_status_change_events'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_category_idx',
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
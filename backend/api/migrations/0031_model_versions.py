@@ -0,0 +1,20 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_normalized_column_triggers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelVersion',
+            fields=[
+                ('label', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
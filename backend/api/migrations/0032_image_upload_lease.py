@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0031_model_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evidenceimages',
+            name='lease_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='evidenceimages',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pendiente'), ('uploading', 'Subiendo'), ('uploaded', 'Subida'), ('failed', 'Fallida')], default='uploaded', max_length=20),
+        ),
+    ]
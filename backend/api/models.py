@@ -3,13 +3,29 @@
 import uuid
 from django.utils import timezone
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Lower, Replace
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.utils.translation import gettext_lazy as _
-from api.managers import CustomUserManager
+from api.managers import CustomUserManager, OrderQuerySet, ShoppingReceipQuerySet
 
 # Create your models here.
 
 
+# Mayúsculas que lower() de SQLite no convierte por ser solo ASCII
+ACCENTED_CAPITALS = "ÁÉÍÓÚÜÑ"
+
+
+def normalized(expression):
+    """
+    Lowercase of a text expression, computed by the database like the
+    shadow columns the partial-match filters compare it with.
+    """
+    for capital in ACCENTED_CAPITALS:
+        expression = Replace(expression, Value(capital), Value(capital.lower()))
+    return Lower(expression)
+
+
 class CustomUser(AbstractBaseUser, PermissionsMixin):
     """Custom user model"""
 
@@ -64,31 +80,38 @@ class Order(models.Model):
     status = models.CharField(max_length=100, default="Encargado")
     pay_status = models.CharField(max_length=100, default="No pagado")
     creation_date = models.DateTimeField(default=timezone.now, null=True, blank=True)
+    # Suma de total_cost de los productos, mantenida por api.signals
+    products_total_cost = models.FloatField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "creation_date"], name="order_status_date_idx"),
+            models.Index(fields=["creation_date", "id"], name="order_creation_date_idx"),
+            models.Index(fields=["products_total_cost", "id"], name="order_total_cost_idx"),
+            models.Index(fields=["updated_at"], name="order_updated_at_idx"),
+        ]
 
     def __str__(self):
         return "Pedido #" + str(self.pk) + " creado por " + str(self.client.name)
 
     def total_cost(self):
         """Total cost of order"""
-        cost = 0
-        if self.products.all():
-            for i in self.products.all():
-                cost += i.total_cost
-        return cost
+        return self.products_total_cost
 
-    def received_value_of_client(self):
+    def received_value_of_client(self, cost_per_pound=None):
         """Total value of objects receives by client"""
         value = 0
         if self.delivery_receipts.all():
             for i in self.delivery_receipts.all():
-                value += i.total_cost_of_deliver()
+                value += i.total_cost_of_deliver(cost_per_pound)
         return value
 
-    def extra_payments(self):
+    def extra_payments(self, cost_per_pound=None):
         """Extra payment in case of excedent or missing"""
-        return self.received_value_of_client() - self.total_cost()
+        return self.received_value_of_client(cost_per_pound) - self.total_cost()
 
-    objects = models.Manager()
+    objects = OrderQuerySet.as_manager()
 
 
 class Shop(models.Model):
@@ -97,6 +120,7 @@ class Shop(models.Model):
     name = models.CharField(max_length=100, unique=True)
     link = models.URLField(unique=True)
     taxes = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     objects = models.Manager()
 
@@ -105,6 +129,7 @@ class BuyingAccounts(models.Model):
     """Accounts for buying in Shops"""
 
     account_name = models.CharField(max_length=100, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     objects = models.Manager()
 
@@ -114,6 +139,7 @@ class CommonInformation(models.Model):
 
     change_rate = models.FloatField(default=0)
     cost_per_pound = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     objects = models.Manager()
 
@@ -128,8 +154,29 @@ class CommonInformation(models.Model):
 class EvidenceImages(models.Model):
     """Images for products"""
 
+    PENDING = "pending"
+    UPLOADING = "uploading"
+    UPLOADED = "uploaded"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pendiente"),
+        (UPLOADING, "Subiendo"),
+        (UPLOADED, "Subida"),
+        (FAILED, "Fallida"),
+    ]
+
     public_id = models.CharField(max_length=200, null=True)
-    image_url = models.URLField()
+    image_url = models.URLField(blank=True, default="")
+    thumbnail_public_id = models.CharField(max_length=200, null=True, blank=True)
+    thumbnail_url = models.URLField(blank=True, default="")
+
+    # Subidas en segundo plano: la copia local se borra al subirla
+    status = models.CharField(max_length=20, choices=STATUSES, default=UPLOADED)
+    local_path = models.CharField(max_length=500, null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    # Hasta cuándo la reclama el hilo que la sube; vencida, se puede reencolar
+    lease_until = models.DateTimeField(null=True, blank=True)
 
     objects = models.Manager()
 
@@ -160,6 +207,38 @@ class Product(models.Model):
     added_taxes = models.FloatField(default=0)
     total_cost = models.FloatField(default=0)
 
+    # Running totals of buys and delivers, kept by api.signals
+    total_amount_buyed = models.IntegerField(default=0)
+    total_cost_buyed = models.FloatField(default=0)
+    total_amount_received = models.IntegerField(default=0)
+    total_amount_delivered = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Copia en minúsculas de category para búsquedas parciales indexables,
+    # la mantienen triggers de la base de datos (migración 0030)
+    category_normalized = models.CharField(
+        max_length=200, blank=True, default="", editable=False
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["order", "status"], name="product_order_status_idx"),
+            models.Index(fields=["status"], name="product_status_idx"),
+            models.Index(fields=["sku"], name="product_sku_idx"),
+            models.Index(
+                fields=["category_normalized", "id"],
+                name="product_category_norm_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            # auto_now solo se guarda si el campo está en update_fields
+            kwargs["update_fields"] = {*update_fields, "updated_at"}
+        super().save(*args, **kwargs)
+
     # def total_cost(self):
     #     """Total cost of product"""
     #     return (
@@ -173,71 +252,29 @@ class Product(models.Model):
     objects = models.Manager()
 
     def set_status_aut(self):
-        count_of_buy = 0
-        count_of_received = 0
-        count_of_delivered = 0
-        for product in self.buys.all():
-            count_of_buy += product.amount_buyed
-        for product in self.delivers.all():
-            count_of_received = product.amount_received
-        for product in self.delivers.all():
-            count_of_delivered = product.amount_delivered
-        if count_of_delivered == self.amount_requested:
-            self.status = "Entregado"
-            self.save()
-            return
-        if count_of_received == self.amount_requested and count_of_delivered > 0:
-            self.status = "Parcialmente Entregado"
-            self.save()
-            return
-        if count_of_received == self.amount_requested:
-            self.status = "Recibido"
-            self.save()
-            return
-        if count_of_buy == self.amount_requested and count_of_received > 0:
-            self.status = "Parcialmente Recibido"
-            self.save()
-            return
-        if count_of_buy == self.amount_requested:
-            self.status = "Comprado"
-            self.save()
-            return
-        if count_of_buy > 0:
-            self.status = "Parcialmente comprado"
-            self.save()
-            return
-        self.status = "Encargado"
-        self.save()
+        """Recompute and store the status from buys and delivers"""
+        from api.utils.product_status import update_product_statuses
+
+        update_product_statuses([self.pk])
+        self.refresh_from_db(fields=["status"])
 
     def cost_per_product(self):
         """Cost after payment for product"""
-        cost = 0
-        ocurrences = 0
-        for i in self.buys.all():
-            cost += i.actual_cost_of_product
-            ocurrences += i.amount_buyed
-        return float(cost / ocurrences) if ocurrences > 0 else 0
+        if self.total_amount_buyed > 0:
+            return float(self.total_cost_buyed / self.total_amount_buyed)
+        return 0
 
     def amount_buyed(self):
         """Amount of product buyed"""
-        amount = 0
-        for i in self.buys.all():
-            amount += i.amount_buyed
-        return amount
+        return self.total_amount_buyed
 
     def amount_received(self):
         """Amount of product received"""
-        amount = 0
-        for i in self.delivers.all():
-            amount += i.amount_received
-        return amount
+        return self.total_amount_received
 
     def amount_delivered(self):
         """Amount of product delivered"""
-        amount = 0
-        for i in self.delivers.all():
-            amount += i.amount_delivered
-        return amount
+        return self.total_amount_delivered
 
 
 class ShoppingReceip(models.Model):
@@ -250,7 +287,16 @@ class ShoppingReceip(models.Model):
     shop_of_buy = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="buys")
     status_of_shopping = models.CharField(max_length=100, default="No pagado")
     buy_date = models.DateTimeField(default=timezone.now)
-    objects = models.Manager()
+    objects = ShoppingReceipQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status_of_shopping", "buy_date"],
+                name="shopping_status_date_idx",
+            ),
+            models.Index(fields=["buy_date", "id"], name="shopping_date_idx"),
+        ]
 
     def total_cost_of_shopping(self):
         """Total cost of shopping"""
@@ -271,11 +317,21 @@ class DeliverReceip(models.Model):
     deliver_date = models.DateTimeField(default=timezone.now)
     deliver_picture = models.ManyToManyField(EvidenceImages, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "deliver_date"], name="deliver_status_date_idx"),
+            models.Index(fields=["deliver_date", "id"], name="deliver_date_idx"),
+        ]
+
     objects = models.Manager()
 
-    def total_cost_of_deliver(self):
+    def total_cost_of_deliver(self, cost_per_pound=None):
         """Total cost of delivered objects"""
-        cost = self.weight * CommonInformation.objects.get(pk=2).cost_per_pound
+        if cost_per_pound is None:
+            from api.utils.common_information_cache import get_common_information
+
+            cost_per_pound = get_common_information().cost_per_pound
+        cost = self.weight * cost_per_pound
         for i in self.delivered_products.all():
             cost += i.original_product.cost_per_product() * i.amount_received
         return cost
@@ -289,8 +345,26 @@ class Package(models.Model):
     status_of_processing = models.CharField(max_length=100, default="Enviado")
     package_picture = models.ManyToManyField(EvidenceImages, blank=True)
 
+    # Copia en minúsculas de agency_name para búsquedas parciales indexables,
+    # la mantienen triggers de la base de datos (migración 0030)
+    agency_name_normalized = models.CharField(
+        max_length=100, blank=True, default="", editable=False
+    )
+
     objects = models.Manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["number_of_tracking"], name="package_tracking_idx"),
+            models.Index(
+                fields=["status_of_processing"], name="package_processing_idx"
+            ),
+            models.Index(
+                fields=["agency_name_normalized", "id"],
+                name="package_agency_norm_idx",
+            ),
+        ]
+
 
 class ProductBuyed(models.Model):
     """Buyed Products"""
@@ -314,6 +388,11 @@ class ProductBuyed(models.Model):
 
     objects = models.Manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["buy_date", "id"], name="buyed_date_idx"),
+        ]
+
     # def real_cost_of_product(self):
     #     return (
     #         self.original_product.total_cost()
@@ -348,3 +427,153 @@ class ProductReceived(models.Model):
     observation = models.TextField(max_length=200, null=True)
 
     objects = models.Manager()
+
+
+class ReportRollup(models.Model):
+    """Monthly spend, revenue and delivered weight per reporting dimension"""
+
+    TOTAL = "total"
+    SHOP = "shop"
+    BUYING_ACCOUNT = "buying_account"
+    SALES_MANAGER = "sales_manager"
+    DIMENSIONS = [
+        (TOTAL, "Total"),
+        (SHOP, "Tienda"),
+        (BUYING_ACCOUNT, "Cuenta de compra"),
+        (SALES_MANAGER, "Agente"),
+    ]
+
+    # Primer día del mes, en la zona horaria del proyecto
+    period = models.DateField()
+    dimension = models.CharField(max_length=20, choices=DIMENSIONS)
+    # Id de la tienda, cuenta o agente; vacío para el total
+    key = models.CharField(max_length=100, blank=True, default="")
+    spend = models.FloatField(default=0)
+    revenue = models.FloatField(default=0)
+    weight = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dimension", "period", "key"], name="report_rollup_unique"
+            )
+        ]
+
+
+class AgentCommission(models.Model):
+    """Commission statement of an agent for the orders of one month"""
+
+    agent = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="commissions"
+    )
+    # Primer día del mes de creación de los pedidos
+    period = models.DateField()
+    orders_count = models.IntegerField(default=0)
+    sales = models.FloatField(default=0)
+    # agent_profit del agente al calcular, en porcentaje
+    rate = models.FloatField(default=0)
+    commission = models.FloatField(default=0)
+    # Marcado por api.signals cuando un pedido sale del agente o del mes
+    stale = models.BooleanField(default=False)
+    # Inicio del cálculo que escribió la fila; marca hasta dónde se vieron cambios
+    computed_at = models.DateTimeField()
+
+    objects = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["agent", "period"], name="agent_commission_unique"
+            )
+        ]
+
+
+class OutboxEmail(models.Model):
+    """Email written with the data that triggers it and sent by a worker"""
+
+    VERIFICATION = "verification"
+    PASSWORD_RECOVERY = "password_recovery"
+    STATUS_DIGEST = "status_digest"
+    KINDS = [
+        (VERIFICATION, "Verificación de cuenta"),
+        (PASSWORD_RECOVERY, "Recuperación de contraseña"),
+        (STATUS_DIGEST, "Resumen de estados"),
+    ]
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pendiente"),
+        (SENT, "Enviado"),
+        (FAILED, "Fallido"),
+    ]
+
+    kind = models.CharField(max_length=50, choices=KINDS)
+    to_email = models.EmailField()
+    # Variables de la plantilla; se renderiza al enviar
+    context = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUSES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    # Un worker que toma el correo lo aplaza mientras lo envía
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"], name="outbox_status_due_idx"
+            ),
+        ]
+
+
+class StatusChangeEvent(models.Model):
+    """Status change of a product or order waiting to be told to its client"""
+
+    client = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="status_events"
+    )
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="status_events"
+    )
+    # Vacío cuando cambió el estado del pedido
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="status_events",
+    )
+    previous_status = models.CharField(max_length=100)
+    status = models.CharField(max_length=100)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Momento en que entró en un resumen enviado al cliente
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(notified_at=None),
+                name="status_event_pending_idx",
+            ),
+        ]
+
+
+class ModelVersion(models.Model):
+    """Counter bumped after each committed change to the rows of a model"""
+
+    # app_label.model_name
+    label = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    objects = models.Manager()
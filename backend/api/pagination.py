@@ -0,0 +1,153 @@
+"Paginación por cursor sobre claves estables"
+import base64
+import datetime
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    # isoformat conserva los microsegundos, necesarios para comparar claves
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a stable key such as (creation_date, id).
+    Each page is read with a range condition on the key instead of an
+    offset, so deep pages cost the same as the first one.
+    Views choose the key with `keyset_ordering`, which must end in a unique
+    field, and may offer other keys in `keyset_orderings` selected with the
+    `ordering` query parameter.
+    """
+
+    cursor_query_param = "cursor"
+    ordering_query_param = "ordering"
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = ("-id",)
+    invalid_cursor_message = "Cursor inválido"
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, "REST_FRAMEWORK", {}).get("PAGE_SIZE") or 50
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def get_ordering(self, request, view):
+        orderings = getattr(view, "keyset_orderings", {})
+        requested = request.query_params.get(self.ordering_query_param)
+        if requested in orderings:
+            return tuple(orderings[requested])
+        return tuple(getattr(view, "keyset_ordering", self.ordering))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            values = [
+                None if value is None else field.to_python(value)
+                for field, value in zip(self.fields, cursor["p"], strict=True)
+            ]
+            return values, bool(cursor["r"])
+        except (TypeError, ValueError, KeyError, DjangoValidationError) as e:
+            raise NotFound(self.invalid_cursor_message) from e
+
+    def encode_cursor(self, obj, reverse):
+        values = [getattr(obj, field.attname) for field in self.fields]
+        cursor = json.dumps({"p": values, "r": int(reverse)}, default=_encode_value)
+        encoded = base64.urlsafe_b64encode(cursor.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def order_by(self, queryset, reverse):
+        expressions = []
+        for field, descending in zip(self.fields, self.descending):
+            descending = descending != reverse
+            if field.null:
+                # Los nulos quedan al final en el sentido normal de la lista
+                nulls = {"nulls_first": True} if reverse else {"nulls_last": True}
+                expression = F(field.name)
+                expressions.append(
+                    expression.desc(**nulls) if descending else expression.asc(**nulls)
+                )
+            else:
+                expressions.append(f"-{field.name}" if descending else field.name)
+        return queryset.order_by(*expressions)
+
+    def after(self, values, reverse):
+        """Condition selecting the rows that come after `values`"""
+        condition = None
+        for field, descending, value in reversed(
+            list(zip(self.fields, self.descending, values))
+        ):
+            descending = descending != reverse
+            nulls_last = field.null and not reverse
+            if value is None:
+                # Nada viene después de los nulos salvo al recorrer hacia atrás
+                beyond = Q(**{f"{field.name}__isnull": False}) if reverse else Q(pk__in=[])
+                equal = Q(**{f"{field.name}__isnull": True})
+            else:
+                beyond = Q(**{f"{field.name}__{'lt' if descending else 'gt'}": value})
+                if nulls_last:
+                    beyond |= Q(**{f"{field.name}__isnull": True})
+                equal = Q(**{field.name: value})
+            if condition is not None:
+                beyond |= equal & condition
+            condition = beyond
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = self.get_ordering(request, view)
+        model = queryset.model
+        self.fields = [model._meta.get_field(key.lstrip("-")) for key in ordering]
+        self.descending = [key.startswith("-") for key in ordering]
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), self.cursor_query_param
+        )
+        page_size = self.get_page_size(request)
+
+        values, reverse = self.decode_cursor(request)
+        queryset = self.order_by(queryset, reverse)
+        if values is not None:
+            queryset = queryset.filter(self.after(values, reverse))
+        rows = list(queryset[: page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next = None
+        self.previous = None
+        if rows:
+            if has_more or reverse:
+                self.next = self.encode_cursor(rows[-1], reverse=False)
+            if values is not None and (has_more or not reverse):
+                self.previous = self.encode_cursor(rows[0], reverse=True)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(
+            {"next": self.next, "previous": self.previous, "results": data}
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -2,10 +2,7 @@
 from rest_framework.fields import ValidationError
 from rest_framework import permissions
 from rest_framework.permissions import BasePermission
-from django.contrib.auth.models import User
-from django.contrib.auth import get_user_model
-
-User = get_user_model()
+from api.permissions.roles import get_user_roles
 
 
 class ReadOnlyorPost(BasePermission):
@@ -22,91 +19,55 @@ class ReadOnly(BasePermission):
         return request.method in permissions.SAFE_METHODS
 
 
-class AgentPermission(BasePermission):
-    """Clase de permisos de agente"""
+class RolePermission(BasePermission):
+    """Clase base de permisos por rol"""
+
+    role = None
+    error_message = None
+
+    def has_role(self, request):
+        roles = get_user_roles(request)
+        if roles is None:
+            raise ValidationError(self.error_message)
+        return roles[self.role]
 
     def has_permission(self, request, view):
-        try:
-            user = User.objects.get(id=request.user.id)
-            return user.is_agent
-        except Exception as e:
-            raise ValidationError("El usuario no es un agente") from e
+        return self.has_role(request)
 
     def has_object_permission(self, request, view, obj):
-        try:
-            user = User.objects.get(id=request.user.id)
-            return user.is_agent
-        except Exception as e:
-            raise ValidationError("El usuario no es un agente") from e
+        return self.has_role(request)
 
 
-class AccountantPermission(BasePermission):
+class AgentPermission(RolePermission):
     """Clase de permisos de agente"""
 
-    def has_permission(self, request, view):
-        try:
-            user = User.objects.get(id=request.user.id)
-            return user.is_accountant
-        except Exception as e:
-            raise ValidationError("El usuario no es un contador") from e
-
-    def has_object_permission(self, request, view, obj):
-        try:
-            user = User.objects.get(id=request.user.id)
-            return user.is_accountant
-        except Exception as e:
-            raise ValidationError("El usuario no es un contador") from e
+    role = "is_agent"
+    error_message = "El usuario no es un agente"
 
 
-class BuyerPermission(BasePermission):
+class AccountantPermission(RolePermission):
     """Clase de permisos de agente"""
 
-    def has_permission(self, request, view):
-        try:
-            user = User.objects.get(id=request.user.id)
-            return user.is_buyer
-        except Exception as e:
-            raise ValidationError("El usuario no es un comprador") from e
-
-    def has_object_permission(self, request, view, obj):
-        try:
-            user = User.objects.get(id=request.user.id)
-            return user.is_buyer
-        except Exception as e:
-            raise ValidationError("El usuario no es un comprador") from e
+    role = "is_accountant"
+    error_message = "El usuario no es un contador"
 
 
-class LogisticalPermission(BasePermission):
+class BuyerPermission(RolePermission):
     """Clase de permisos de agente"""
 
-    def has_permission(self, request, view):
-        try:
-            user = User.objects.get(id=request.user.id)
-            return user.is_logistical
-        except Exception as e:
-            raise ValidationError("El usuario no es un comprador") from e
+    role = "is_buyer"
+    error_message = "El usuario no es un comprador"
 
-    def has_object_permission(self, request, view, obj):
-        try:
-            user = User.objects.get(id=request.user.id)
-            return user.is_logistical
-        except Exception as e:
-            raise ValidationError("El usuario no es un comprador") from e
 
-
-class AdminPermission(BasePermission):
+class LogisticalPermission(RolePermission):
     """Clase de permisos de agente"""
 
-    def has_permission(self, request, view):
-        try:
-            user = User.objects.get(id=request.user.id)
-            return user.is_staff
-        except Exception as e:
-            raise ValidationError("El usuario no es un administrador") from e
+    role = "is_logistical"
+    error_message = "El usuario no es un comprador"
 
-    def has_object_permission(self, request, view, obj):
-        try:
-            user = User.objects.get(id=request.user.id)
-            return user.is_staff
-        except Exception as e:
-            raise ValidationError("El usuario no es un administrador") from e
+
+class AdminPermission(RolePermission):
+    """Clase de permisos de agente"""
+
+    role = "is_staff"
+    error_message = "El usuario no es un administrador"
@@ -0,0 +1,66 @@
+"Roles del usuario resueltos una vez por petición"
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+User = get_user_model()
+
+ROLE_FIELDS = (
+    "is_agent",
+    "is_accountant",
+    "is_buyer",
+    "is_logistical",
+    "is_comunity_manager",
+    "is_staff",
+)
+
+
+def roles_cache_key(user_id):
+    return f"api:user_roles:{user_id}"
+
+
+def _roles_cache():
+    """
+    Shared cache configured for the role flags, if any. A per-process cache
+    would keep a revoked role alive in the workers that did not write it.
+    """
+    alias = getattr(settings, "USER_ROLES_CACHE_ALIAS", None)
+    return caches[alias] if alias else None
+
+
+def get_user_roles(request):
+    """
+    Role flags of the request user, or None if the user does not exist.
+    They are read once per request and, when USER_ROLES_CACHE_ALIAS is set,
+    kept in that cache for USER_ROLES_CACHE_TIMEOUT seconds.
+    """
+    if hasattr(request, "_user_roles"):
+        return request._user_roles
+    user_id = getattr(request.user, "id", None)
+    roles = None
+    if user_id is not None:
+        shared = _roles_cache()
+        key = roles_cache_key(user_id)
+        if shared is not None:
+            roles = shared.get(key)
+        if roles is None:
+            # Lo que se guarda en la caché se lee de la primaria, no de una réplica
+            roles = (
+                User.objects.using(DEFAULT_DB_ALIAS)
+                .filter(id=user_id)
+                .values(*ROLE_FIELDS)
+                .first()
+            )
+            if roles is not None and shared is not None:
+                timeout = getattr(settings, "USER_ROLES_CACHE_TIMEOUT", 60)
+                shared.set(key, roles, timeout)
+    request._user_roles = roles
+    return roles
+
+
+def invalidate_user_roles(user_id):
+    """Forget the cached roles of a user after they change"""
+    shared = _roles_cache()
+    if shared is not None:
+        shared.delete(roles_cache_key(user_id))
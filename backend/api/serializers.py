@@ -1,4 +1,9 @@
+from collections import defaultdict
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils.encoding import smart_str
 from django.utils.translation import gettext_lazy as _
 from api.models import (
     CommonInformation,
@@ -13,10 +18,83 @@ from api.models import (
     ProductReceived,
     Order,
     EvidenceImages,
+    AgentCommission,
 )
+from api.utils.common_information_cache import get_common_information
+from api.utils.filter_cache import bump_model_versions_on_commit
+from api.utils.product_totals import refresh_product_totals
+from api.utils.report_rollups import add_to_rollups
 import re
 
 
+class BulkSlugRelatedField(serializers.SlugRelatedField):
+    """Slug related field that takes the objects loaded by BulkListSerializer"""
+
+    def to_key(self, value):
+        return self.queryset.model._meta.get_field(self.slug_field).to_python(value)
+
+    def load(self, values, lock=False):
+        """Load every object referenced by `values` with one query"""
+        keys = set()
+        for value in values:
+            try:
+                keys.add(self.to_key(value))
+            except (DjangoValidationError, TypeError, ValueError):
+                continue
+        queryset = self.get_queryset()
+        if lock:
+            queryset = queryset.select_for_update()
+        objects = queryset.filter(**{f"{self.slug_field}__in": keys})
+        return {getattr(obj, self.slug_field): obj for obj in objects}
+
+    def to_internal_value(self, data):
+        loaded = self.context.get("loaded_objects", {}).get(self.field_name)
+        if loaded is None:
+            return super().to_internal_value(data)
+        try:
+            return loaded[self.to_key(data)]
+        except KeyError:
+            self.fail("does_not_exist", slug_name=self.slug_field, value=smart_str(data))
+        except (DjangoValidationError, TypeError, ValueError):
+            self.fail("invalid")
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    List serializer that resolves the related objects of all the lines with
+    one query per field and validates limits across the whole payload.
+    """
+
+    # Campos cuyas filas se bloquean dentro de una transacción
+    lock_fields = ()
+
+    def load_related(self, data):
+        loaded = self.context.setdefault("loaded_objects", {})
+        lock = transaction.get_connection().in_atomic_block
+        for name, field in self.child.fields.items():
+            if field.read_only or not isinstance(field, BulkSlugRelatedField):
+                continue
+            values = {
+                row[name]
+                for row in data
+                if isinstance(row, dict) and isinstance(row.get(name), (str, int))
+            }
+            loaded[name] = field.load(values, lock=lock and name in self.lock_fields)
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.load_related(data)
+        lines = super().to_internal_value(data)
+        errors = self.validate_lines(lines)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return lines
+
+    def validate_lines(self, lines):
+        """Validation across lines, returns one error dict per line"""
+        return []
+
+
 class UserSerializer(serializers.ModelSerializer):
     user_id = serializers.IntegerField(source="id", read_only=True)
     email = serializers.EmailField(write_only=True)
@@ -106,7 +184,6 @@ class ProductSerializer(serializers.ModelSerializer):
             "name",
             "link",
             "shop",
-            "set_status_aut",
             "description",
             "observation",
             "category",
@@ -203,6 +280,8 @@ class OrderSerializer(serializers.ModelSerializer):
         },
     )
     products = ProductSerializer(many=True, read_only=True)
+    received_value_of_client = serializers.SerializerMethodField(read_only=True)
+    extra_payments = serializers.SerializerMethodField(read_only=True)
     received_products = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -225,13 +304,28 @@ class OrderSerializer(serializers.ModelSerializer):
         depth = 0
         read_only_fields = ["id"]
 
+    @staticmethod
+    def graph_context():
+        """Context for serializing orders loaded with `with_related_graph`"""
+        return {"cost_per_pound": get_common_information().cost_per_pound}
+
+    def get_received_value_of_client(self, obj):
+        return obj.received_value_of_client(self.context.get("cost_per_pound"))
+
+    def get_extra_payments(self, obj):
+        return obj.extra_payments(self.context.get("cost_per_pound"))
+
     def get_received_products(self, obj):
         """Total products recieved"""
         prodlist = []
         if obj.delivery_receipts.all().exists():
             for deliver_receip in obj.delivery_receipts.all():
                 for product in deliver_receip.delivered_products.all():
-                    prodlist.append(ProductSerializer(product.original_product).data)
+                    prodlist.append(
+                        ProductSerializer(
+                            product.original_product, context=self.context
+                        ).data
+                    )
 
         return prodlist
 
@@ -262,6 +356,46 @@ class BuyingAccountsSerializer(serializers.ModelSerializer):
         fields = ["account_name"]
 
 
+class EvidenceImagesSerializer(serializers.ModelSerializer):
+    """Image and the state of its upload"""
+
+    class Meta:
+        """Class of model"""
+
+        model = EvidenceImages
+        fields = [
+            "id",
+            "public_id",
+            "image_url",
+            "thumbnail_url",
+            "status",
+            "attempts",
+            "error",
+        ]
+        read_only_fields = fields
+
+
+class AgentCommissionSerializer(serializers.ModelSerializer):
+    """Commission statement of an agent for one month"""
+
+    class Meta:
+        """Class of model"""
+
+        model = AgentCommission
+        fields = [
+            "id",
+            "agent",
+            "period",
+            "orders_count",
+            "sales",
+            "rate",
+            "commission",
+            "stale",
+            "computed_at",
+        ]
+        read_only_fields = fields
+
+
 class CommonInformationSerializer(serializers.ModelSerializer):
     """Common information introduced for the admin"""
 
@@ -272,10 +406,44 @@ class CommonInformationSerializer(serializers.ModelSerializer):
         fields = ["change_rate", "cost_per_pound"]
 
 
+class ProductBuyedListSerializer(BulkListSerializer):
+    """Bulk creation of the products of a shopping receip"""
+
+    lock_fields = ("original_product",)
+
+    def validate_lines(self, lines):
+        buyed = defaultdict(int)
+        errors = []
+        for line in lines:
+            product = line["original_product"]
+            buyed[product.pk] += line["amount_buyed"]
+            if product.amount_buyed() + buyed[product.pk] > product.amount_requested:
+                errors.append(
+                    {
+                        api_settings.NON_FIELD_ERRORS_KEY: [
+                            "La cantidad comprada no puede ser mayor a la solicitada."
+                        ]
+                    }
+                )
+            else:
+                errors.append({})
+        return errors
+
+    def create(self, validated_data):
+        buys = ProductBuyed.objects.bulk_create(
+            [ProductBuyed(**line) for line in validated_data]
+        )
+        # bulk_create no emite señales: los totales y la cache se actualizan aquí
+        refresh_product_totals({buy.original_product_id for buy in buys})
+        bump_model_versions_on_commit(ProductBuyed)
+        add_to_rollups(ProductBuyed, [buy.pk for buy in buys])
+        return buys
+
+
 class ProductBuyedSerializer(serializers.ModelSerializer):
     """Product buyed by the agent"""
 
-    original_product = serializers.SlugRelatedField(
+    original_product = BulkSlugRelatedField(
         queryset=Product.objects.all(),
         slug_field="id",
         error_messages={
@@ -285,7 +453,7 @@ class ProductBuyedSerializer(serializers.ModelSerializer):
         write_only=True,
     )
     original_product_details = serializers.SerializerMethodField(read_only=True)
-    order = serializers.SlugRelatedField(
+    order = BulkSlugRelatedField(
         queryset=Order.objects.all(),
         slug_field="id",
         error_messages={
@@ -293,7 +461,7 @@ class ProductBuyedSerializer(serializers.ModelSerializer):
             "invalid": "El valor proporcionado para el pedido no es válido.",
         },
     )
-    shoping_receip = serializers.SlugRelatedField(
+    shoping_receip = BulkSlugRelatedField(
         queryset=ShoppingReceip.objects.all(),
         slug_field="id",
         error_messages={
@@ -321,9 +489,10 @@ class ProductBuyedSerializer(serializers.ModelSerializer):
             "original_product_details",
         ]
         read_only_fields = ["id"]
+        list_serializer_class = ProductBuyedListSerializer
 
     def get_original_product_details(self, obj):
-        return ProductSerializer(obj.original_product).data
+        return ProductSerializer(obj.original_product, context=self.context).data
 
     def validate(self, attrs):
         if attrs["amount_buyed"] <= 0:
@@ -377,10 +546,43 @@ class ShoppingReceipSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
+class ProductReceivedListSerializer(BulkListSerializer):
+    """Bulk intake of the products of a package"""
+
+    lock_fields = ("original_product",)
+
+    def validate_lines(self, lines):
+        received = defaultdict(int)
+        errors = []
+        for line in lines:
+            product = line["original_product"]
+            received[product.pk] += line["amount_received"]
+            if product.amount_received() + received[product.pk] > product.amount_requested:
+                errors.append(
+                    {
+                        api_settings.NON_FIELD_ERRORS_KEY: [
+                            "La cantidad recibida no puede ser mayor a la solicitada."
+                        ]
+                    }
+                )
+            else:
+                errors.append({})
+        return errors
+
+    def create(self, validated_data):
+        receptions = ProductReceived.objects.bulk_create(
+            [ProductReceived(**line) for line in validated_data]
+        )
+        # bulk_create no emite señales: los totales y la cache se actualizan aquí
+        refresh_product_totals({line.original_product_id for line in receptions})
+        bump_model_versions_on_commit(ProductReceived)
+        return receptions
+
+
 class ProductReceivedSerializer(serializers.ModelSerializer):
     """Product delivered and received by the logistical"""
 
-    original_product = serializers.SlugRelatedField(
+    original_product = BulkSlugRelatedField(
         queryset=Product.objects.all(),
         slug_field="id",
         error_messages={
@@ -392,7 +594,7 @@ class ProductReceivedSerializer(serializers.ModelSerializer):
     original_product_detail = ProductSerializer(
         source="original_product", read_only=True
     )
-    order = serializers.SlugRelatedField(
+    order = BulkSlugRelatedField(
         queryset=Order.objects.all(),
         slug_field="id",
         error_messages={
@@ -400,7 +602,7 @@ class ProductReceivedSerializer(serializers.ModelSerializer):
             "invalid": "El valor proporcionado para el pedido no es válido.",
         },
     )
-    package_where_was_send = serializers.SlugRelatedField(
+    package_where_was_send = BulkSlugRelatedField(
         queryset=Package.objects.all(),
         slug_field="id",
         error_messages={
@@ -408,7 +610,7 @@ class ProductReceivedSerializer(serializers.ModelSerializer):
             "invalid": "El valor proporcionado para el paquete no es válido.",
         },
     )
-    deliver_receip = serializers.SlugRelatedField(
+    deliver_receip = BulkSlugRelatedField(
         queryset=DeliverReceip.objects.all(),
         slug_field="id",
         error_messages={
@@ -434,6 +636,7 @@ class ProductReceivedSerializer(serializers.ModelSerializer):
             "observation",
         ]
         read_only_fields = ["id"]
+        list_serializer_class = ProductReceivedListSerializer
 
     def validate(self, attrs):
         if attrs.get("amount_received") and attrs.get("original_product"):
@@ -466,6 +669,89 @@ class ProductReceivedSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class ProductDeliveryListSerializer(BulkListSerializer):
+    """Bulk delivery of received products"""
+
+    lock_fields = ("id",)
+
+    def validate_lines(self, lines):
+        seen = set()
+        delivered = {}
+        errors = []
+        for line in lines:
+            reception = line["id"]
+            product = reception.original_product
+            if reception.pk in seen:
+                errors.append(
+                    {
+                        "id": [
+                            f"El producto recibido {reception.pk} está repetido en la entrega."
+                        ]
+                    }
+                )
+                continue
+            seen.add(reception.pk)
+            # El valor nuevo reemplaza al que ya tenía la línea
+            total = delivered.get(product.pk, product.amount_delivered())
+            total += line["amount_delivered"] - reception.amount_delivered
+            delivered[product.pk] = total
+            if total > product.amount_received():
+                errors.append(
+                    {
+                        "amount_delivered": [
+                            f"La cantidad entregada no puede ser mayor a la recibida en el producto {product.id}."
+                        ]
+                    }
+                )
+            else:
+                errors.append({})
+        return errors
+
+    def create(self, validated_data):
+        """Store the delivered amounts on the existing received products"""
+        receptions = []
+        for line in validated_data:
+            reception = line["id"]
+            reception.amount_delivered = line["amount_delivered"]
+            reception.deliver_receip = line.get("deliver_receip")
+            receptions.append(reception)
+        ProductReceived.objects.bulk_update(
+            receptions, ["amount_delivered", "deliver_receip"]
+        )
+        refresh_product_totals({line.original_product_id for line in receptions})
+        bump_model_versions_on_commit(ProductReceived)
+        return receptions
+
+
+class ProductDeliverySerializer(serializers.Serializer):
+    """Amount delivered of a received product"""
+
+    id = BulkSlugRelatedField(
+        queryset=ProductReceived.objects.select_related("original_product"),
+        slug_field="id",
+        error_messages={
+            "does_not_exist": "El producto recibido {value} no existe.",
+            "invalid": "El valor proporcionado para el producto recibido no es válido.",
+        },
+    )
+    amount_delivered = serializers.IntegerField()
+
+    class Meta:
+        list_serializer_class = ProductDeliveryListSerializer
+
+    def validate(self, attrs):
+        reception = attrs["id"]
+        if attrs["amount_delivered"] <= 0:
+            raise serializers.ValidationError(
+                f"La cantidad entregada debe ser un número positivo en el producto {reception.original_product.id}."
+            )
+        if attrs["amount_delivered"] > reception.amount_received:
+            raise serializers.ValidationError(
+                f"La cantidad entregada no puede ser mayor a la recibida en el producto {reception.original_product.id}."
+            )
+        return attrs
+
+
 class DeliverReceipSerializer(serializers.ModelSerializer):
     """Deliver Receip Serializer"""
 
@@ -0,0 +1,276 @@
+"Señales de la API"
+from django.db import connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from api.models import (
+    CommonInformation,
+    CustomUser,
+    DeliverReceip,
+    Order,
+    Product,
+    ProductBuyed,
+    ProductReceived,
+    ShoppingReceip,
+)
+from api.permissions.roles import invalidate_user_roles
+from api.utils.agent_commissions import mark_commissions_stale
+from api.utils.common_information_cache import invalidate_common_information
+from api.utils.filter_cache import (
+    VERSIONED_MODELS,
+    bump_model_versions_on_commit,
+    versioned,
+)
+from api.utils.normalized_columns import install_triggers
+from api.utils.order_totals import refresh_order_totals
+from api.utils.product_search import index_products, remove_products
+from api.utils.product_totals import refresh_product_totals
+from api.utils.report_rollups import (
+    apply_rollup_deltas,
+    contributions,
+    move_rollups,
+    rollup_values,
+)
+from api.utils.status_notifications import record_status_changes
+
+
+@receiver(pre_save, sender=ProductBuyed)
+@receiver(pre_save, sender=ProductReceived)
+def remember_previous_product(sender, instance, **kwargs):
+    """Keep the product a line belonged to before being moved to another one"""
+    instance._previous_product_id = None
+    if instance.pk:
+        instance._previous_product_id = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("original_product_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=ProductBuyed)
+@receiver(post_save, sender=ProductReceived)
+def refresh_totals_on_save(sender, instance, **kwargs):
+    """Update the running totals of the products touched by the line"""
+    refresh_product_totals(
+        [instance.original_product_id, getattr(instance, "_previous_product_id", None)]
+    )
+
+
+@receiver(post_delete, sender=ProductBuyed)
+@receiver(post_delete, sender=ProductReceived)
+def refresh_totals_on_delete(sender, instance, **kwargs):
+    """Update the running totals of the product of a deleted line"""
+    refresh_product_totals([instance.original_product_id])
+
+
+SEARCHED_PRODUCT_FIELDS = {"name", "category", "description"}
+ORDER_TOTAL_FIELDS = {"order", "total_cost"}
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_order(sender, instance, update_fields=None, **kwargs):
+    """Keep the order and cost a product had before this save"""
+    instance._previous_order_cost = None
+    if instance._state.adding or (
+        update_fields is not None and not ORDER_TOTAL_FIELDS & set(update_fields)
+    ):
+        return
+    instance._previous_order_cost = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list("order_id", "total_cost")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Product)
+def refresh_order_total_on_save(sender, instance, created, **kwargs):
+    """Update the stored cost of the orders touched by the product"""
+    previous = getattr(instance, "_previous_order_cost", None)
+    if not created and previous is None:
+        return
+    if previous == (instance.order_id, instance.total_cost):
+        return
+    refresh_order_totals([instance.order_id, previous and previous[0]])
+
+
+@receiver(post_delete, sender=Product)
+def refresh_order_total_on_delete(sender, instance, **kwargs):
+    """Update the stored cost of the order of a deleted product"""
+    refresh_order_totals([instance.order_id])
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, update_fields=None, **kwargs):
+    """Keep the search document of the product in step with its text"""
+    if update_fields is None or SEARCHED_PRODUCT_FIELDS & set(update_fields):
+        index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search(sender, instance, **kwargs):
+    """Drop the search document of a deleted product"""
+    remove_products([instance.pk])
+
+
+@receiver(pre_save, sender=ProductBuyed)
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=DeliverReceip)
+@receiver(pre_delete, sender=ProductBuyed)
+@receiver(pre_delete, sender=Product)
+@receiver(pre_delete, sender=DeliverReceip)
+def remember_previous_rollup_values(sender, instance, **kwargs):
+    """Keep what a row added to the report rollups before this save or delete"""
+    instance._previous_rollup_values = []
+    if not instance._state.adding:
+        instance._previous_rollup_values = rollup_values(sender, pk=instance.pk)
+
+
+@receiver(pre_save, sender=Order)
+def remember_previous_order_report(sender, instance, **kwargs):
+    """Keep the month, sales manager and status an order had before this save"""
+    instance._previous_report = None
+    instance._previous_status = None
+    if not instance._state.adding:
+        previous = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("creation_date", "sales_manager_id", "status")
+            .first()
+        )
+        if previous:
+            instance._previous_report = previous[:2]
+            instance._previous_status = previous[2]
+
+
+@receiver(post_save, sender=ProductBuyed)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=DeliverReceip)
+def update_rollups_on_save(sender, instance, **kwargs):
+    """Move the amount of the row from its old month and keys to the new ones"""
+    previous = getattr(instance, "_previous_rollup_values", [])
+    apply_rollup_deltas(
+        contributions(sender, previous, -1),
+        contributions(sender, rollup_values(sender, pk=instance.pk)),
+    )
+
+
+@receiver(post_delete, sender=ProductBuyed)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=DeliverReceip)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    """Take the amount of a deleted row out of the rollups"""
+    previous = getattr(instance, "_previous_rollup_values", [])
+    apply_rollup_deltas(contributions(sender, previous, -1))
+
+
+@receiver(pre_save, sender=ShoppingReceip)
+def remember_previous_receip_keys(sender, instance, **kwargs):
+    """Keep the shop and account a receipt had before this save"""
+    instance._previous_rollup_keys = None
+    if not instance._state.adding:
+        instance._previous_rollup_keys = (
+            sender.objects.filter(pk=instance.pk)
+            .values("shop_of_buy_id", "shopping_account_id")
+            .first()
+        )
+
+
+@receiver(post_save, sender=ShoppingReceip)
+def update_rollups_on_receip_change(sender, instance, **kwargs):
+    """Buys of a receipt moved to another shop or account"""
+    previous = getattr(instance, "_previous_rollup_keys", None)
+    if previous:
+        move_rollups(sender, instance.pk, previous)
+
+
+@receiver(post_save, sender=Order)
+def update_rollups_on_order_change(sender, instance, **kwargs):
+    """Orders decide the month of their products and the agent of everything"""
+    previous = getattr(instance, "_previous_report", None)
+    if previous and previous != (instance.creation_date, instance.sales_manager_id):
+        move_rollups(
+            sender,
+            instance.pk,
+            {"creation_date": previous[0], "sales_manager_id": previous[1]},
+        )
+
+
+@receiver(post_save, sender=Order)
+def mark_commissions_on_order_move(sender, instance, **kwargs):
+    """An order moved to another agent or month leaves its statement outdated"""
+    previous = getattr(instance, "_previous_report", None)
+    if previous and previous != (instance.creation_date, instance.sales_manager_id):
+        mark_commissions_stale((previous[1], previous[0]))
+
+
+@receiver(post_save, sender=Order)
+def record_order_status_change(sender, instance, **kwargs):
+    """Queue the new status of an order for its client's next digest"""
+    previous = getattr(instance, "_previous_status", None)
+    if previous is not None and previous != instance.status:
+        record_status_changes(
+            [(instance.client_id, instance.pk, None, previous, instance.status)]
+        )
+
+
+@receiver(post_delete, sender=Order)
+def mark_commissions_on_order_delete(sender, instance, **kwargs):
+    """Deleted orders leave no updated_at behind, so flag their statement"""
+    mark_commissions_stale((instance.sales_manager_id, instance.creation_date))
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_model_version(sender, **kwargs):
+    """
+    Invalidate the cached filter responses and ETags that read the changed
+    model; models no cache depends on write no version
+    """
+    if sender in VERSIONED_MODELS:
+        bump_model_versions_on_commit(sender)
+
+
+@receiver(m2m_changed)
+def bump_model_versions_on_m2m_change(sender, instance, action, model, **kwargs):
+    """Pictures added to or removed from a row change its filter responses"""
+    if action.startswith("post_"):
+        models = versioned(type(instance), model)
+        if models:
+            bump_model_versions_on_commit(*models)
+
+
+@receiver(post_save, sender=CommonInformation)
+@receiver(post_delete, sender=CommonInformation)
+def invalidate_common_information_cache(sender, **kwargs):
+    """Drop the cached exchange rate and cost per pound after a change"""
+    invalidate_common_information()
+    # Otra petición pudo volver a llenar la cache antes del commit
+    transaction.on_commit(invalidate_common_information)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_user_roles_cache(sender, instance, **kwargs):
+    """Role changes must apply on the next request"""
+    invalidate_user_roles(instance.pk)
+    transaction.on_commit(lambda: invalidate_user_roles(instance.pk))
+
+
+@receiver(post_migrate)
+def reinstall_normalized_column_triggers(sender, using, **kwargs):
+    """
+    Put back the triggers of the normalized columns after migrating: SQLite
+    rebuilds a table to alter it and the triggers are dropped with it.
+    """
+    if sender.name != "api":
+        return
+    connection = connections[using]
+    applied = MigrationRecorder(connection).applied_migrations()
+    if ("api", "0030_normalized_column_triggers") in applied:
+        install_triggers(connection)
@@ -1,3 +1,1677 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.utils import ConnectionDoesNotExist
+from django.db.models import F
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from api.filters import (
+    DeliverReceipFilter,
+    OrderFilter,
+    PackageFilter,
+    ProductFilter,
+    ShoppingReceipFilter,
+)
+from api.models import (
+    AgentCommission,
+    BuyingAccounts,
+    CommonInformation,
+    CustomUser,
+    DeliverReceip,
+    EvidenceImages,
+    Order,
+    OutboxEmail,
+    Package,
+    Product,
+    ProductBuyed,
+    ProductReceived,
+    ReportRollup,
+    Shop,
+    ShoppingReceip,
+    StatusChangeEvent,
+)
+from api.utils.accounting_export import order_totals_rows
+from api.utils.agent_commissions import compute_commissions
+from api.utils import db_routing
+from api.utils.common_information_cache import (
+    CACHE_KEY,
+    get_common_information,
+    invalidate_common_information,
+)
+from api.utils.email_outbox import RateLimiter, send_pending
+from api.utils.email_sender import get_template
+from api.utils.filter_cache import (
+    bump_model_versions,
+    filter_cache_stats,
+    get_model_versions,
+)
+from api.utils.image_uploads import (
+    create_pending_image,
+    requeue_uploads,
+    upload_image,
+)
+from api.utils.order_totals import refresh_order_totals, stale_orders
+from api.utils.product_search import index_products, search_products
+from api.utils.product_status import compute_status, update_product_statuses
+from api.utils.product_totals import refresh_product_totals, stale_products
+from api.utils.report_rollups import apply_rollup_deltas, month_start, rebuild_rollups
+from api.utils import sqlite_stress
+from api.utils.status_notifications import record_status_changes, send_status_digests
+from api.views import StreamingExportMixin
+
+
+class FakeService:
+    """Records calls in place of an external service, failing on demand"""
+
+    error = "Servicio no disponible"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.remaining_failures = 0
+
+    def reset(self, fail_times=0):
+        """Forget the recorded calls and fail the next `fail_times` ones"""
+        with self.lock:
+            self.calls.clear()
+            self.remaining_failures = fail_times
+
+    def record(self, call):
+        with self.lock:
+            if self.remaining_failures > 0:
+                self.remaining_failures -= 1
+                raise ConnectionError(self.error)
+            self.calls.append(call)
+            return len(self.calls)
+
+
+class FakeCloudinary(FakeService):
+    error = "Cloudinary no disponible"
+
+    def __init__(self):
+        super().__init__()
+        self.destroyed = []
+
+    def reset(self, fail_times=0):
+        super().reset(fail_times)
+        self.destroyed.clear()
+
+    @property
+    def uploads(self):
+        return self.calls
+
+    def destroy(self, public_id):
+        """Record the deletion of an uploaded asset"""
+        self.destroyed.append(public_id)
+        return {"result": "ok"}
+
+    def upload(self, path):
+        """Record the upload of a local file and answer like Cloudinary"""
+        with open(path, "rb") as file:
+            number = self.record({"path": path, "content": file.read()})
+        public_id = f"fake/{number}"
+        return {
+            "public_id": public_id,
+            "secure_url": f"https://res.cloudinary.test/{public_id}.jpg",
+        }
+
+
+class FakeEmail(FakeService):
+    error = "Servidor de correo no disponible"
+
+    @property
+    def sent(self):
+        return self.calls
+
+    def send(self, message):
+        """Record a message as if it had been sent"""
+        return {"id": str(self.record(message))}
+
+
+fake_cloudinary = FakeCloudinary()
+fake_email = FakeEmail()
+# Rutas para IMAGE_UPLOADER y EMAIL_TRANSPORT
+fake_cloudinary_upload = fake_cloudinary.upload
+fake_cloudinary_destroy = fake_cloudinary.destroy
+fake_email_send = fake_email.send
+
+
+def create_order_graph(count, client, agent):
+    """Create `count` orders, each with a bought, received and delivered product"""
+    shop = Shop.objects.get_or_create(name="Shein", link="https://shein.com")[0]
+    account = BuyingAccounts.objects.get_or_create(account_name="cuenta")[0]
+    receip = ShoppingReceip.objects.create(shopping_account=account, shop_of_buy=shop)
+    package = Package.objects.create(agency_name="agencia", number_of_tracking="1")
+    orders = Order.objects.bulk_create(
+        [Order(client=client, sales_manager=agent) for _ in range(count)]
+    )
+    products = Product.objects.bulk_create(
+        [
+            Product(
+                sku="sku",
+                name="producto",
+                shop=shop,
+                amount_requested=2,
+                order=order,
+                shop_cost=10,
+                total_cost=12,
+            )
+            for order in orders
+        ]
+    )
+    ProductBuyed.objects.bulk_create(
+        [
+            ProductBuyed(
+                original_product=product,
+                order=product.order,
+                shoping_receip=receip,
+                actual_cost_of_product=20,
+                amount_buyed=2,
+                real_cost_of_product=20,
+            )
+            for product in products
+        ]
+    )
+    delivers = DeliverReceip.objects.bulk_create(
+        [DeliverReceip(order=order, weight=1.5) for order in orders]
+    )
+    ProductReceived.objects.bulk_create(
+        [
+            ProductReceived(
+                original_product=product,
+                order=product.order,
+                package_where_was_send=package,
+                deliver_receip=deliver,
+                amount_received=2,
+                amount_delivered=1,
+            )
+            for product, deliver in zip(products, delivers)
+        ]
+    )
+    refresh_product_totals([product.id for product in products])
+    refresh_order_totals([order.id for order in orders])
+    return list(Order.objects.filter(id__in=[order.id for order in orders]).order_by("id"))
+
+
+class OrderListQueryCountTests(TestCase):
+    """The order list must not issue queries per order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = CustomUser.objects.create_user(
+            "agente", "agente@example.com", "secreta", is_agent=True
+        )
+        cls.client_user = CustomUser.objects.create_user(
+            "cliente", "cliente@example.com", "secreta"
+        )
+        CommonInformation.objects.create(change_rate=1, cost_per_pound=5)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.agent)
+
+    def count_list_queries(self):
+        invalidate_common_information()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get("/shein_shop/order/?page_size=500")
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()["results"]
+
+    def test_query_count_is_independent_of_order_count(self):
+        create_order_graph(10, self.client_user, self.agent)
+        small_count, small_body = self.count_list_queries()
+        create_order_graph(990, self.client_user, self.agent)
+        large_count, large_body = self.count_list_queries()
+
+        self.assertEqual(len(small_body), 10)
+        self.assertEqual(len(large_body), 500)
+        self.assertEqual(small_count, large_count)
+
+    def test_computed_fields_match_model_methods(self):
+        order = create_order_graph(1, self.client_user, self.agent)[0]
+        _, body = self.count_list_queries()
+
+        self.assertEqual(body[0]["total_cost"], order.total_cost())
+        self.assertEqual(body[0]["received_value_of_client"], 1.5 * 5 + 10 * 2)
+        self.assertEqual(body[0]["extra_payments"], 1.5 * 5 + 10 * 2 - 12)
+        self.assertEqual(body[0]["products"][0]["amount_delivered"], 1)
+        self.assertEqual(len(body[0]["received_products"]), 1)
+
+
+class ProductStatusEngineTests(TestCase):
+    """Statuses are derived without writes on reads"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = CustomUser.objects.create_user(
+            "agente", "agente@example.com", "secreta", is_agent=True
+        )
+        cls.client_user = CustomUser.objects.create_user(
+            "cliente", "cliente@example.com", "secreta"
+        )
+        CommonInformation.objects.create(change_rate=1, cost_per_pound=5)
+
+    def test_compute_status(self):
+        self.assertEqual(compute_status(2, 0, 0, 0), "Encargado")
+        self.assertEqual(compute_status(2, 1, 0, 0), "Parcialmente comprado")
+        self.assertEqual(compute_status(2, 2, 0, 0), "Comprado")
+        self.assertEqual(compute_status(2, 2, 1, 0), "Parcialmente Recibido")
+        self.assertEqual(compute_status(2, 2, 2, 0), "Recibido")
+        self.assertEqual(compute_status(2, 2, 2, 1), "Parcialmente Entregado")
+        self.assertEqual(compute_status(2, 2, 2, 2), "Entregado")
+
+    def test_only_changed_statuses_are_written(self):
+        create_order_graph(3, self.client_user, self.agent)
+        changed = update_product_statuses()
+        self.assertEqual(len(changed), 3)
+        self.assertEqual(
+            set(Product.objects.values_list("status", flat=True)),
+            {"Parcialmente Entregado"},
+        )
+        self.assertEqual(update_product_statuses(), [])
+
+    def test_reads_do_not_write(self):
+        create_order_graph(3, self.client_user, self.agent)
+        api = APIClient()
+        api.force_authenticate(user=self.agent)
+        with CaptureQueriesContext(connection) as queries:
+            api.get("/shein_shop/product/")
+            api.get("/shein_shop/order/")
+        self.assertFalse(
+            [q for q in queries if q["sql"].startswith("UPDATE")], queries
+        )
+
+
+class CommonInformationCacheTests(TestCase):
+    """Exchange rate and cost per pound are served from cache"""
+
+    def setUp(self):
+        invalidate_common_information()
+        self.admin = CustomUser.objects.create_user(
+            "admin", "admin@example.com", "secreta", is_staff=True
+        )
+        CommonInformation.objects.create(change_rate=1, cost_per_pound=5)
+
+    def test_cached_reads_do_not_query(self):
+        get_common_information()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_common_information().cost_per_pound, 5)
+
+    def test_viewset_update_invalidates(self):
+        get_common_information()
+        api = APIClient()
+        api.force_authenticate(user=self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = api.put(
+                "/shein_shop/common_information/1/",
+                {"change_rate": 2, "cost_per_pound": 7},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_common_information().cost_per_pound, 7)
+
+    @override_settings(COMMON_INFORMATION_CACHE_ALIAS="default")
+    def test_shared_invalidation_reaches_every_process(self):
+        invalidate_common_information()
+        get_common_information()
+        # Otro proceso cambia el valor e invalida solo la clave compartida
+        CommonInformation.objects.update(cost_per_pound=9)
+        caches["default"].delete(CACHE_KEY)
+        self.assertEqual(get_common_information().cost_per_pound, 9)
+
+
+@override_settings(USER_ROLES_CACHE_ALIAS="default")
+class UserRolesCacheTests(TestCase):
+    """Permission classes share one role snapshot per request"""
+
+    def setUp(self):
+        cache.clear()
+        self.agent = CustomUser.objects.create_user(
+            "agente", "agente@example.com", "secreta", is_agent=True
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.agent)
+
+    def count_user_queries(self, response_status):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get("/shein_shop/order/")
+        self.assertEqual(response.status_code, response_status)
+        return len([q for q in queries if 'FROM "api_customuser"' in q["sql"]])
+
+    def test_roles_are_loaded_once(self):
+        self.assertEqual(self.count_user_queries(200), 1)
+        self.assertEqual(self.count_user_queries(200), 0)
+
+    def test_role_change_invalidates_cache(self):
+        self.count_user_queries(200)
+        self.agent.is_agent = False
+        self.agent.save()
+        self.assertEqual(self.count_user_queries(403), 1)
+
+    @override_settings(USER_ROLES_CACHE_ALIAS=None)
+    def test_without_a_shared_cache_roles_are_read_per_request(self):
+        self.assertEqual(self.count_user_queries(200), 1)
+        # Otro proceso quita el rol: ninguna cache de este proceso lo conserva
+        CustomUser.objects.filter(pk=self.agent.pk).update(is_agent=False)
+        self.assertEqual(self.count_user_queries(403), 1)
+
+
+class ShoppingReceipBulkCreateTests(TestCase):
+    """Receipts with many lines are validated and inserted in bulk"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = CustomUser.objects.create_user(
+            "comprador", "comprador@example.com", "secreta", is_buyer=True
+        )
+        cls.orders = create_order_graph(5, cls.buyer, cls.buyer)
+        cls.products = list(Product.objects.filter(order__in=cls.orders))
+        Product.objects.update(amount_requested=10)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.buyer)
+
+    def post_receip(self, lines):
+        return self.api.post(
+            "/shein_shop/shopping_reciep/",
+            {
+                "shopping_account": "cuenta",
+                "shop_of_buy": "Shein",
+                "buyed_products": [
+                    {
+                        "original_product": str(product.id),
+                        "order": product.order_id,
+                        "amount_buyed": amount,
+                        "real_cost_of_product": 5,
+                    }
+                    for product, amount in lines
+                ],
+            },
+            format="json",
+        )
+
+    def test_limits_include_lines_of_the_same_payload(self):
+        product = self.products[0]
+        response = self.post_receip([(product, 4), (self.products[1], 1), (product, 5)])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()["buyed_products"]
+        self.assertEqual(errors[0], {})
+        self.assertEqual(errors[1], {})
+        self.assertIn("non_field_errors", errors[2])
+        self.assertFalse(ShoppingReceip.objects.filter(buyed_products__amount_buyed=4))
+
+    def test_bulk_create_updates_totals_and_statuses(self):
+        small = self.count_queries([(product, 1) for product in self.products[:1]])
+        large = self.count_queries([(product, 1) for product in self.products])
+        self.assertEqual(small, large)
+        product = Product.objects.get(id=self.products[0].id)
+        self.assertEqual(product.total_amount_buyed, 4)
+        self.assertEqual(product.status, "Parcialmente comprado")
+
+    def count_queries(self, lines):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_receip(lines)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(response.json()["buyed_products"]), len(lines))
+        return len(queries)
+
+
+class ProductReceivedBulkTests(TestCase):
+    """Package intake and deliveries are validated across the whole batch"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.logistical = CustomUser.objects.create_user(
+            "logistico", "logistico@example.com", "secreta", is_logistical=True
+        )
+        cls.order = create_order_graph(1, cls.logistical, cls.logistical)[0]
+        cls.product = cls.order.products.get()
+        cls.package = Package.objects.get()
+        cls.deliver = DeliverReceip.objects.get()
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.logistical)
+
+    def test_intake_reports_line_errors(self):
+        Product.objects.update(amount_requested=5)
+        line = {"original_product": str(self.product.id), "order": self.order.id}
+        response = self.api.post(
+            "/shein_shop/product_received/",
+            {
+                "package_where_was_send": self.package.id,
+                "contained_products": [
+                    {**line, "amount_received": 2},
+                    {**line, "amount_received": 2},
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["contained_products"][0], {})
+        self.assertIn("non_field_errors", response.json()["contained_products"][1])
+
+    def test_bulk_delivery(self):
+        reception = ProductReceived.objects.get()
+        response = self.api.patch(
+            "/shein_shop/product_received/deliver_products/",
+            {
+                "deliver_receip": self.deliver.id,
+                "delivered_products": [{"id": reception.id, "amount_delivered": 2}],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.total_amount_delivered, 2)
+        self.assertEqual(self.product.status, "Entregado")
+
+        response = self.api.patch(
+            "/shein_shop/product_received/deliver_products/",
+            {
+                "deliver_receip": self.deliver.id,
+                "delivered_products": [
+                    {"id": reception.id, "amount_delivered": 3},
+                    {"id": 999, "amount_delivered": 1},
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()["delivered_products"]
+        self.assertIn("non_field_errors", errors[0])
+        self.assertIn("id", errors[1])
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages walk every order exactly once in both directions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = CustomUser.objects.create_user(
+            "agente", "agente@example.com", "secreta", is_agent=True
+        )
+        orders = create_order_graph(7, cls.agent, cls.agent)
+        # Fechas repetidas y nulas obligan a desempatar por id
+        Order.objects.filter(id__in=[o.id for o in orders[:3]]).update(
+            creation_date=orders[0].creation_date
+        )
+        Order.objects.filter(id=orders[5].id).update(creation_date=None)
+
+    def test_walk_forward_and_back(self):
+        api = APIClient()
+        api.force_authenticate(user=self.agent)
+        pages = []
+        url = "/shein_shop/order/?page_size=3"
+        while url:
+            body = api.get(url).json()
+            pages.append([order["id"] for order in body["results"]])
+            url = body["next"]
+        seen = [order_id for page in pages for order_id in page]
+        expected = [
+            o.id
+            for o in Order.objects.order_by(
+                F("creation_date").desc(nulls_last=True), "-id"
+            )
+        ]
+        self.assertEqual(seen, expected)
+
+        previous = api.get(body["previous"]).json()
+        self.assertEqual([order["id"] for order in previous["results"]], pages[-2])
+        self.assertEqual(api.get("/shein_shop/order/?cursor=x").status_code, 404)
+
+
+class StreamingExportTests(TestCase):
+    """Streamed exports carry the same rows as the paginated list"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = CustomUser.objects.create_user(
+            "agente", "agente@example.com", "secreta", is_agent=True
+        )
+        create_order_graph(7, cls.agent, cls.agent)
+        CommonInformation.objects.create(change_rate=1, cost_per_pound=5)
+
+    @mock.patch.object(StreamingExportMixin, "stream_chunk_size", 3)
+    def test_stream_matches_list(self):
+        api = APIClient()
+        api.force_authenticate(user=self.agent)
+        for url in ("/shein_shop/order/", "/shein_shop/product/"):
+            response = api.get(url + "?stream=true")
+            self.assertTrue(response.streaming)
+            streamed = json.loads(b"".join(response.streaming_content))
+            listed = api.get(url + "?page_size=100").json()["results"]
+            self.assertEqual(streamed, listed)
+
+
+class AccountingExportTests(TestCase):
+    """SQL totals match the per-order model methods"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.accountant = CustomUser.objects.create_user(
+            "contador", "contador@example.com", "secreta", is_accountant=True
+        )
+        cls.orders = create_order_graph(3, cls.accountant, cls.accountant)
+        CommonInformation.objects.create(change_rate=1, cost_per_pound=5)
+
+    def setUp(self):
+        invalidate_common_information()
+
+    def test_totals_match_model_methods(self):
+        rows = {row[0]: row for row in order_totals_rows()}
+        for order in self.orders:
+            row = rows[order.id]
+            self.assertAlmostEqual(row[6], order.total_cost())
+            self.assertAlmostEqual(row[7], order.received_value_of_client())
+            self.assertAlmostEqual(row[8], order.extra_payments())
+
+    def test_csv_endpoint(self):
+        api = APIClient()
+        api.force_authenticate(user=self.accountant)
+        response = api.get("/shein_shop/order/accounting_export/")
+        self.assertEqual(response.status_code, 200)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[0], "order_id")
+        self.assertEqual(len(lines), 4)
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "Planes de consulta de SQLite")
+class FilterIndexTests(TestCase):
+    """The filters in api.filters are answered from indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user("agente", "agente@example.com", "secreta")
+        cls.order = create_order_graph(1, user, user)[0]
+        Product.objects.create(
+            sku="zap",
+            name="zapatos",
+            shop=Shop.objects.get(),
+            category="Zapatos Ñandú",
+            amount_requested=1,
+            order=cls.order,
+            shop_cost=1,
+        )
+
+    def assertUsesIndex(self, filterset, index):
+        self.assertTrue(filterset.is_valid(), filterset.errors)
+        self.assertIn(index, filterset.qs.explain())
+
+    def test_status_and_date_filters(self):
+        self.assertUsesIndex(
+            OrderFilter({"status": "Encargado", "initial_date": "2026-01-01"}),
+            "order_status_date_idx",
+        )
+        self.assertUsesIndex(
+            ShoppingReceipFilter(
+                {"status_of_shopping": "Pagado", "initial_date": "2026-01-01"}
+            ),
+            "shopping_status_date_idx",
+        )
+        self.assertUsesIndex(
+            DeliverReceipFilter({"status": "Enviado", "deliver_date": "2026-01-01"}),
+            "deliver_status_date_idx",
+        )
+
+    def test_product_filters(self):
+        self.assertUsesIndex(
+            ProductFilter({"order": self.order.id, "status": "Comprado"}),
+            "product_order_status_idx",
+        )
+        self.assertUsesIndex(ProductFilter({"sku": "zap"}), "product_sku_idx")
+        self.assertUsesIndex(
+            ProductFilter({"category": "ÑAN"}), "product_category_norm_idx"
+        )
+
+    def test_package_filters(self):
+        self.assertUsesIndex(
+            PackageFilter({"number_of_tracking": "1"}), "package_tracking_idx"
+        )
+        self.assertUsesIndex(
+            PackageFilter({"agency_name": "AGEN"}), "package_agency_norm_idx"
+        )
+
+    def test_partial_match_ignores_case_outside_ascii(self):
+        products = ProductFilter({"category": "ÑANDÚ"}).qs
+        self.assertEqual([p.sku for p in products], ["zap"])
+        packages = PackageFilter({"agency_name": "AGEN"}).qs
+        self.assertEqual(packages.count(), 1)
+
+    def test_bulk_writes_keep_shadow_columns(self):
+        Product.objects.filter(sku="zap").update(category="Calzado ÓPTIMO")
+        products = ProductFilter({"category": "óptimo"}).qs
+        self.assertEqual([p.sku for p in products], ["zap"])
+        Package.objects.bulk_create(
+            [Package(agency_name="Envíos ÁGILES", number_of_tracking="2")]
+        )
+        packages = PackageFilter({"agency_name": "ágiles"}).qs
+        self.assertEqual([p.number_of_tracking for p in packages], ["2"])
+
+    def test_day_filters_keep_whole_days(self):
+        day = self.order.creation_date.date().isoformat()
+        for params in ({"initial_date": day}, {"final_date": day}):
+            self.assertEqual(OrderFilter(params).qs.count(), 1)
+
+
+class ProductSearchTests(TestCase):
+    """Full-text product search kept in step with the products"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = CustomUser.objects.create_user(
+            "agente", "agente@example.com", "secreta", is_agent=True
+        )
+        cls.order = create_order_graph(1, cls.agent, cls.agent)[0]
+        cls.shop = Shop.objects.get()
+
+    def create_product(self, name, description="", category=""):
+        return Product.objects.create(
+            sku=name,
+            name=name,
+            description=description,
+            category=category,
+            shop=self.shop,
+            amount_requested=1,
+            order=self.order,
+            shop_cost=1,
+        )
+
+    def test_prefix_accents_and_ranking(self):
+        in_description = self.create_product("Bolso", description="Para el café")
+        in_name = self.create_product("Taza de Café")
+        self.assertEqual(search_products("CAFE"), [in_name.pk, in_description.pk])
+        self.assertEqual(search_products("taz caf"), [in_name.pk])
+        self.assertEqual(search_products("***"), [])
+
+    def test_index_follows_product_changes(self):
+        product = self.create_product("Camisa")
+        self.assertEqual(search_products("camisa"), [product.pk])
+        product.name = "Pantalón"
+        product.save()
+        self.assertEqual(search_products("camisa"), [])
+        self.assertEqual(search_products("pantalon"), [product.pk])
+        product.delete()
+        self.assertEqual(search_products("pantalon"), [])
+
+    def test_bulk_created_products_are_indexed_on_request(self):
+        products = Product.objects.bulk_create(
+            [
+                Product(
+                    sku="lote",
+                    name="Zapatilla",
+                    shop=self.shop,
+                    amount_requested=1,
+                    order=self.order,
+                    shop_cost=1,
+                )
+            ]
+        )
+        self.assertEqual(search_products("zapat"), [])
+        index_products([product.pk for product in products])
+        self.assertEqual(search_products("zapat"), [products[0].pk])
+
+    def test_product_filter_q_parameter(self):
+        self.create_product("Mesa de noche", category="Lámparas")
+        best = self.create_product("Lámpara de mesa", category="Hogar")
+        api = APIClient()
+        api.force_authenticate(user=self.agent)
+        response = api.post(
+            "/shein_shop/product/product_filter/", {"q": "lampara"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]["id"], str(best.pk))
+
+
+    def test_limit_applies_after_the_other_filters(self):
+        self.assertEqual(list(ProductFilter.base_filters)[-1], "q")
+        better = self.create_product("Lámpara de mesa")
+        wanted = self.create_product("Bombillo", description="Para la lámpara")
+        self.assertEqual(search_products("lampara", limit=1), [better.pk])
+        with override_settings(PRODUCT_SEARCH_LIMIT=1):
+            filtered = ProductFilter(
+                {"q": "lampara", "sku": "Bombillo"}, queryset=Product.objects.all()
+            )
+            self.assertEqual(list(filtered.qs), [wanted])
+
+
+class OrderTotalCostTests(TestCase):
+    """Stored order cost kept in step with the products of the order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = CustomUser.objects.create_user(
+            "agente", "agente@example.com", "secreta", is_agent=True
+        )
+        cls.first, cls.second = create_order_graph(2, cls.agent, cls.agent)
+
+    def cost(self, order):
+        order.refresh_from_db(fields=["products_total_cost"])
+        return order.total_cost()
+
+    def test_product_changes_update_order_cost(self):
+        self.assertEqual(self.cost(self.first), 12)
+        product = Product.objects.create(
+            sku="nuevo",
+            name="nuevo",
+            shop=Shop.objects.get(),
+            amount_requested=1,
+            order=self.first,
+            shop_cost=5,
+            total_cost=5.5,
+        )
+        self.assertEqual(self.cost(self.first), 17.5)
+        product.total_cost = 8
+        product.save()
+        self.assertEqual(self.cost(self.first), 20)
+        product.order = self.second
+        product.save()
+        self.assertEqual((self.cost(self.first), self.cost(self.second)), (12, 20))
+        product.delete()
+        self.assertEqual(self.cost(self.second), 12)
+        self.assertEqual(stale_orders(), [])
+
+    def test_cost_filters_and_ordering(self):
+        Product.objects.filter(order=self.second).update(total_cost=30)
+        refresh_order_totals([self.second.id])
+        filtered = OrderFilter({"min_cost": 20, "max_cost": 40}).qs
+        self.assertEqual(list(filtered), [self.second])
+        if connection.vendor == "sqlite":
+            self.assertIn("order_total_cost_idx", filtered.explain())
+
+        api = APIClient()
+        api.force_authenticate(user=self.agent)
+        response = api.get("/shein_shop/order/", {"ordering": "-total_cost"})
+        ids = [order["id"] for order in response.json()["results"]]
+        self.assertEqual(ids, [self.second.id, self.first.id])
+
+    def test_check_command_reports_drift(self):
+        call_command("rebuild_order_totals", "--check", stdout=io.StringIO())
+        Order.objects.filter(id=self.first.id).update(products_total_cost=0)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_order_totals", "--check", stdout=io.StringIO())
+        call_command("rebuild_order_totals", stdout=io.StringIO())
+        self.assertEqual(self.cost(self.first), 12)
+
+
+@override_settings(FILTER_CACHE_ALIAS="default")
+class FilterCacheTests(TestCase):
+    """Filter responses are cached until a model they read changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = CustomUser.objects.create_user(
+            "agente", "agente@example.com", "secreta", is_agent=True
+        )
+        cls.buyer = CustomUser.objects.create_user(
+            "comprador", "comprador@example.com", "secreta", is_buyer=True
+        )
+        cls.order = create_order_graph(2, cls.agent, cls.agent)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, user, data):
+        api = APIClient()
+        api.force_authenticate(user=user)
+        return api.post("/shein_shop/product/product_filter/", data, format="json")
+
+    def test_repeated_filters_are_served_from_cache(self):
+        first = self.post(self.agent, {"sku": "sku", "status": "Comprado"})
+        self.assertEqual(first["X-Filter-Cache"], "MISS")
+        # Solo se leen los roles y las versiones de los modelos
+        with self.assertNumQueries(2):
+            second = self.post(self.agent, {"status": "Comprado", "sku": "sku"})
+        self.assertEqual(second["X-Filter-Cache"], "HIT")
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(filter_cache_stats(), {"hits": 1, "misses": 1})
+
+    def test_roles_and_parameters_are_part_of_the_key(self):
+        self.post(self.agent, {"sku": "sku"})
+        self.assertEqual(self.post(self.buyer, {"sku": "sku"})["X-Filter-Cache"], "MISS")
+        self.assertEqual(self.post(self.agent, {"sku": "otro"})["X-Filter-Cache"], "MISS")
+
+    def test_changes_invalidate_cached_responses(self):
+        self.assertEqual(len(self.post(self.agent, {"sku": "sku"}).json()["results"]), 2)
+        product = self.order.products.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            product.sku = "cambiado"
+            product.save()
+        response = self.post(self.agent, {"sku": "sku"})
+        self.assertEqual(response["X-Filter-Cache"], "MISS")
+        self.assertEqual(len(response.json()["results"]), 1)
+
+    def test_bulk_status_updates_invalidate_cached_responses(self):
+        self.post(self.agent, {"status": "Encargado"})
+        Product.objects.update(status="Encargado")
+        with self.captureOnCommitCallbacks(execute=True):
+            update_product_statuses()
+        response = self.post(self.agent, {"status": "Encargado"})
+        self.assertEqual(response["X-Filter-Cache"], "MISS")
+        self.assertEqual(response.json()["results"], [])
+
+    def test_shop_changes_invalidate_nested_products(self):
+        api = APIClient()
+        api.force_authenticate(user=self.agent)
+        endpoints = [
+            "/shein_shop/package/package_filter/",
+            "/shein_shop/deliver_reciep/deliver_reciep_filter/",
+        ]
+        for endpoint in endpoints:
+            api.post(endpoint, {}, format="json")
+            response = api.post(endpoint, {}, format="json")
+            self.assertEqual(response["X-Filter-Cache"], "HIT")
+        shop = Shop.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            shop.taxes = 7
+            shop.save()
+        for endpoint in endpoints:
+            response = api.post(endpoint, {}, format="json")
+            self.assertEqual(response["X-Filter-Cache"], "MISS")
+            self.assertIn('"shop_taxes":7.0', response.content.decode())
+
+    def test_only_cached_models_write_versions(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            OutboxEmail.objects.create(
+                kind=OutboxEmail.VERIFICATION, to_email="a@example.com", context={}
+            )
+            StatusChangeEvent.objects.create(
+                client=self.agent,
+                order=self.order,
+                previous_status="Encargado",
+                status="Entregado",
+            )
+        self.assertEqual(callbacks, [])
+        before = get_model_versions([Shop])
+        with self.captureOnCommitCallbacks(execute=True):
+            Shop.objects.get().save()
+        self.assertNotEqual(get_model_versions([Shop]), before)
+
+    @override_settings(FILTER_CACHE_ALIAS=None)
+    def test_no_caching_without_a_shared_cache(self):
+        self.post(self.agent, {"sku": "sku"})
+        response = self.post(self.agent, {"sku": "sku"})
+        self.assertNotIn("X-Filter-Cache", response)
+        self.assertEqual(filter_cache_stats(), {"hits": 0, "misses": 0})
+
+
+class ConditionalGetTests(TestCase):
+    """Unchanged resources answer 304 without being serialized"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = CustomUser.objects.create_user(
+            "agente", "agente@example.com", "secreta", is_agent=True
+        )
+        cls.order = create_order_graph(2, cls.agent, cls.agent)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.agent)
+
+    def test_list_revalidation(self):
+        first = self.api.get("/shein_shop/shop/")
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("no-cache", first["Cache-Control"])
+        with self.assertNumQueries(1):
+            second = self.api.get("/shein_shop/shop/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 304)
+
+        shop = Shop.objects.get()
+        shop.taxes = 3
+        shop.save()
+        third = self.api.get("/shein_shop/shop/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third["ETag"], first["ETag"])
+
+    def test_detail_last_modified(self):
+        first = self.api.get("/shein_shop/shop/Shein/")
+        since = first["Last-Modified"]
+        second = self.api.get("/shein_shop/shop/Shein/", HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(second.status_code, 304)
+
+    def test_dependencies_change_the_order_etag(self):
+        first = self.api.get(f"/shein_shop/order/{self.order.id}/")
+        product = self.order.products.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            product.observation = "frágil"
+            product.save()
+        second = self.api.get(
+            f"/shein_shop/order/{self.order.id}/", HTTP_IF_NONE_MATCH=first["ETag"]
+        )
+        self.assertEqual(second.status_code, 200)
+
+    def test_shops_and_users_change_the_order_list_etag(self):
+        first = self.api.get("/shein_shop/order/")
+        shop = Shop.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            shop.taxes = 7
+            shop.save()
+        second = self.api.get("/shein_shop/order/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.agent.email = "nuevo@example.com"
+            self.agent.save()
+        third = self.api.get("/shein_shop/order/", HTTP_IF_NONE_MATCH=second["ETag"])
+        self.assertEqual(third.status_code, 200)
+        self.assertIn("nuevo@example.com", third.content.decode())
+
+    def test_model_versions_are_shared_between_processes(self):
+        before = get_model_versions([EvidenceImages])
+        # El proceso que escribe tiene su propia cache local
+        other_process = LocMemCache("otro-proceso", {})
+        with mock.patch(
+            "api.utils.filter_cache.get_filter_cache", return_value=other_process
+        ):
+            bump_model_versions(EvidenceImages)
+        self.assertNotEqual(get_model_versions([EvidenceImages]), before)
+
+    def test_bulk_updates_touch_updated_at(self):
+        product = self.order.products.get()
+        Product.objects.filter(pk=product.pk).update(status="Encargado")
+        before = Product.objects.get(pk=product.pk).updated_at
+        update_product_statuses([product.pk])
+        self.assertGreater(Product.objects.get(pk=product.pk).updated_at, before)
+
+
+class ReportRollupTests(TestCase):
+    """Monthly rollups match the rows they summarize"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.accountant = CustomUser.objects.create_user(
+            "contador", "contador@example.com", "secreta", is_accountant=True
+        )
+        cls.orders = create_order_graph(2, cls.accountant, cls.accountant)
+        CommonInformation.objects.create(change_rate=1, cost_per_pound=4)
+        cls.period = month_start(cls.orders[0].creation_date)
+
+    def setUp(self):
+        invalidate_common_information()
+        rebuild_rollups()
+
+    def rollup(self, dimension, key=""):
+        return ReportRollup.objects.get(period=self.period, dimension=dimension, key=key)
+
+    def test_rebuild_groups_every_dimension(self):
+        total = self.rollup(ReportRollup.TOTAL)
+        self.assertEqual((total.spend, total.revenue, total.weight), (40, 24, 3))
+        shop = self.rollup(ReportRollup.SHOP, str(Shop.objects.get().id))
+        self.assertEqual((shop.spend, shop.revenue, shop.weight), (40, 24, 0))
+        account = self.rollup(
+            ReportRollup.BUYING_ACCOUNT, str(BuyingAccounts.objects.get().id)
+        )
+        self.assertEqual(account.spend, 40)
+        agent = self.rollup(ReportRollup.SALES_MANAGER, str(self.accountant.id))
+        self.assertEqual(agent.weight, 3)
+
+    def test_changes_refresh_their_month(self):
+        buy = ProductBuyed.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            buy.real_cost_of_product = 50
+            buy.save()
+            DeliverReceip.objects.first().delete()
+        total = self.rollup(ReportRollup.TOTAL)
+        self.assertEqual((total.spend, total.weight), (70, 1.5))
+
+    def snapshot(self):
+        return set(
+            ReportRollup.objects.values_list(
+                "period", "dimension", "key", "spend", "revenue", "weight"
+            )
+        )
+
+    def test_incremental_updates_match_a_rebuild(self):
+        agent = CustomUser.objects.create_user("agente", "agente@example.com", "x")
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self.orders[0]
+            order.sales_manager = agent
+            order.save()
+            receip = ShoppingReceip.objects.get()
+            receip.shop_of_buy = Shop.objects.create(
+                name="Temu", link="https://temu.com"
+            )
+            receip.save()
+            self.orders[1].products.get().delete()
+        incremental = self.snapshot()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_rolled_back_changes_leave_rollups_alone(self):
+        before = self.snapshot()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            buy = ProductBuyed.objects.first()
+            buy.real_cost_of_product = 99
+            buy.save()
+            raise RuntimeError
+        self.assertEqual(self.snapshot(), before)
+
+    def test_reversed_deltas_leave_no_rows(self):
+        period = date(2000, 1, 1)
+        # 0.1 + 0.2 - 0.1 - 0.2 deja 2.7e-17 en aritmética de floats
+        for amount in (0.1, 0.2, -0.1, -0.2):
+            apply_rollup_deltas({(period, ReportRollup.TOTAL, "", "revenue"): amount})
+        self.assertFalse(ReportRollup.objects.filter(period=period).exists())
+
+    def test_report_endpoint(self):
+        api = APIClient()
+        api.force_authenticate(user=self.accountant)
+        month = self.period.strftime("%Y-%m")
+        response = api.get(
+            "/shein_shop/report/",
+            {"dimension": "shop", "start": month, "end": month, "group": "key"},
+        )
+        self.assertEqual(response.status_code, 200)
+        [row] = response.json()["results"]
+        self.assertEqual(row["label"], "Shein")
+        self.assertEqual(row["delivery_charges"], 0)
+        total = api.get("/shein_shop/report/").json()["results"][0]
+        self.assertEqual(total["delivery_charges"], 12)
+        bad_month = api.get("/shein_shop/report/", {"start": "13-2026"})
+        self.assertEqual(bad_month.status_code, 400)
+
+
+class AgentCommissionTests(TestCase):
+    """Commission statements follow the orders of each agent"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = CustomUser.objects.create_user(
+            "uno", "uno@example.com", "secreta", is_agent=True, agent_profit=10
+        )
+        cls.second = CustomUser.objects.create_user(
+            "dos", "dos@example.com", "secreta", is_agent=True, agent_profit=20
+        )
+        cls.accountant = CustomUser.objects.create_user(
+            "contador", "contador@example.com", "secreta", is_accountant=True
+        )
+        cls.first_orders = create_order_graph(2, cls.first, cls.first)
+        cls.second_orders = create_order_graph(1, cls.second, cls.second)
+
+    def statement(self, agent):
+        return AgentCommission.objects.get(agent=agent)
+
+    def test_full_run_in_constant_queries(self):
+        # Lecturas, un savepoint y un solo INSERT, sin consultas por pedido
+        with self.assertNumQueries(7):
+            self.assertEqual(compute_commissions(), (2, 0, 0))
+        first = self.statement(self.first)
+        self.assertEqual((first.orders_count, first.sales), (2, 24))
+        self.assertAlmostEqual(first.commission, 2.4)
+        self.assertAlmostEqual(self.statement(self.second).commission, 2.4)
+
+    def test_incremental_runs_write_only_changes(self):
+        compute_commissions()
+        self.assertEqual(compute_commissions(), (0, 0, 0))
+        product = self.first_orders[0].products.get()
+        product.total_cost = 32
+        product.save()
+        self.assertEqual(compute_commissions(), (0, 1, 0))
+        self.assertEqual(self.statement(self.first).sales, 44)
+
+    def test_moved_and_deleted_orders(self):
+        compute_commissions()
+        order = self.second_orders[0]
+        order.sales_manager = self.first
+        order.save()
+        self.assertTrue(self.statement(self.second).stale)
+        self.assertEqual(compute_commissions(), (0, 1, 1))
+        self.assertEqual(self.statement(self.first).orders_count, 3)
+        Order.objects.filter(sales_manager=self.first).delete()
+        self.assertEqual(compute_commissions(), (0, 0, 1))
+        self.assertFalse(AgentCommission.objects.exists())
+
+    def test_commission_endpoint(self):
+        cache.clear()
+        compute_commissions()
+        api = APIClient()
+        api.force_authenticate(user=self.first)
+        results = api.get("/shein_shop/commission/").json()["results"]
+        self.assertEqual([row["agent"] for row in results], [self.first.id])
+        self.assertEqual(api.post("/shein_shop/commission/compute/").status_code, 403)
+        api.force_authenticate(user=self.accountant)
+        self.assertEqual(len(api.get("/shein_shop/commission/").json()["results"]), 2)
+        response = api.post("/shein_shop/commission/compute/", {"full": True})
+        self.assertEqual(response.json(), {"created": 0, "updated": 0, "deleted": 0})
+
+
+class ImageUploadTests(TestCase):
+    """Images are stored locally and uploaded in the background"""
+
+    def setUp(self):
+        upload_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(upload_dir.cleanup)
+        self.settings_override = override_settings(
+            IMAGE_UPLOAD_DIR=upload_dir.name,
+            IMAGE_UPLOAD_WORKERS=0,
+            IMAGE_UPLOAD_RETRY_DELAY=0,
+            IMAGE_UPLOAD_MAX_ATTEMPTS=3,
+            IMAGE_UPLOADER="api.tests.fake_cloudinary_upload",
+            IMAGE_DESTROYER="api.tests.fake_cloudinary_destroy",
+            IMAGE_PROCESS_WORKERS=0,
+            IMAGE_MAX_DIMENSION=100,
+            IMAGE_THUMBNAIL_SIZE=20,
+            IMAGE_FORMAT="WEBP",
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        fake_cloudinary.reset()
+        self.api = APIClient()
+
+    def photo(self):
+        """Landscape sensor image the camera marked as rotated 90 degrees"""
+        content = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        Image.new("RGB", (400, 200), "red").save(content, "JPEG", exif=exif)
+        return SimpleUploadedFile("foto.jpg", content.getvalue(), "image/jpeg")
+
+    def uploaded_size(self, number):
+        content = io.BytesIO(fake_cloudinary.uploads[number]["content"])
+        with Image.open(content) as image:
+            return image.format, image.size
+
+    def upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(
+                "/shein_shop/image_upload/?async=true", {"image": self.photo()}
+            )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], EvidenceImages.PENDING)
+        return EvidenceImages.objects.get(pk=response.json()["id"])
+
+    def test_upload_after_retries(self):
+        fake_cloudinary.reset(fail_times=2)
+        image = self.upload()
+        self.assertEqual(image.status, EvidenceImages.UPLOADED)
+        self.assertEqual(image.attempts, 3)
+        self.assertTrue(image.image_url.startswith("https://res.cloudinary.test/"))
+        self.assertEqual(len(fake_cloudinary.uploads), 2)
+        self.assertEqual(self.uploaded_size(0), ("WEBP", (50, 100)))
+        self.assertEqual(self.uploaded_size(1), ("WEBP", (10, 20)))
+        self.assertEqual(image.thumbnail_url, "https://res.cloudinary.test/fake/2.jpg")
+        self.assertEqual(os.listdir(settings.IMAGE_UPLOAD_DIR), [])
+        status = self.api.get(f"/shein_shop/image_upload/{image.pk}/").json()
+        self.assertEqual(status["status"], EvidenceImages.UPLOADED)
+
+    def test_failed_upload_keeps_file_and_can_be_retried(self):
+        fake_cloudinary.reset(fail_times=3)
+        failed = self.upload()
+        self.assertEqual(failed.status, EvidenceImages.FAILED)
+        self.assertEqual(failed.error, "Cloudinary no disponible")
+        self.assertTrue(os.path.exists(failed.local_path))
+        uploaded = self.upload()
+        response = self.api.get(
+            f"/shein_shop/image_upload/?ids={failed.pk},{uploaded.pk}"
+        )
+        self.assertEqual(
+            [row["status"] for row in response.json()],
+            [EvidenceImages.FAILED, EvidenceImages.UPLOADED],
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("retry_image_uploads", "--failed", stdout=io.StringIO())
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, EvidenceImages.UPLOADED)
+        self.assertIsNone(failed.local_path)
+
+    def test_claimed_uploads_are_not_taken_twice(self):
+        with mock.patch("api.utils.image_uploads.enqueue_upload"):
+            claimed = create_pending_image(self.photo())
+            expired = create_pending_image(self.photo())
+        now = timezone.now()
+        EvidenceImages.objects.filter(pk=claimed.pk).update(
+            status=EvidenceImages.UPLOADING, lease_until=now + timedelta(minutes=5)
+        )
+        EvidenceImages.objects.filter(pk=expired.pk).update(
+            status=EvidenceImages.UPLOADING, lease_until=now - timedelta(minutes=5)
+        )
+        self.assertIsNone(upload_image(claimed.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(requeue_uploads(), [expired.pk])
+        claimed.refresh_from_db()
+        expired.refresh_from_db()
+        self.assertEqual(claimed.status, EvidenceImages.UPLOADING)
+        self.assertEqual(expired.status, EvidenceImages.UPLOADED)
+        self.assertIsNone(expired.lease_until)
+        self.assertEqual(len(fake_cloudinary.uploads), 2)
+
+    def test_synchronous_upload_and_unreadable_image(self):
+        response = self.api.post("/shein_shop/image_upload/", {"image": self.photo()})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            response.json()["thumbnail_url"], "https://res.cloudinary.test/fake/2.jpg"
+        )
+        self.assertEqual(self.uploaded_size(0), ("WEBP", (50, 100)))
+        picture = SimpleUploadedFile("foto.jpg", b"imagen", "image/jpeg")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(
+                "/shein_shop/image_upload/?async=true", {"image": picture}
+            )
+        image = EvidenceImages.objects.get(pk=response.json()["id"])
+        self.assertEqual((image.status, image.attempts), (EvidenceImages.FAILED, 1))
+        self.assertEqual(fake_cloudinary.uploads[2:], [])
+
+    def test_delete_removes_the_record_and_both_assets(self):
+        self.api.post("/shein_shop/image_upload/", {"image": self.photo()})
+        response = self.api.delete(
+            "/shein_shop/image_upload/", {"public_id": "fake/1"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"destroy result": {"result": "ok"}})
+        self.assertEqual(fake_cloudinary.destroyed, ["fake/1", "fake/2"])
+        self.assertFalse(EvidenceImages.objects.exists())
+
+    def test_batch_upload_attaches_to_package(self):
+        logistical = CustomUser.objects.create_user(
+            "logistico", "logistico@example.com", "secreta", is_logistical=True
+        )
+        package = Package.objects.create(agency_name="agencia", number_of_tracking="1")
+        self.api.force_authenticate(user=logistical)
+        files = [self.photo(), self.photo(), SimpleUploadedFile("nota.txt", b"texto")]
+        with override_settings(IMAGE_BATCH_WORKERS=2):
+            response = self.api.post(
+                "/shein_shop/image_upload/batch/",
+                {"images": files, "package": package.id},
+            )
+        self.assertEqual(response.status_code, 201)
+        results = response.json()
+        names = [row["name"] for row in results]
+        self.assertEqual(names, ["foto.jpg", "foto.jpg", "nota.txt"])
+        self.assertIn("error", results[2])
+        ids = {row["id"] for row in results[:2]}
+        self.assertEqual(set(package.package_picture.values_list("id", flat=True)), ids)
+        self.assertEqual(len(fake_cloudinary.uploads), 4)
+        self.assertEqual(os.listdir(settings.IMAGE_UPLOAD_DIR), [])
+        response = self.api.post(
+            "/shein_shop/image_upload/batch/",
+            {"images": [self.photo()], "package": package.id, "deliver_receip": 1},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_failed_batch_attach_destroys_the_uploads(self):
+        logistical = CustomUser.objects.create_user(
+            "logistico", "logistico@example.com", "secreta", is_logistical=True
+        )
+        package = Package.objects.create(agency_name="agencia", number_of_tracking="1")
+        self.api.force_authenticate(user=logistical)
+        self.api.raise_request_exception = False
+        with mock.patch.object(
+            EvidenceImages.objects, "bulk_create", side_effect=RuntimeError("sin red")
+        ):
+            response = self.api.post(
+                "/shein_shop/image_upload/batch/",
+                {"images": [self.photo()], "package": package.id},
+            )
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(EvidenceImages.objects.exists())
+        self.assertEqual(fake_cloudinary.destroyed, ["fake/1", "fake/2"])
+
+
+@override_settings(
+    EMAIL_TRANSPORT="api.tests.fake_email_send",
+    EMAIL_SEND_RATE=0,
+    EMAIL_OUTBOX_RETRY_DELAY=60,
+    EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+    VERIFICATION_URL="https://allbuys.test/verify/",
+)
+class EmailOutboxTests(TestCase):
+    """Emails are written to the outbox and sent by a worker"""
+
+    def setUp(self):
+        fake_email.reset()
+
+    def sign_up(self, email):
+        return APIClient().post(
+            "/shein_shop/user/",
+            {
+                "email": email,
+                "name": "Ana",
+                "last_name": "Pérez",
+                "password": "secreta",
+                "phone_number": "+5355555555",
+                "home_address": "La Habana",
+            },
+        )
+
+    def test_signup_queues_verification_email(self):
+        self.assertEqual(self.sign_up("ana@example.com").status_code, 201)
+        self.assertEqual(self.sign_up("ana@example.com").status_code, 400)
+        self.assertEqual(fake_email.sent, [])
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.kind, OutboxEmail.VERIFICATION)
+        secret = CustomUser.objects.get(email="ana@example.com").verification_secret
+        self.assertEqual(send_pending(), (1, 0))
+        [message] = fake_email.sent
+        self.assertEqual(message["to"], ["ana@example.com"])
+        self.assertIn(f"https://allbuys.test/verify/{secret}", message["html"])
+        self.assertIn("Ana", message["html"])
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.SENT)
+        self.assertIs(get_template("email_html.html"), get_template("email_html.html"))
+
+    def test_retries_with_backoff_until_failed(self):
+        CustomUser.objects.create_user("ana", "ana@example.com", "secreta")
+        APIClient().post("/shein_shop/password/", {"email": "ana@example.com"})
+        fake_email.reset(fail_times=2)
+        self.assertEqual(send_pending(), (0, 1))
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.kind, OutboxEmail.PASSWORD_RECOVERY)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        # No vuelve a intentarlo antes de tiempo
+        self.assertEqual(send_pending(), (0, 0))
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(send_pending(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.FAILED, 2))
+        self.assertEqual(email.last_error, "Servidor de correo no disponible")
+
+    @override_settings(EMAIL_VERIFICATION_BCC=["operador@example.com"])
+    def test_only_verification_is_copied_to_operators(self):
+        self.sign_up("ana@example.com")
+        APIClient().post("/shein_shop/password/", {"email": "ana@example.com"})
+        self.assertEqual(send_pending(), (2, 0))
+        verification, recovery = fake_email.sent
+        self.assertEqual(verification["to"], ["ana@example.com"])
+        self.assertEqual(verification["bcc"], ["operador@example.com"])
+        self.assertEqual(recovery["to"], ["ana@example.com"])
+        self.assertNotIn("bcc", recovery)
+
+    def test_rate_limit_and_batches(self):
+        for number in range(5):
+            OutboxEmail.objects.create(
+                kind=OutboxEmail.VERIFICATION,
+                to_email=f"user{number}@example.com",
+                context={"user_name": "Ana", "verification_url": "x"},
+            )
+        clock = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        limiter = RateLimiter(2, sleep=sleep, clock=lambda: clock[0])
+        # Cada lote: savepoint, select, update, release y lectura; luego un
+        # update por correo y un último lote vacío
+        with self.assertNumQueries(3 * 5 + 5 + 3):
+            self.assertEqual(send_pending(batch_size=2, limiter=limiter), (5, 0))
+        self.assertEqual(sleeps, [0.5] * 4)
+
+
+@override_settings(
+    EMAIL_TRANSPORT="api.tests.fake_email_send",
+    EMAIL_SEND_RATE=0,
+)
+class StatusDigestTests(TestCase):
+    """Status changes reach clients as one digest per client"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user(
+            "Luis", "cliente@example.com", "secreta"
+        )
+        cls.agent = CustomUser.objects.create_user(
+            "agente", "agente@example.com", "secreta", is_agent=True
+        )
+        cls.orders = create_order_graph(2, cls.client_user, cls.agent)
+
+    def setUp(self):
+        fake_email.reset()
+
+    def test_status_engine_and_orders_queue_one_digest(self):
+        products = Product.objects.filter(order__in=self.orders)
+        changed = update_product_statuses([product.id for product in products])
+        self.assertEqual(len(changed), 2)
+        order = self.orders[0]
+        order.status = "Entregado"
+        order.save()
+        order.save()
+        self.assertEqual(StatusChangeEvent.objects.count(), 3)
+
+        self.assertEqual(send_status_digests(), (3, 1))
+        self.assertEqual(send_status_digests(), (0, 0))
+        digest = OutboxEmail.objects.get(kind=OutboxEmail.STATUS_DIGEST)
+        self.assertEqual(digest.to_email, "cliente@example.com")
+        self.assertEqual(
+            {(c["order_id"], c["product"]) for c in digest.context["changes"]},
+            {
+                (self.orders[0].id, None),
+                (self.orders[0].id, "producto"),
+                (self.orders[1].id, "producto"),
+            },
+        )
+        with override_settings(EMAIL_VERIFICATION_BCC=["operador@example.com"]):
+            self.assertEqual(send_pending(), (1, 0))
+        [message] = fake_email.sent
+        self.assertEqual(message["to"], ["cliente@example.com"])
+        self.assertNotIn("bcc", message)
+        self.assertIn(f"Pedido #{order.id}", message["html"])
+        self.assertIn("Luis", message["html"])
+
+    def test_changes_of_a_line_are_coalesced(self):
+        order = self.orders[0]
+        product = order.products.get()
+        record_status_changes(
+            [
+                (self.client_user.id, order.id, product.id, "Encargado", "Comprado"),
+                (self.client_user.id, order.id, product.id, "Comprado", "Recibido"),
+                (self.client_user.id, order.id, None, "Encargado", "Pagado"),
+                (self.client_user.id, order.id, None, "Pagado", "Encargado"),
+            ]
+        )
+        # Savepoint, eventos, clientes, correos, dos updates de 2 ids y release
+        with self.assertNumQueries(7):
+            self.assertEqual(send_status_digests(chunk_size=2), (4, 1))
+        [change] = OutboxEmail.objects.get().context["changes"]
+        self.assertEqual(
+            (change["previous_status"], change["status"]), ("Encargado", "Recibido")
+        )
+
+
+@override_settings(DATABASE_REPLICAS=["replica1", "replica2"])
+class ReplicaRouterTests(SimpleTestCase):
+    """Reads go to replicas only when allowed and before any write"""
+
+    def setUp(self):
+        self.router = db_routing.ReplicaRouter()
+        self.token = db_routing.start_request()
+        self.addCleanup(db_routing.end_request, self.token)
+        self.primary = mock.Mock(in_atomic_block=False)
+        patcher = mock.patch.object(
+            db_routing, "connections", {"default": self.primary}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_follow_the_request(self):
+        self.assertEqual(self.router.db_for_read(Order), "default")
+        db_routing.read_from_replicas()
+        self.assertIn(self.router.db_for_read(Order), ["replica1", "replica2"])
+        self.primary.in_atomic_block = True
+        self.assertEqual(self.router.db_for_read(Order), "default")
+        self.primary.in_atomic_block = False
+        # Tras escribir, la petición lee lo que escribió
+        self.assertEqual(self.router.db_for_write(Order), "default")
+        self.assertEqual(self.router.db_for_read(Order), "default")
+
+    def test_each_request_starts_on_the_primary(self):
+        db_routing.read_from_replicas()
+        token = db_routing.start_request()
+        self.assertEqual(self.router.db_for_read(Order), "default")
+        db_routing.end_request(token)
+        self.assertNotEqual(self.router.db_for_read(Order), "default")
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.router.db_for_read(Order), "default")
+
+
+class ReplicaReadMixinTests(TestCase):
+    """List and filter actions and reports ask for replica reads"""
+
+    def test_read_actions_use_replicas(self):
+        agent = CustomUser.objects.create_user(
+            "agente", "agente@example.com", "secreta", is_agent=True
+        )
+        api = APIClient()
+        api.force_authenticate(user=agent)
+        with mock.patch("api.views.read_from_replicas") as read_from_replicas:
+            api.get("/shein_shop/order/")
+            api.post("/shein_shop/product/product_filter/", {}, format="json")
+            api.get("/shein_shop/product/")
+            self.assertEqual(read_from_replicas.call_count, 3)
+            api.post("/shein_shop/order/", {}, format="json")
+            api.get("/shein_shop/commission/")
+            self.assertEqual(read_from_replicas.call_count, 4)
+
+
+@override_settings(DATABASE_REPLICAS=["sin-replica"], FILTER_CACHE_ALIAS="default")
+class ReplicaReadOrderTests(TransactionTestCase):
+    """Authentication, permissions and cached responses read the primary"""
+
+    def test_cached_reads_skip_the_replicas(self):
+        # Cualquier lectura en la réplica fallaría: el alias no existe
+        agent = CustomUser.objects.create_user(
+            "agente", "agente@example.com", "secreta", is_agent=True
+        )
+        api = APIClient()
+        with mock.patch("api.views.read_from_replicas") as read_from_replicas:
+            response = api.post("/shein_shop/order/order_filter/", {}, format="json")
+        self.assertEqual(response.status_code, 401)
+        read_from_replicas.assert_not_called()
+        api.force_authenticate(user=agent)
+        for cache_status in ("MISS", "HIT"):
+            response = api.post(
+                "/shein_shop/product/product_filter/", {}, format="json"
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["X-Filter-Cache"], cache_status)
+        self.assertEqual(get_common_information(), CommonInformation.get_instance())
+        with self.assertRaises(ConnectionDoesNotExist):
+            api.get("/shein_shop/order/")
+
+
+class SQLiteProfileTests(SimpleTestCase):
+    """The SQLite profile keeps every write of parallel writers"""
+
+    def test_parallel_writers(self):
+        # La base de datos temporal no existe en settings.DATABASES
+        allowed = mock.patch.object(
+            type(self), "databases", frozenset({sqlite_stress.ALIAS})
+        )
+        with allowed, tempfile.TemporaryDirectory() as directory:
+            result = sqlite_stress.run_writers(
+                os.path.join(directory, "stress.sqlite3"), 8, 25
+            )
+        self.assertEqual(result["errors"], [])
+        self.assertEqual((result["committed"], result["counter"]), (200, 200))
+
+
+class GenerateDatasetTests(TestCase):
+    """The same seed generates the same consistent dataset"""
+
+    def generate(self, seed):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "generate_dataset",
+                products=300,
+                seed=seed,
+                yes=True,
+                stdout=io.StringIO(),
+            )
+        return (
+            set(
+                Product.objects.values_list(
+                    "id",
+                    "name",
+                    "amount_requested",
+                    "total_cost",
+                    "total_amount_buyed",
+                    "total_amount_delivered",
+                    "status",
+                    "order__client__email",
+                    "order__creation_date",
+                )
+            ),
+            set(
+                ProductBuyed.objects.values_list(
+                    "original_product", "amount_buyed", "actual_cost_of_product"
+                )
+            ),
+            set(
+                ProductReceived.objects.values_list(
+                    "original_product",
+                    "amount_received",
+                    "amount_delivered",
+                    "package_where_was_send__number_of_tracking",
+                    "deliver_receip__weight",
+                )
+            ),
+        )
+
+    def test_same_seed_same_dataset(self):
+        # Deshacer cada generación es mucho más rápido que borrar en cascada
+        savepoint = transaction.savepoint()
+        first = self.generate(7)
+        self.assertEqual(len(first[0]), 300)
+        self.assertEqual(stale_products(), [])
+        self.assertEqual(stale_orders(), [])
+        self.assertFalse(
+            ProductReceived.objects.filter(
+                amount_delivered__gt=F("amount_received")
+            ).exists()
+        )
+        self.assertFalse(
+            Product.objects.filter(
+                total_amount_buyed__gt=F("amount_requested")
+            ).exists()
+        )
+        self.assertTrue(ReportRollup.objects.exists())
+        self.assertTrue(AgentCommission.objects.exists())
+        self.assertTrue(
+            CustomUser.objects.get(email="cliente1@dataset.test").check_password(
+                "dataset"
+            )
+        )
+        self.assertFalse(
+            CustomUser.objects.get(
+                email="contador1@dataset.test"
+            ).has_usable_password()
+        )
+        with self.assertRaises(CommandError):
+            call_command(
+                "generate_dataset", products=10, yes=True, stdout=io.StringIO()
+            )
+        transaction.savepoint_rollback(savepoint)
+
+        savepoint = transaction.savepoint()
+        self.assertEqual(self.generate(7), first)
+        transaction.savepoint_rollback(savepoint)
+        self.assertNotEqual(self.generate(8)[0], first[0])
+
+    def test_refuses_without_debug_or_confirmation(self):
+        with self.assertRaisesMessage(CommandError, "--yes"):
+            call_command("generate_dataset", products=10, stdout=io.StringIO())
+        self.assertFalse(CustomUser.objects.exists())
@@ -0,0 +1,136 @@
+"Comisiones de los agentes por mes"
+import datetime
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Count, DateField, Max, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from api.models import AgentCommission, CustomUser, Order
+from api.utils.report_rollups import month_bounds, month_start
+
+# Pedidos guardados antes de un cálculo pero confirmados después siguen
+# entrando en el siguiente
+WATERMARK_MARGIN = datetime.timedelta(minutes=5)
+
+
+def last_run():
+    """Start of the last calculation, or None if there was none"""
+    return AgentCommission.objects.aggregate(last=Max("computed_at"))["last"]
+
+
+def periods_to_refresh(since):
+    """Months with orders changed after `since` or with stale statements"""
+    changed = Order.objects.filter(updated_at__gt=since - WATERMARK_MARGIN).exclude(
+        creation_date=None
+    )
+    periods = {
+        month_start(value) for value in changed.datetimes("creation_date", "month")
+    }
+    periods.update(
+        AgentCommission.objects.filter(stale=True)
+        .values_list("period", flat=True)
+        .distinct()
+    )
+    return periods
+
+
+def aggregate_sales(periods=None):
+    """
+    Orders and sales of every agent per month, in one GROUP BY over the
+    orders of the given months (all months when None).
+    """
+    orders = Order.objects.exclude(creation_date=None)
+    if periods is not None:
+        if not periods:
+            return {}
+        orders = orders.filter(
+            reduce(
+                or_,
+                (
+                    Q(creation_date__gte=start, creation_date__lt=end)
+                    for start, end in map(month_bounds, periods)
+                ),
+            )
+        )
+    rows = (
+        orders.annotate(period=TruncMonth("creation_date", output_field=DateField()))
+        .order_by()
+        .values("sales_manager_id", "period")
+        .annotate(orders_count=Count("id"), sales=Sum("products_total_cost"))
+    )
+    return {
+        (row["sales_manager_id"], row["period"]): (row["orders_count"], row["sales"])
+        for row in rows
+    }
+
+
+def compute_commissions(full=False):
+    """
+    Recompute the commission statements of the months that changed since the
+    last calculation, or of every month with `full`, and write only the
+    statements that differ.
+    Returns the number of statements created, updated and deleted.
+    """
+    started_at = timezone.now()
+    since = None if full else last_run()
+    periods = None if since is None else periods_to_refresh(since)
+    totals = aggregate_sales(periods)
+    rates = dict(
+        CustomUser.objects.filter(
+            id__in={agent_id for agent_id, _period in totals}
+        ).values_list("id", "agent_profit")
+    )
+
+    with transaction.atomic():
+        statements = AgentCommission.objects.select_for_update()
+        if periods is not None:
+            statements = statements.filter(period__in=periods)
+        existing = {(s.agent_id, s.period): s for s in statements}
+
+        created, updated = [], []
+        for (agent_id, period), (orders_count, sales) in totals.items():
+            rate = rates.get(agent_id, 0)
+            values = {
+                "orders_count": orders_count,
+                "sales": sales,
+                "rate": rate,
+                "commission": sales * rate / 100,
+            }
+            statement = existing.pop((agent_id, period), None)
+            if statement is None:
+                created.append(
+                    AgentCommission(
+                        agent_id=agent_id,
+                        period=period,
+                        computed_at=started_at,
+                        **values,
+                    )
+                )
+            elif statement.stale or any(
+                getattr(statement, field) != value for field, value in values.items()
+            ):
+                for field, value in values.items():
+                    setattr(statement, field, value)
+                statement.stale = False
+                statement.computed_at = started_at
+                updated.append(statement)
+
+        AgentCommission.objects.bulk_create(created)
+        AgentCommission.objects.bulk_update(
+            updated,
+            ["orders_count", "sales", "rate", "commission", "stale", "computed_at"],
+        )
+        # Agentes que ya no tienen pedidos en esos meses
+        removed = [statement.pk for statement in existing.values()]
+        AgentCommission.objects.filter(pk__in=removed).delete()
+    return len(created), len(updated), len(removed)
+
+
+def mark_commissions_stale(*pairs):
+    """Flag the statements of (agent, date) pairs an order left"""
+    condition = Q(pk__in=[])
+    for agent_id, date in pairs:
+        if agent_id and date:
+            condition |= Q(agent_id=agent_id, period=month_start(date))
+    AgentCommission.objects.filter(condition).update(stale=True)
@@ -0,0 +1,52 @@
+"Cache de la información común"
+import time
+from django.conf import settings
+from django.core.cache import caches
+from api.models import CommonInformation
+from api.utils.db_routing import read_from_primary
+
+CACHE_KEY = "api:common_information"
+
+_local = {"instance": None, "expires_at": 0.0}
+
+
+def _shared_cache():
+    """Shared cache configured for the common information, if any"""
+    alias = getattr(settings, "COMMON_INFORMATION_CACHE_ALIAS", None)
+    return caches[alias] if alias else None
+
+
+def get_common_information():
+    """
+    Singleton of CommonInformation kept in COMMON_INFORMATION_CACHE_ALIAS
+    when it is set, otherwise in a process-local cache. It is always read
+    from the primary, since a replica may still have the old values.
+    """
+    timeout = getattr(settings, "COMMON_INFORMATION_CACHE_TIMEOUT", 300)
+    shared = _shared_cache()
+    if shared is not None:
+        # Sin capa local: otro proceso puede haber invalidado la clave compartida
+        instance = shared.get(CACHE_KEY)
+        if instance is None:
+            with read_from_primary():
+                instance = CommonInformation.get_instance()
+            shared.set(CACHE_KEY, instance, timeout)
+        return instance
+
+    now = time.monotonic()
+    instance = _local["instance"]
+    if instance is None or _local["expires_at"] <= now:
+        with read_from_primary():
+            instance = CommonInformation.get_instance()
+        _local["instance"] = instance
+        _local["expires_at"] = now + timeout
+    return instance
+
+
+def invalidate_common_information():
+    """Drop the cached common information in this process and the shared cache"""
+    _local["instance"] = None
+    _local["expires_at"] = 0.0
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(CACHE_KEY)
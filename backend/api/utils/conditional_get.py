@@ -0,0 +1,53 @@
+"Validadores ETag y Last-Modified calculados por la base de datos"
+import hashlib
+import json
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from api.utils.filter_cache import get_model_versions
+
+
+def validators(request, queryset, models=()):
+    """
+    ETag and last modification of the rows of `queryset`, from one aggregate
+    query with their count and latest updated_at, without reading the rows.
+    The ETag also covers the request path, the response format and the
+    versions of `models`, whose rows are serialized along with these.
+    """
+    summary = queryset.order_by().aggregate(
+        count=Count("pk"), last_modified=Max("updated_at")
+    )
+    last_modified = summary["last_modified"]
+    fingerprint = json.dumps(
+        [
+            request.get_full_path(),
+            request.accepted_renderer.format,
+            summary["count"],
+            last_modified.isoformat() if last_modified else None,
+            get_model_versions(models),
+        ]
+    )
+    etag = '"' + hashlib.sha256(fingerprint.encode()).hexdigest()[:32] + '"'
+    return etag, last_modified
+
+
+def not_modified_response(request, etag, last_modified, use_last_modified=True):
+    """304 response when the client copy is current, otherwise None"""
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=(
+            int(last_modified.timestamp())
+            if use_last_modified and last_modified
+            else None
+        ),
+    )
+
+
+def set_validators(response, etag, last_modified):
+    """Add the validators and ask clients to always revalidate"""
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,365 @@
+"Datos sintéticos reproducibles para pruebas de carga"
+import datetime
+import random
+import uuid
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from api.models import (
+    BuyingAccounts,
+    CommonInformation,
+    CustomUser,
+    DeliverReceip,
+    Order,
+    Package,
+    Product,
+    ProductBuyed,
+    ProductReceived,
+    Shop,
+    ShoppingReceip,
+)
+from api.utils.agent_commissions import compute_commissions
+from api.utils.filter_cache import bump_model_versions
+from api.utils.order_totals import refresh_order_totals
+from api.utils.product_search import index_products
+from api.utils.product_status import compute_status
+from api.utils.report_rollups import rebuild_rollups
+
+EMAIL_DOMAIN = "dataset.test"
+PASSWORD = "dataset"
+
+SHOPS = [
+    ("Shein", "https://shein.com", 0),
+    ("Amazon", "https://amazon.com", 7),
+    ("Temu", "https://temu.com", 0),
+    ("Walmart", "https://walmart.com", 7),
+    ("AliExpress", "https://aliexpress.com", 0),
+    ("eBay", "https://ebay.com", 5),
+]
+BUYING_ACCOUNTS = ["compras-1", "compras-2", "compras-3", "compras-4"]
+AGENCIES = ["Cubamax", "Envíos Habana", "Caribe Express", "Aerovaradero"]
+CATEGORIES = {
+    "Ropa": ["Blusa", "Vestido", "Pantalón", "Camisa", "Abrigo", "Falda"],
+    "Calzado": ["Zapatillas", "Sandalias", "Botas", "Tenis"],
+    "Electrónica": ["Audífonos", "Cargador", "Teléfono", "Reloj", "Bocina"],
+    "Hogar": ["Sábanas", "Lámpara", "Cortinas", "Sartén", "Toallas"],
+    "Belleza": ["Perfume", "Crema", "Labial", "Secador", "Champú"],
+    "Juguetes": ["Muñeca", "Carrito", "Peluche", "Rompecabezas"],
+}
+ADJECTIVES = ["negro", "blanco", "rojo", "azul", "grande", "pequeño", "clásico"]
+
+
+class DatasetGenerator:
+    """
+    Seeded generator of clients, agents, orders, products, buys, receptions
+    and deliveries. The same seed and sizes always produce the same rows;
+    only the auto_now timestamps and the integer ids depend on the database.
+    Quantities satisfy the serializer rules: a product is never bought
+    beyond what was requested, received beyond what was bought, nor
+    delivered beyond what each reception holds.
+    """
+
+    def __init__(
+        self,
+        products,
+        seed=0,
+        clients=None,
+        agents=None,
+        chunk_size=2000,
+        start=datetime.date(2024, 1, 1),
+        months=12,
+    ):
+        self.products = products
+        self.seed = seed
+        self.clients = clients or max(products // 20, 10)
+        self.agents = agents or max(products // 2000, 5)
+        self.chunk_size = chunk_size
+        self.start = timezone.make_aware(
+            datetime.datetime.combine(start, datetime.time.min)
+        )
+        self.days = months * 30
+        self.rng = random.Random(seed)
+        self.counts = dict.fromkeys(
+            [
+                "users",
+                "orders",
+                "products",
+                "shopping_receips",
+                "buys",
+                "packages",
+                "receptions",
+                "deliveries",
+            ],
+            0,
+        )
+
+    # Valores aleatorios
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def moment(self, after, days):
+        return after + datetime.timedelta(seconds=self.rng.randrange(days * 86400))
+
+    def reached(self, amount, chance):
+        """All of `amount` with probability `chance`, otherwise a part of it"""
+        if amount == 0 or self.rng.random() < chance:
+            return amount
+        return self.rng.randint(0, amount)
+
+    def split(self, amount):
+        """Positive parts adding up to `amount`, in one or two lines"""
+        if amount >= 2 and self.rng.random() < 0.3:
+            first = self.rng.randint(1, amount - 1)
+            return [first, amount - first]
+        return [amount] if amount else []
+
+    # Catálogo y usuarios
+
+    def create_catalog(self):
+        self.shops = [
+            Shop.objects.get_or_create(
+                name=name, defaults={"link": link, "taxes": taxes}
+            )[0]
+            for name, link, taxes in SHOPS
+        ]
+        self.accounts = [
+            BuyingAccounts.objects.get_or_create(account_name=name)[0]
+            for name in BUYING_ACCOUNTS
+        ]
+        information = CommonInformation.get_instance()
+        if not information.cost_per_pound:
+            information.cost_per_pound = 4.5
+            information.change_rate = 320
+            information.save()
+
+    def create_users(self):
+        # Un solo hash con sal fija: hashear cada usuario llevaría horas. Los
+        # roles del personal no pueden entrar con contraseña
+        password = make_password(PASSWORD, salt=f"dataset{self.seed}")
+        staff = ("is_buyer", "is_logistical", "is_accountant")
+        roles = (
+            [("cliente", {})] * self.clients
+            + [("agente", {"is_agent": True})] * self.agents
+            + [
+                ("comprador", {"is_buyer": True}),
+                ("logistico", {"is_logistical": True}),
+                ("contador", {"is_accountant": True}),
+            ]
+        )
+        numbers = {}
+        users = []
+        for role, flags in roles:
+            numbers[role] = numbers.get(role, 0) + 1
+            if flags.get("is_agent"):
+                flags = {**flags, "agent_profit": self.rng.choice([5, 8, 10, 12, 15])}
+            user = CustomUser(
+                email=f"{role}{numbers[role]}@{EMAIL_DOMAIN}",
+                name=role.capitalize(),
+                last_name=str(numbers[role]),
+                home_address=f"Calle {self.rng.randint(1, 300)}, La Habana",
+                phone_number=f"+535{self.rng.randint(1000000, 9999999)}",
+                password=password,
+                is_active=True,
+                is_verified=True,
+                date_joined=self.moment(self.start, 30),
+                **flags,
+            )
+            if any(flags.get(flag) for flag in staff):
+                user.set_unusable_password()
+            users.append(user)
+        CustomUser.objects.bulk_create(users, batch_size=self.chunk_size)
+        self.counts["users"] = len(users)
+        self.client_users = [user for user in users if user.email.startswith("cliente")]
+        self.agent_users = [user for user in users if user.is_agent]
+
+    # Pedidos
+
+    def new_chunk(self):
+        self.chunk = {
+            Order: [],
+            ShoppingReceip: [],
+            Package: [],
+            DeliverReceip: [],
+            Product: [],
+            ProductBuyed: [],
+            ProductReceived: [],
+        }
+        self.package = None
+        self.package_room = 0
+
+    def current_package(self, date):
+        if self.package_room == 0:
+            agency = self.rng.choice(AGENCIES)
+            self.package = Package(
+                agency_name=agency,
+                number_of_tracking=f"DS{self.seed}-{self.rng.getrandbits(40):012x}",
+                status_of_processing=self.rng.choice(["Enviado", "Recibido"]),
+            )
+            self.package_room = self.rng.randint(20, 60)
+            self.chunk[Package].append(self.package)
+        self.package_room -= 1
+        return self.package
+
+    def add_product(self, order, stage, receipts, delivers):
+        category = self.rng.choice(sorted(CATEGORIES))
+        shop = self.rng.choice(self.shops)
+        requested = self.rng.randint(1, 6)
+        shop_cost = round(self.rng.uniform(1.5, 90), 2)
+        delivery_cost = self.rng.choice([0, 0, 2.99, 4.99])
+        own_taxes = round(shop_cost * requested * 0.1, 2)
+        product = Product(
+            id=self.uuid(),
+            sku=f"{shop.name[:3].upper()}{self.rng.randint(100000, 999999)}",
+            name=(
+                f"{self.rng.choice(CATEGORIES[category])} "
+                f"{self.rng.choice(ADJECTIVES)}"
+            ),
+            link=f"{shop.link}/p/{self.rng.getrandbits(32)}",
+            shop=shop,
+            category=category,
+            amount_requested=requested,
+            order=order,
+            shop_cost=shop_cost,
+            shop_delivery_cost=delivery_cost,
+            own_taxes=own_taxes,
+            total_cost=round(
+                shop_cost * requested * (1 + shop.taxes / 100)
+                + delivery_cost
+                + own_taxes,
+                2,
+            ),
+        )
+
+        buyed = self.reached(requested, min(stage * 1.5, 1))
+        cost_buyed = 0
+        for amount in self.split(buyed):
+            if shop.pk not in receipts:
+                receipts[shop.pk] = ShoppingReceip(
+                    shopping_account=self.rng.choice(self.accounts),
+                    shop_of_buy=shop,
+                    status_of_shopping=self.rng.choice(["No pagado", "Pagado"]),
+                    buy_date=self.moment(order.creation_date, 10),
+                )
+                self.chunk[ShoppingReceip].append(receipts[shop.pk])
+            receipt = receipts[shop.pk]
+            cost = round(shop_cost * amount * self.rng.uniform(0.85, 1), 2)
+            cost_buyed += cost
+            self.chunk[ProductBuyed].append(
+                ProductBuyed(
+                    original_product=product,
+                    order=order,
+                    shoping_receip=receipt,
+                    buy_date=receipt.buy_date,
+                    amount_buyed=amount,
+                    actual_cost_of_product=cost,
+                    real_cost_of_product=cost,
+                )
+            )
+
+        received = self.reached(buyed, stage)
+        delivered = 0
+        for amount in self.split(received):
+            reception_date = self.moment(
+                order.creation_date + datetime.timedelta(10), 20
+            )
+            reception = ProductReceived(
+                original_product=product,
+                order=order,
+                package_where_was_send=self.current_package(reception_date),
+                reception_date_in_eeuu=reception_date.date(),
+                amount_received=amount,
+            )
+            amount_delivered = self.reached(amount, stage * 0.8)
+            if amount_delivered:
+                if not delivers or (len(delivers) < 2 and self.rng.random() < 0.2):
+                    delivers.append(
+                        DeliverReceip(
+                            order=order,
+                            weight=0,
+                            status=self.rng.choice(["Enviado", "Entregado"]),
+                            deliver_date=self.moment(
+                                reception_date + datetime.timedelta(5), 20
+                            ),
+                        )
+                    )
+                    self.chunk[DeliverReceip].append(delivers[-1])
+                deliver = self.rng.choice(delivers)
+                deliver.weight = round(
+                    deliver.weight + amount_delivered * self.rng.uniform(0.2, 3), 2
+                )
+                reception.amount_delivered = amount_delivered
+                reception.deliver_receip = deliver
+                delivered += amount_delivered
+            self.chunk[ProductReceived].append(reception)
+
+        # Los totales y el estado que mantienen las señales y el motor de estados
+        product.total_amount_buyed = buyed
+        product.total_cost_buyed = cost_buyed
+        product.total_amount_received = received
+        product.total_amount_delivered = delivered
+        product.status = compute_status(requested, buyed, received, delivered)
+        self.chunk[Product].append(product)
+
+    def add_order(self, size):
+        order = Order(
+            client=self.rng.choice(self.client_users),
+            sales_manager=self.rng.choice(self.agent_users),
+            pay_status=self.rng.choice(["No pagado", "Pagado"]),
+            creation_date=self.moment(self.start, self.days),
+        )
+        # Qué tan avanzado está el pedido: compras, recepciones y entregas
+        stage = self.rng.random()
+        receipts = {}
+        delivers = []
+        self.chunk[Order].append(order)
+        for _ in range(size):
+            self.add_product(order, stage, receipts, delivers)
+
+    def flush(self):
+        """Write the rows of the chunk, parents before children"""
+        with transaction.atomic():
+            for model, rows in self.chunk.items():
+                model.objects.bulk_create(rows, batch_size=self.chunk_size)
+            refresh_order_totals([order.pk for order in self.chunk[Order]])
+        self.counts["orders"] += len(self.chunk[Order])
+        self.counts["products"] += len(self.chunk[Product])
+        self.counts["shopping_receips"] += len(self.chunk[ShoppingReceip])
+        self.counts["buys"] += len(self.chunk[ProductBuyed])
+        self.counts["packages"] += len(self.chunk[Package])
+        self.counts["receptions"] += len(self.chunk[ProductReceived])
+        self.counts["deliveries"] += len(self.chunk[DeliverReceip])
+        self.new_chunk()
+
+    def generate(self, progress=None):
+        """
+        Write the whole graph in chunks of about `chunk_size` products, then
+        rebuild what bulk_create skips: search index, report rollups and
+        agent commissions. `progress` is called with the counts per chunk.
+        """
+        self.create_catalog()
+        self.create_users()
+        self.new_chunk()
+        remaining = self.products
+        while remaining:
+            size = min(self.rng.randint(5, 50), remaining)
+            self.add_order(size)
+            remaining -= size
+            if len(self.chunk[Product]) >= self.chunk_size or not remaining:
+                self.flush()
+                if progress:
+                    progress(self.counts)
+        index_products()
+        rebuild_rollups()
+        compute_commissions(full=True)
+        bump_model_versions(
+            CustomUser,
+            Order,
+            Product,
+            ShoppingReceip,
+            ProductBuyed,
+            Package,
+            ProductReceived,
+            DeliverReceip,
+        )
+        return self.counts
@@ -0,0 +1,102 @@
+"Lecturas en réplicas de la base de datos"
+import contextlib
+import contextvars
+import random
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class RoutingState:
+    """Whether the current request may read from replicas and has written"""
+
+    def __init__(self):
+        self.replica_reads = False
+        self.wrote = False
+
+
+_state = contextvars.ContextVar("db_routing_state", default=None)
+
+
+def get_state():
+    state = _state.get()
+    if state is None:
+        state = RoutingState()
+        _state.set(state)
+    return state
+
+
+def start_request():
+    """Fresh routing state for a request; pass the token to end_request"""
+    return _state.set(RoutingState())
+
+
+def end_request(token):
+    _state.reset(token)
+
+
+def read_from_replicas():
+    """Let the reads of the current request go to a replica"""
+    get_state().replica_reads = True
+
+
+@contextlib.contextmanager
+def read_from_primary():
+    """
+    Send the reads inside the block to the primary even if the request
+    allowed replicas, for data that is about to be cached
+    """
+    state = get_state()
+    replica_reads = state.replica_reads
+    state.replica_reads = False
+    try:
+        yield
+    finally:
+        state.replica_reads = replica_reads
+
+
+def pick_replica():
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+class ReplicaRouter:
+    """
+    Send reads to a random replica when the request allowed it, except after
+    the request wrote anything or inside a transaction, so it always reads
+    its own writes. Writes always go to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            state is None
+            or not state.replica_reads
+            or state.wrote
+            or not settings.DATABASE_REPLICAS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return pick_replica()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas tienen los mismos datos que la primaria
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """Give every request its own routing state"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = start_request()
+        try:
+            return self.get_response(request)
+        finally:
+            end_request(token)
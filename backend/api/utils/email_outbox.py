@@ -0,0 +1,98 @@
+"Bandeja de salida de correos"
+import datetime
+import time
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from api.models import OutboxEmail
+from api.utils.email_sender import get_transport, render_email
+
+
+def queue_email(kind, to_email, **context):
+    """
+    Write an email to the outbox. Called inside the transaction that saves
+    the data it talks about, so it is sent only if that data is committed.
+    """
+    return OutboxEmail.objects.create(kind=kind, to_email=to_email, context=context)
+
+
+class RateLimiter:
+    """Space calls to at most `rate` per second; no limit when rate is 0"""
+
+    def __init__(self, rate, sleep=time.sleep, clock=time.monotonic):
+        self.interval = 1 / rate if rate else 0
+        self.sleep = sleep
+        self.clock = clock
+        self.next_at = None
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = self.clock()
+        if self.next_at is not None and now < self.next_at:
+            self.sleep(self.next_at - now)
+            now = self.next_at
+        self.next_at = now + self.interval
+
+
+def claim_batch(size):
+    """
+    Due pending emails, postponed by EMAIL_OUTBOX_LEASE seconds so other
+    workers skip them while they are sent. If the worker dies they become
+    due again once the lease runs out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")
+            .values_list("id", flat=True)[:size]
+        )
+        lease = datetime.timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+        OutboxEmail.objects.filter(id__in=ids).update(next_attempt_at=now + lease)
+    return list(OutboxEmail.objects.filter(id__in=ids).order_by("id"))
+
+
+def deliver(email, transport):
+    """Send one email, scheduling a retry with exponential backoff on errors"""
+    email.attempts += 1
+    try:
+        transport(render_email(email.kind, email.to_email, email.context))
+    except Exception as e:
+        email.last_error = str(e)
+        if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            email.status = OutboxEmail.FAILED
+        else:
+            delay = settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (email.attempts - 1)
+            email.next_attempt_at = timezone.now() + datetime.timedelta(seconds=delay)
+        email.save(
+            update_fields=["attempts", "last_error", "status", "next_attempt_at"]
+        )
+        return False
+    email.status = OutboxEmail.SENT
+    email.sent_at = timezone.now()
+    email.last_error = None
+    email.save(update_fields=["attempts", "status", "sent_at", "last_error"])
+    return True
+
+
+def send_pending(batch_size=None, limiter=None):
+    """
+    Send every due email in batches of `batch_size`, at most EMAIL_SEND_RATE
+    per second. Returns the number of emails sent and not sent.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    limiter = limiter or RateLimiter(settings.EMAIL_SEND_RATE)
+    transport = get_transport()
+    sent = failed = 0
+    while True:
+        batch = claim_batch(batch_size)
+        if not batch:
+            return sent, failed
+        for email in batch:
+            limiter.wait()
+            if deliver(email, transport):
+                sent += 1
+            else:
+                failed += 1
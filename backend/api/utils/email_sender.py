@@ -1,29 +1,59 @@
 "Email Sender"
+import functools
 import os
-from django.template import Context, Template
 from django.conf import settings
+from django.template import Context, Template
+from django.utils.module_loading import import_string
 import resend
 
+# Plantilla y asunto de cada tipo de correo
+EMAILS = {
+    "verification": (
+        "email_html.html",
+        "Verifica tu cuenta de usuario para {site}",
+    ),
+    "password_recovery": (
+        "password_recovery_html.html",
+        "Recupera tu contraseña de {site}",
+    ),
+    "status_digest": (
+        "status_digest_html.html",
+        "Novedades de tus pedidos en {site}",
+    ),
+}
 
-def send_email(to, to_email, verify_secret):
-    "Email Sender"
-    resend.api_key = settings.EMAIL_HOST_PASSWORD
-    subject = f"Verifica tu cuenta de usuario para {settings.WEB_SITE_NAME}"
-    html_template_path = os.path.join(os.path.dirname(__file__), "email_html.html")
+
+@functools.lru_cache(maxsize=None)
+def get_template(name):
+    "Template compiled once per process"
+    html_template_path = os.path.join(os.path.dirname(__file__), name)
     with open(html_template_path, "r", encoding="utf-8") as file:
-        html_template_content = file.read()
-    template = Template(html_template_content)
-    context = Context(
-        {
-            "user_name": to,
-            "verification_url": f"{settings.VERIFICATION_URL}{verify_secret}",
-        }
-    )
-    html_message = template.render(context)
-    params: resend.Emails.SendParams = {
-        "from": "Acme <onboarding@resend.dev>",
-        "to": ["aflopez000430@gmail.com", to_email],
-        "subject": subject,
-        "html": html_message,
+        return Template(file.read())
+
+
+def render_email(kind, to_email, context):
+    "Message of an outbox email, ready for the transport"
+    template_name, subject = EMAILS[kind]
+    message = {
+        "from": settings.EMAIL_FROM,
+        "to": [to_email],
+        "subject": subject.format(site=settings.WEB_SITE_NAME),
+        "html": get_template(template_name).render(Context(context)),
     }
-    resend.Emails.send(params)
+    # Solo la verificación lleva copia, y oculta: los enlaces de recuperación
+    # y los resúmenes de pedidos son del destinatario
+    if kind == "verification" and settings.EMAIL_VERIFICATION_BCC:
+        message["bcc"] = list(settings.EMAIL_VERIFICATION_BCC)
+    return message
+
+
+def resend_transport(message):
+    "Send a message through Resend"
+    resend.api_key = settings.EMAIL_HOST_PASSWORD
+    params: resend.Emails.SendParams = message
+    return resend.Emails.send(params)
+
+
+def get_transport():
+    "Callable that sends one rendered message"
+    return import_string(settings.EMAIL_TRANSPORT)
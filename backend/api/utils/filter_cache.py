@@ -0,0 +1,156 @@
+"Cache de respuestas de los filtros"
+import functools
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.http import QueryDict
+from rest_framework.response import Response
+from api.models import ModelVersion
+from api.permissions.roles import get_user_roles
+from api.utils.db_routing import read_from_primary
+from api.utils.streaming import is_stream_request
+
+HIT = "HIT"
+MISS = "MISS"
+STATS_KEYS = {"hits": "api:filter_cache:hits", "misses": "api:filter_cache:misses"}
+
+# Modelos de los que depende alguna respuesta cacheada o algún ETag; los
+# llenan cached_filter y conditional_models al importarse las vistas
+VERSIONED_MODELS = set()
+
+
+def track_model_versions(*models):
+    """Keep a version for `models`, bumped whenever one of their rows changes"""
+    VERSIONED_MODELS.update(models)
+
+
+def versioned(*models):
+    """The models among `models` that some cache depends on"""
+    return [model for model in models if model in VERSIONED_MODELS]
+
+
+def get_filter_cache():
+    """
+    Shared cache holding the filter responses, or None when FILTER_CACHE_ALIAS
+    is unset: a per-process cache would keep other workers' results around.
+    """
+    alias = getattr(settings, "FILTER_CACHE_ALIAS", None)
+    return caches[alias] if alias else None
+
+
+def _increment(cache, key, initial):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, initial, None)
+        return cache.get(key)
+
+
+def get_model_versions(models):
+    """
+    Current version of each model, read from the primary database so that
+    every process sees the changes committed by the others at once.
+    """
+    labels = [model._meta.label_lower for model in models]
+    if not labels:
+        return []
+    versions = dict(
+        ModelVersion.objects.using(DEFAULT_DB_ALIAS)
+        .filter(label__in=labels)
+        .values_list("label", "version")
+    )
+    return [versions.get(label, 0) for label in labels]
+
+
+def bump_model_versions(*models):
+    """Invalidate every cached filter response and ETag that read the models"""
+    labels = {model._meta.label_lower for model in models}
+    versions = ModelVersion.objects.filter(label__in=labels)
+    if versions.update(version=F("version") + 1) < len(labels):
+        # Primer cambio del modelo: crear la fila y volver a incrementar
+        ModelVersion.objects.bulk_create(
+            [ModelVersion(label=label) for label in labels], ignore_conflicts=True
+        )
+        versions.update(version=F("version") + 1)
+
+
+def bump_model_versions_on_commit(*models):
+    """
+    Bump once the current transaction commits. Bumping earlier would hold
+    the version rows locked until then; a request that reads the old version
+    and the new rows only stores them under a key that is about to change.
+    """
+    transaction.on_commit(lambda: bump_model_versions(*models))
+
+
+def _canonical(data):
+    if isinstance(data, QueryDict):
+        return {key: data.getlist(key) for key in data}
+    return data
+
+
+def filter_cache_key(request, endpoint, models):
+    """Key from the endpoint, the request, the user roles and model versions"""
+    payload = json.dumps(
+        {
+            "endpoint": endpoint,
+            "data": _canonical(request.data),
+            "query": _canonical(request.query_params),
+            "roles": get_user_roles(request),
+            "versions": get_model_versions(models),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return "api:filter:" + hashlib.sha256(payload.encode()).hexdigest()
+
+
+def record(stat):
+    _increment(get_filter_cache(), STATS_KEYS[stat], 1)
+
+
+def filter_cache_stats():
+    """Hits and misses of the filter cache"""
+    cache = get_filter_cache()
+    values = cache.get_many(list(STATS_KEYS.values())) if cache is not None else {}
+    return {stat: values.get(key, 0) for stat, key in STATS_KEYS.items()}
+
+
+def cached_filter(*models):
+    """
+    Cache the successful responses of a filter action for FILTER_CACHE_TIMEOUT
+    seconds in the shared filter cache, if any. Saving or deleting any of
+    `models` invalidates them, so list every model the response serializes
+    or filters on. Responses about to be cached are read from the primary.
+    """
+
+    track_model_versions(*models)
+
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            timeout = getattr(settings, "FILTER_CACHE_TIMEOUT", 60)
+            cache = get_filter_cache()
+            if cache is None or not timeout or is_stream_request(request):
+                return view_method(self, request, *args, **kwargs)
+            endpoint = f"{type(self).__name__}.{view_method.__name__}"
+            key = filter_cache_key(request, endpoint, models)
+            data = cache.get(key)
+            if data is not None:
+                record("hits")
+                return Response(data, headers={"X-Filter-Cache": HIT})
+            record("misses")
+            # Una réplica atrasada guardaría datos viejos bajo versiones nuevas
+            with read_from_primary():
+                response = view_method(self, request, *args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                cache.set(key, response.data, timeout)
+                response["X-Filter-Cache"] = MISS
+            return response
+
+        return wrapper
+
+    return decorator
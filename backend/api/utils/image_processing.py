@@ -0,0 +1,88 @@
+"Preparación local de imágenes antes de subirlas"
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from PIL import Image, ImageOps
+
+EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg"}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _encode(image, path, image_format, quality):
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    # Sin exif: la rotación ya está aplicada y no se publica la ubicación
+    image.save(path, image_format, quality=quality, optimize=True)
+
+
+def preprocess_image(path, max_dimension, image_format, quality, thumbnail_size):
+    """
+    Rotate a photo as its EXIF orientation says, shrink it to fit
+    `max_dimension` and re-encode it, next to a thumbnail that fits
+    `thumbnail_size`. Returns the paths of the image and the thumbnail.
+    Runs in the worker processes, so it takes no Django settings.
+    """
+    base, _extension = os.path.splitext(path)
+    extension = EXTENSIONS[image_format]
+    image_path = f"{base}.processed{extension}"
+    thumbnail_path = f"{base}.thumbnail{extension}"
+    with Image.open(path) as original:
+        # draft deja que el decodificador JPEG reduzca la escala al leer
+        original.draft("RGB", (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+        _encode(image, image_path, image_format, quality)
+        image.thumbnail((thumbnail_size, thumbnail_size), Image.Resampling.LANCZOS)
+        _encode(image, thumbnail_path, image_format, quality)
+    return image_path, thumbnail_path
+
+
+def pool_context():
+    """
+    Start the worker processes without fork: the pool is created from
+    threads that hold locks and open connections the children would inherit
+    half way through.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def get_executor():
+    """Process pool for the CPU bound work, None when it runs inline"""
+    global _executor
+    if settings.IMAGE_PROCESS_WORKERS <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_PROCESS_WORKERS, mp_context=pool_context()
+            )
+    return _executor
+
+
+def process_image(path):
+    """Preprocess a local image with the configured sizes and format"""
+    arguments = (
+        path,
+        settings.IMAGE_MAX_DIMENSION,
+        settings.IMAGE_FORMAT,
+        settings.IMAGE_QUALITY,
+        settings.IMAGE_THUMBNAIL_SIZE,
+    )
+    executor = get_executor()
+    if executor is None:
+        return preprocess_image(*arguments)
+    return executor.submit(preprocess_image, *arguments).result()
+
+
+def remove_files(*paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
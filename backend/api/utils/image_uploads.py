@@ -0,0 +1,330 @@
+"Subida de imágenes en segundo plano"
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from api.models import EvidenceImages
+from api.utils.filter_cache import bump_model_versions_on_commit
+from api.utils.image_processing import process_image, remove_files
+
+_executor = None
+_executor_lock = threading.Lock()
+_http_connectors = {}
+
+
+def _http_connector():
+    """
+    Connection pool that lets every upload thread keep its own open
+    connection to Cloudinary; the SDK pool keeps one per host and drops the
+    rest. One pool per proxy configuration, read on every call.
+    """
+    import cloudinary
+    from cloudinary.utils import get_http_connector
+
+    config = cloudinary.config()
+    key = (config.api_proxy, config.disable_tcp_keep_alive)
+    with _executor_lock:
+        if key not in _http_connectors:
+            size = max(settings.IMAGE_UPLOAD_WORKERS, settings.IMAGE_BATCH_WORKERS, 1)
+            _http_connectors[key] = get_http_connector(
+                config, {**cloudinary.CERT_KWARGS, "maxsize": size, "block": True}
+            )
+        return _http_connectors[key]
+
+
+def cloudinary_upload(path):
+    """
+    Upload a local file to Cloudinary. The request is signed and sent with
+    the public helpers of the SDK over our own connection pool.
+    """
+    import cloudinary
+    from cloudinary import utils
+    from cloudinary.exceptions import Error
+
+    params = utils.sign_request(utils.build_upload_params(), {})
+    with open(path, "rb") as file:
+        response = _http_connector().request(
+            "POST",
+            utils.cloudinary_api_url("upload", resource_type="image"),
+            fields={**params, "file": (os.path.basename(path), file.read())},
+            headers={"User-Agent": cloudinary.get_user_agent()},
+        )
+    result = json.loads(response.data.decode("utf-8"))
+    if "error" in result:
+        raise Error(result["error"]["message"])
+    return result
+
+
+def cloudinary_destroy(public_id):
+    """Delete an uploaded asset from Cloudinary"""
+    import cloudinary.uploader
+
+    return cloudinary.uploader.destroy(public_id)
+
+
+def get_uploader():
+    """Callable taking a local path and returning public_id and secure_url"""
+    return import_string(settings.IMAGE_UPLOADER)
+
+
+def get_destroyer():
+    """Callable taking a public_id and deleting the uploaded asset"""
+    return import_string(settings.IMAGE_DESTROYER)
+
+
+def destroy_image(image):
+    """
+    Delete an image record along with its uploaded image and thumbnail.
+    Returns the answer for the image; the record stays if a deletion fails.
+    """
+    destroyer = get_destroyer()
+    with transaction.atomic():
+        image.delete()
+        result = destroyer(image.public_id)
+        if image.thumbnail_public_id:
+            destroyer(image.thumbnail_public_id)
+    return result
+
+
+def destroy_uploaded(uploads):
+    """
+    Delete the images and thumbnails of `uploads` from Cloudinary, for
+    uploads whose records were never saved
+    """
+    destroyer = get_destroyer()
+    for fields in uploads:
+        for public_id in (fields["public_id"], fields["thumbnail_public_id"]):
+            try:
+                destroyer(public_id)
+            except Exception:
+                # Lo que importa es el error que deshizo la transacción
+                continue
+
+
+def get_executor():
+    """Worker pool shared by the uploads, None when they run inline"""
+    global _executor
+    if settings.IMAGE_UPLOAD_WORKERS <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_UPLOAD_WORKERS,
+                thread_name_prefix="image-upload",
+            )
+    return _executor
+
+
+def save_locally(picture):
+    """Write an uploaded file to IMAGE_UPLOAD_DIR under a unique name"""
+    os.makedirs(settings.IMAGE_UPLOAD_DIR, exist_ok=True)
+    extension = os.path.splitext(picture.name)[1].lower()
+    path = os.path.join(settings.IMAGE_UPLOAD_DIR, uuid.uuid4().hex + extension)
+    with open(path, "wb") as file:
+        for chunk in picture.chunks():
+            file.write(chunk)
+    return path
+
+
+def upload_processed(uploader, image_path, thumbnail_path):
+    """Upload a preprocessed image and its thumbnail, returning the fields"""
+    result = uploader(image_path)
+    thumbnail = uploader(thumbnail_path)
+    return {
+        "public_id": result["public_id"],
+        "image_url": result["secure_url"],
+        "thumbnail_public_id": thumbnail["public_id"],
+        "thumbnail_url": thumbnail["secure_url"],
+    }
+
+
+def _process_and_upload(uploader, path):
+    image_path = thumbnail_path = None
+    try:
+        image_path, thumbnail_path = process_image(path)
+        return upload_processed(uploader, image_path, thumbnail_path)
+    finally:
+        remove_files(path, image_path, thumbnail_path)
+
+
+def upload_now(picture):
+    """Preprocess and upload an image during the request"""
+    fields = _process_and_upload(get_uploader(), save_locally(picture))
+    return EvidenceImages.objects.create(**fields)
+
+
+def upload_batch(pictures):
+    """
+    Preprocess and upload many images at once over IMAGE_BATCH_WORKERS
+    threads. Returns, in the order given, the fields of each uploaded image
+    or the exception that stopped it.
+    """
+    uploader = get_uploader()
+    paths = [save_locally(picture) for picture in pictures]
+
+    def upload(path):
+        try:
+            return _process_and_upload(uploader, path)
+        except Exception as e:
+            return e
+
+    workers = min(settings.IMAGE_BATCH_WORKERS, len(paths))
+    if workers <= 1:
+        return [upload(path) for path in paths]
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="image-batch"
+    ) as executor:
+        return list(executor.map(upload, paths))
+
+
+def create_pending_image(picture):
+    """Pending image record for a file stored locally, uploaded after commit"""
+    path = save_locally(picture)
+    image = EvidenceImages.objects.create(
+        status=EvidenceImages.PENDING, local_path=path
+    )
+    enqueue_upload(image.pk)
+    return image
+
+
+def enqueue_upload(image_id):
+    """Upload the image once the current transaction commits"""
+
+    def submit():
+        executor = get_executor()
+        if executor is None:
+            upload_image(image_id)
+        else:
+            executor.submit(_run_in_worker, image_id)
+
+    transaction.on_commit(submit)
+
+
+def _run_in_worker(image_id):
+    try:
+        upload_image(image_id)
+    finally:
+        # Los hilos del pool no pasan por el ciclo de peticiones de Django
+        close_old_connections()
+
+
+def upload_image(image_id):
+    """
+    Claim a pending image, preprocess it and upload it, retrying up to
+    IMAGE_UPLOAD_MAX_ATTEMPTS times with exponential backoff. The local copy
+    is removed once uploaded.
+    """
+    # Solo un hilo o proceso gana el UPDATE condicional y sube la imagen
+    lease_until = _lease_until()
+    claimed = EvidenceImages.objects.filter(
+        pk=image_id, status=EvidenceImages.PENDING
+    ).update(status=EvidenceImages.UPLOADING, lease_until=lease_until)
+    if not claimed:
+        return None
+    image = EvidenceImages.objects.get(pk=image_id)
+    try:
+        image_path, thumbnail_path = process_image(image.local_path)
+    except Exception as e:
+        # Un archivo que no se puede leer no mejora con reintentos
+        _save_claimed(
+            image,
+            attempts=image.attempts + 1,
+            status=EvidenceImages.FAILED,
+            error=str(e),
+            lease_until=None,
+        )
+        return image
+    try:
+        return _upload_with_retries(image, image_path, thumbnail_path)
+    finally:
+        remove_files(image_path, thumbnail_path)
+
+
+def _lease_until(delay=0):
+    return timezone.now() + timedelta(seconds=settings.IMAGE_UPLOAD_LEASE + delay)
+
+
+def _save_claimed(image, **fields):
+    """
+    Store fields of an image only while this worker still holds its lease.
+    Returns False when the lease expired and the upload was requeued.
+    """
+    saved = EvidenceImages.objects.filter(
+        pk=image.pk, status=EvidenceImages.UPLOADING, lease_until=image.lease_until
+    ).update(**fields)
+    for field, value in fields.items():
+        setattr(image, field, value)
+    # Los filtros solo muestran la URL, que cambia al terminar la subida
+    if saved and fields.get("status") == EvidenceImages.UPLOADED:
+        bump_model_versions_on_commit(EvidenceImages)
+    return bool(saved)
+
+
+def _upload_with_retries(image, image_path, thumbnail_path):
+    uploader = get_uploader()
+    delay = settings.IMAGE_UPLOAD_RETRY_DELAY
+    while True:
+        attempts = image.attempts + 1
+        try:
+            fields = upload_processed(uploader, image_path, thumbnail_path)
+        except Exception as e:
+            if attempts >= settings.IMAGE_UPLOAD_MAX_ATTEMPTS:
+                _save_claimed(
+                    image,
+                    attempts=attempts,
+                    error=str(e),
+                    status=EvidenceImages.FAILED,
+                    lease_until=None,
+                )
+                return image
+            # El plazo se renueva para cubrir la espera y el siguiente intento
+            if not _save_claimed(
+                image, attempts=attempts, error=str(e), lease_until=_lease_until(delay)
+            ):
+                return image
+            time.sleep(delay)
+            delay *= 2
+            continue
+        local_path = image.local_path
+        if _save_claimed(
+            image,
+            **fields,
+            attempts=attempts,
+            status=EvidenceImages.UPLOADED,
+            local_path=None,
+            error=None,
+            lease_until=None,
+        ):
+            remove_files(local_path)
+        return image
+
+
+def requeue_uploads(include_failed=False):
+    """
+    Enqueue again the pending images and those whose worker let its lease
+    expire, and also the failed ones with `include_failed`
+    """
+    eligible = Q(status=EvidenceImages.PENDING) | Q(
+        status=EvidenceImages.UPLOADING, lease_until__lt=timezone.now()
+    )
+    if include_failed:
+        eligible |= Q(status=EvidenceImages.FAILED)
+    images = EvidenceImages.objects.filter(eligible).exclude(local_path=None)
+    ids = list(images.values_list("pk", flat=True))
+    with transaction.atomic():
+        # Los fallidos vuelven a tener todos sus intentos; la condición se
+        # repite para no quitarle la imagen a un hilo que la acaba de reclamar
+        EvidenceImages.objects.filter(eligible, pk__in=ids).update(
+            status=EvidenceImages.PENDING, attempts=0, lease_until=None
+        )
+        for image_id in ids:
+            enqueue_upload(image_id)
+    return ids
@@ -0,0 +1,82 @@
+"Columnas en minúsculas mantenidas por la base de datos"
+from api.models import ACCENTED_CAPITALS
+
+# (tabla, columna de origen, columna normalizada)
+NORMALIZED_COLUMNS = (
+    ("api_product", "category", "category_normalized"),
+    ("api_package", "agency_name", "agency_name_normalized"),
+)
+
+
+def normalized_sql(value):
+    """SQL of api.models.normalized for a column or NEW.column"""
+    for capital in ACCENTED_CAPITALS:
+        value = f"REPLACE({value}, '{capital}', '{capital.lower()}')"
+    return f"LOWER(COALESCE({value}, ''))"
+
+
+def _sqlite_triggers(table, source, target):
+    # AFTER, porque SQLite no deja cambiar NEW. Se disparan tras cada INSERT
+    # y tras cada UPDATE de source o target que deje target desfasada; el
+    # UPDATE interno la deja al día y no vuelve a cumplir el WHEN
+    value = normalized_sql(f"NEW.{source}")
+    normalize = f"UPDATE {table} SET {target} = {value} WHERE rowid = NEW.rowid;"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_{target}_insert "
+        f"AFTER INSERT ON {table} BEGIN {normalize} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_{target}_update "
+        f"AFTER UPDATE OF {source}, {target} ON {table} "
+        f"WHEN NEW.{target} IS NOT {value} BEGIN {normalize} END",
+    ]
+
+
+def _postgresql_triggers(table, source, target):
+    # BEFORE cada INSERT y cada UPDATE de source o target: NEW se corrige antes
+    # de escribirse
+    function = f"{table}_{target}_fn"
+    return [
+        f"CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$ "
+        f"BEGIN NEW.{target} := {normalized_sql(f'NEW.{source}')}; RETURN NEW; END; "
+        f"$$ LANGUAGE plpgsql",
+        f"CREATE OR REPLACE TRIGGER {table}_{target}_trigger "
+        f"BEFORE INSERT OR UPDATE OF {source}, {target} ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION {function}()",
+    ]
+
+
+TRIGGERS = {
+    "sqlite": _sqlite_triggers,
+    "postgresql": _postgresql_triggers,
+}
+
+
+def install_triggers(connection, refresh=False):
+    """
+    Create the triggers that keep the normalized columns in sync on every
+    insert and update, including update(), bulk_create() and bulk_update().
+    Safe to run again; with `refresh` the existing rows are recomputed.
+    """
+    triggers = TRIGGERS.get(connection.vendor)
+    if triggers is None:
+        return
+    with connection.cursor() as cursor:
+        for table, source, target in NORMALIZED_COLUMNS:
+            for statement in triggers(table, source, target):
+                cursor.execute(statement)
+            if refresh:
+                cursor.execute(
+                    f"UPDATE {table} SET {target} = {normalized_sql(source)}"
+                )
+
+
+def drop_triggers(connection):
+    with connection.cursor() as cursor:
+        for table, _source, target in NORMALIZED_COLUMNS:
+            if connection.vendor == "sqlite":
+                cursor.execute(f"DROP TRIGGER IF EXISTS {table}_{target}_insert")
+                cursor.execute(f"DROP TRIGGER IF EXISTS {table}_{target}_update")
+            elif connection.vendor == "postgresql":
+                cursor.execute(
+                    f"DROP TRIGGER IF EXISTS {table}_{target}_trigger ON {table}"
+                )
+                cursor.execute(f"DROP FUNCTION IF EXISTS {table}_{target}_fn()")
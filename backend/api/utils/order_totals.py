@@ -0,0 +1,47 @@
+"Costo total de los productos de cada pedido"
+from django.db.models import FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from api.models import Order, Product
+from api.utils.filter_cache import bump_model_versions_on_commit
+
+
+def computed_products_total_cost():
+    """Correlated subquery with the sum of the product costs of each order"""
+    totals = (
+        Product.objects.filter(order=OuterRef("pk"))
+        .values("order")
+        .annotate(total=Sum("total_cost"))
+        .values("total")
+    )
+    return Coalesce(
+        Subquery(totals, output_field=FloatField()), 0.0, output_field=FloatField()
+    )
+
+
+def refresh_order_totals(order_ids=None):
+    """
+    Recompute the stored products_total_cost of the given orders (all of them
+    when None) with a single UPDATE.
+    """
+    orders = Order.objects.all()
+    if order_ids is not None:
+        order_ids = {order_id for order_id in order_ids if order_id}
+        if not order_ids:
+            return 0
+        orders = orders.filter(id__in=order_ids)
+    updated = orders.update(
+        products_total_cost=computed_products_total_cost(), updated_at=timezone.now()
+    )
+    bump_model_versions_on_commit(Order)
+    return updated
+
+
+def stale_orders(tolerance=1e-6):
+    """Orders whose stored total differs from the sum of their products"""
+    orders = Order.objects.annotate(computed_total=computed_products_total_cost())
+    return [
+        order
+        for order in orders.only("id", "products_total_cost")
+        if abs(order.products_total_cost - order.computed_total) > tolerance
+    ]
@@ -0,0 +1,119 @@
+"Búsqueda de texto completo de productos"
+import re
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from api.models import Product
+
+SEARCH_TABLE = "api_product_search"
+
+# Documento indexado por producto: el nombre pesa más que la categoría y esta
+# más que la descripción
+INSERT_SQL = {
+    "sqlite": (
+        f"INSERT INTO {SEARCH_TABLE} (product_id, name, category, description) "
+        "SELECT id, name, COALESCE(category, ''), COALESCE(description, '') "
+        "FROM api_product WHERE id IN ({ids})"
+    ),
+    "postgresql": (
+        f"INSERT INTO {SEARCH_TABLE} (product_id, document) "
+        "SELECT id, "
+        "setweight(to_tsvector('spanish', unaccent(name)), 'A') || "
+        "setweight(to_tsvector('spanish', unaccent(COALESCE(category, ''))), 'B') || "
+        "setweight(to_tsvector('spanish', unaccent(COALESCE(description, ''))), 'C') "
+        "FROM api_product WHERE id IN ({ids})"
+    ),
+}
+
+# {candidates} es la consulta de los productos que pasaron los demás filtros,
+# así el límite se aplica después de filtrar
+SEARCH_SQL = {
+    "sqlite": (
+        f"SELECT product_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+        "AND product_id IN ({candidates}) "
+        f"ORDER BY bm25({SEARCH_TABLE}, 0.0, 10.0, 5.0, 1.0) LIMIT %s"
+    ),
+    "postgresql": (
+        f"SELECT product_id FROM {SEARCH_TABLE}, "
+        "to_tsquery('spanish', unaccent(%s)) query WHERE document @@ query "
+        "AND product_id IN ({candidates}) "
+        "ORDER BY ts_rank(document, query) DESC LIMIT %s"
+    ),
+}
+
+
+def is_supported(using=DEFAULT_DB_ALIAS):
+    """Whether the database has a full-text index for products"""
+    return connections[using].vendor in SEARCH_SQL
+
+
+def search_terms(text):
+    """Words of a search, without the operators of the search syntax"""
+    return re.findall(r"\w+", text or "")
+
+
+def match_expression(terms, using=DEFAULT_DB_ALIAS):
+    """Query with every term matched as a prefix"""
+    if connections[using].vendor == "postgresql":
+        return " & ".join(f"{term}:*" for term in terms)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def index_products(product_ids=None):
+    """
+    Rewrite the search documents of the given products (all of them when
+    None) from their current name, category and description.
+    """
+    if not is_supported():
+        return
+    products = Product.objects.all()
+    if product_ids is not None:
+        product_ids = {product_id for product_id in product_ids if product_id}
+        if not product_ids:
+            return
+        products = products.filter(pk__in=product_ids)
+    ids_sql, params = products.values("pk").query.sql_with_params()
+    with transaction.atomic(), connection.cursor() as cursor:
+        if product_ids is None:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        else:
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE product_id IN ({ids_sql})", params
+            )
+        cursor.execute(INSERT_SQL[connection.vendor].format(ids=ids_sql), params)
+
+
+def remove_products(product_ids):
+    """Drop the search documents of deleted products"""
+    if not is_supported() or not product_ids:
+        return
+    pk = Product._meta.pk
+    values = [pk.get_db_prep_value(product_id, connection) for product_id in product_ids]
+    placeholders = ", ".join(["%s"] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE product_id IN ({placeholders})", values
+        )
+
+
+def search_products(text, queryset=None, limit=None):
+    """
+    Ids of the products of `queryset` (all of them when None) matching
+    every word of `text` as a prefix, ignoring case and accents, best match
+    first. Runs on the database the queryset reads from.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return []
+    if queryset is None:
+        queryset = Product.objects.all()
+    if limit is None:
+        limit = settings.PRODUCT_SEARCH_LIMIT
+    using = queryset.db
+    candidates = queryset.order_by().values("pk").query
+    candidates_sql, params = candidates.get_compiler(using=using).as_sql()
+    sql = SEARCH_SQL[connections[using].vendor].format(candidates=candidates_sql)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [match_expression(terms, using), *params, limit])
+        rows = cursor.fetchall()
+    pk = Product._meta.pk
+    return [pk.to_python(product_id) for (product_id,) in rows]
@@ -0,0 +1,82 @@
+"Motor de estados de productos"
+from django.db.models import F
+from django.utils import timezone
+from api.models import Product
+from api.utils.filter_cache import bump_model_versions_on_commit
+from api.utils.status_notifications import record_status_changes
+
+ORDERED = "Encargado"
+PARTIALLY_BUYED = "Parcialmente comprado"
+BUYED = "Comprado"
+PARTIALLY_RECEIVED = "Parcialmente Recibido"
+RECEIVED = "Recibido"
+PARTIALLY_DELIVERED = "Parcialmente Entregado"
+DELIVERED = "Entregado"
+
+
+def compute_status(amount_requested, buyed, received, delivered):
+    """Status of a product from its bought, received and delivered totals"""
+    if delivered == amount_requested:
+        return DELIVERED
+    if received == amount_requested and delivered > 0:
+        return PARTIALLY_DELIVERED
+    if received == amount_requested:
+        return RECEIVED
+    if buyed == amount_requested and received > 0:
+        return PARTIALLY_RECEIVED
+    if buyed == amount_requested:
+        return BUYED
+    if buyed > 0:
+        return PARTIALLY_BUYED
+    return ORDERED
+
+
+def update_product_statuses(product_ids=None):
+    """
+    Recompute the status of the given products (all of them when None) from
+    their stored totals and write the ones that changed with a single bulk
+    update, queueing a status change event for each client.
+    Returns the products whose status changed.
+    """
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(id__in=set(product_ids))
+    products = products.annotate(client_id=F("order__client_id")).only(
+        "id",
+        "order_id",
+        "status",
+        "amount_requested",
+        "total_amount_buyed",
+        "total_amount_received",
+        "total_amount_delivered",
+    )
+
+    changed = []
+    changes = []
+    now = timezone.now()
+    for product in products:
+        status = compute_status(
+            product.amount_requested,
+            product.total_amount_buyed,
+            product.total_amount_received,
+            product.total_amount_delivered,
+        )
+        if status != product.status:
+            changes.append(
+                (
+                    product.client_id,
+                    product.order_id,
+                    product.id,
+                    product.status,
+                    status,
+                )
+            )
+            product.status = status
+            # bulk_update no aplica auto_now
+            product.updated_at = now
+            changed.append(product)
+    if changed:
+        Product.objects.bulk_update(changed, ["status", "updated_at"])
+        record_status_changes(changes)
+        bump_model_versions_on_commit(Product)
+    return changed
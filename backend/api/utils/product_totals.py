@@ -0,0 +1,85 @@
+"Totales acumulados de compras y entregas por producto"
+from django.db import transaction
+from django.db.models import FloatField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from api.models import Product, ProductBuyed, ProductReceived
+from api.utils.filter_cache import bump_model_versions_on_commit
+
+TOTAL_FIELDS = {
+    "total_amount_buyed": (ProductBuyed, "amount_buyed", IntegerField),
+    "total_cost_buyed": (ProductBuyed, "actual_cost_of_product", FloatField),
+    "total_amount_received": (ProductReceived, "amount_received", IntegerField),
+    "total_amount_delivered": (ProductReceived, "amount_delivered", IntegerField),
+}
+
+
+def _total(model, field, output_field):
+    """Correlated subquery with the total of `field` for each product"""
+    totals = (
+        model.objects.filter(original_product=OuterRef("pk"))
+        .values("original_product")
+        .annotate(total=Sum(field))
+        .values("total")
+    )
+    return Coalesce(
+        Subquery(totals, output_field=output_field()), 0, output_field=output_field()
+    )
+
+
+def with_computed_totals(products):
+    """Annotate the products with their totals computed from buys and delivers"""
+    return products.annotate(
+        **{
+            f"computed_{name}": _total(model, field, output_field)
+            for name, (model, field, output_field) in TOTAL_FIELDS.items()
+        }
+    )
+
+
+def stale_products(product_ids=None):
+    """Products whose stored totals differ from their buys and delivers"""
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(id__in=set(product_ids))
+    stale = []
+    for product in with_computed_totals(products).only("id", *TOTAL_FIELDS):
+        drift = False
+        for name in TOTAL_FIELDS:
+            computed = getattr(product, f"computed_{name}")
+            if getattr(product, name) != computed:
+                setattr(product, name, computed)
+                drift = True
+        if drift:
+            stale.append(product)
+    return stale
+
+
+def refresh_product_totals(product_ids=None):
+    """
+    Recompute the stored totals of the given products (all of them when None)
+    and write the ones that drifted with a single bulk update.
+    Runs inside the transaction that changed the buys or delivers, if any.
+    """
+    if product_ids is not None:
+        product_ids = {product_id for product_id in product_ids if product_id}
+        if not product_ids:
+            return []
+    with transaction.atomic():
+        if product_ids is not None:
+            # Bloquear las filas antes de sumar evita perder escrituras concurrentes
+            list(
+                Product.objects.select_for_update()
+                .filter(id__in=product_ids)
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+        stale = stale_products(product_ids)
+        if stale:
+            # bulk_update no aplica auto_now
+            now = timezone.now()
+            for product in stale:
+                product.updated_at = now
+            Product.objects.bulk_update(stale, [*TOTAL_FIELDS, "updated_at"])
+            bump_model_versions_on_commit(Product)
+    return stale
@@ -0,0 +1,317 @@
+"Resúmenes mensuales de gastos e ingresos"
+import datetime
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Round
+from django.utils import timezone
+from api.models import (
+    BuyingAccounts,
+    CustomUser,
+    DeliverReceip,
+    Order,
+    Product,
+    ProductBuyed,
+    ReportRollup,
+    Shop,
+    ShoppingReceip,
+)
+from api.utils.common_information_cache import get_common_information
+
+# Campo que agrupa cada dimensión en compras, productos y entregas.
+# None significa que la medida no existe para esa dimensión.
+SPEND_KEYS = {
+    ReportRollup.TOTAL: None,
+    ReportRollup.SHOP: "shoping_receip__shop_of_buy_id",
+    ReportRollup.BUYING_ACCOUNT: "shoping_receip__shopping_account_id",
+    ReportRollup.SALES_MANAGER: "order__sales_manager_id",
+}
+REVENUE_KEYS = {
+    ReportRollup.TOTAL: None,
+    ReportRollup.SHOP: "shop_id",
+    ReportRollup.SALES_MANAGER: "order__sales_manager_id",
+}
+WEIGHT_KEYS = {
+    ReportRollup.TOTAL: None,
+    ReportRollup.SALES_MANAGER: "order__sales_manager_id",
+}
+
+# Fecha, medida y campo sumado de las filas que alimentan los resúmenes
+ROLLUP_SOURCES = {
+    ProductBuyed: ("buy_date", "spend", "real_cost_of_product", SPEND_KEYS),
+    Product: ("order__creation_date", "revenue", "total_cost", REVENUE_KEYS),
+    DeliverReceip: ("deliver_date", "weight", "weight", WEIGHT_KEYS),
+}
+
+# Decimales que se guardan de cada medida: sumar y restar floats deja restos
+# como 1e-17 que impedirían reconocer un resumen vacío
+ROLLUP_DECIMALS = 6
+
+# Campos de las filas padre que cambian el mes o la clave de sus hijas
+ROLLUP_PARENTS = {
+    Order: (
+        "order",
+        {
+            "creation_date": "order__creation_date",
+            "sales_manager_id": "order__sales_manager_id",
+        },
+    ),
+    ShoppingReceip: (
+        "shoping_receip",
+        {
+            "shop_of_buy_id": "shoping_receip__shop_of_buy_id",
+            "shopping_account_id": "shoping_receip__shopping_account_id",
+        },
+    ),
+}
+
+
+def month_start(value):
+    """First day of the month of a date or datetime, in the current time zone"""
+    if isinstance(value, datetime.datetime):
+        value = timezone.localtime(value).date()
+    return value.replace(day=1)
+
+
+def month_bounds(period):
+    """Aware datetimes where the month starts and the next one starts"""
+    following = (period + datetime.timedelta(days=32)).replace(day=1)
+    return (
+        timezone.make_aware(datetime.datetime.combine(period, datetime.time.min)),
+        timezone.make_aware(datetime.datetime.combine(following, datetime.time.min)),
+    )
+
+
+def _grouped(queryset, keys, measure, field):
+    """Yield (dimension, key, measure, total) with one GROUP BY per dimension"""
+    for dimension, key in keys.items():
+        if key is None:
+            total = queryset.aggregate(total=Sum(field))["total"]
+            if total is not None:
+                yield dimension, "", measure, total
+            continue
+        rows = queryset.order_by().values(key).annotate(total=Sum(field))
+        for row in rows:
+            if row[key] is not None:
+                yield dimension, str(row[key]), measure, row["total"]
+
+
+def compute_rollups(period):
+    """Rollup rows of a month computed from buys, products and deliveries"""
+    start, end = month_bounds(period)
+    sources = (
+        (
+            ProductBuyed.objects.filter(buy_date__gte=start, buy_date__lt=end),
+            SPEND_KEYS,
+            "spend",
+            "real_cost_of_product",
+        ),
+        (
+            Product.objects.filter(
+                order__creation_date__gte=start, order__creation_date__lt=end
+            ),
+            REVENUE_KEYS,
+            "revenue",
+            "total_cost",
+        ),
+        (
+            DeliverReceip.objects.filter(deliver_date__gte=start, deliver_date__lt=end),
+            WEIGHT_KEYS,
+            "weight",
+            "weight",
+        ),
+    )
+    rows = defaultdict(dict)
+    for queryset, keys, measure, field in sources:
+        for dimension, key, name, total in _grouped(queryset, keys, measure, field):
+            rows[dimension, key][name] = total
+    return [
+        ReportRollup(period=period, dimension=dimension, key=key, **measures)
+        for (dimension, key), measures in rows.items()
+    ]
+
+
+def refresh_rollups(periods):
+    """Replace the rollup rows of the given months"""
+    periods = {month_start(period) for period in periods if period}
+    with transaction.atomic():
+        for period in sorted(periods):
+            ReportRollup.objects.filter(period=period).delete()
+            ReportRollup.objects.bulk_create(compute_rollups(period))
+    return periods
+
+
+def all_periods():
+    """Months with any buy, order or delivery"""
+    periods = set()
+    for queryset, field in (
+        (ProductBuyed.objects.all(), "buy_date"),
+        (Order.objects.exclude(creation_date=None), "creation_date"),
+        (DeliverReceip.objects.all(), "deliver_date"),
+    ):
+        periods.update(
+            month_start(value) for value in queryset.datetimes(field, "month")
+        )
+    return periods
+
+
+def rebuild_rollups():
+    """Recompute every month and drop the rollups of months with no activity"""
+    periods = all_periods()
+    with transaction.atomic():
+        ReportRollup.objects.exclude(period__in=periods).delete()
+        refresh_rollups(periods)
+    return periods
+
+
+def rollup_fields(model):
+    date_field, _measure, field, keys = ROLLUP_SOURCES[model]
+    return {date_field, field, *(key for key in keys.values() if key)}
+
+
+def rollup_values(model, **filters):
+    """Date, amount and dimension keys of the rows of `model` in the rollups"""
+    return list(model.objects.filter(**filters).values(*rollup_fields(model)))
+
+
+def contributions(model, rows, sign=1, **overrides):
+    """
+    Amount each row adds to its (period, dimension, key, measure), negated
+    with sign=-1. `overrides` replace fields of every row, such as the old
+    creation date of their order.
+    """
+    date_field, measure, field, keys = ROLLUP_SOURCES[model]
+    totals = defaultdict(float)
+    for row in rows:
+        row = {**row, **{name: overrides[name] for name in row if name in overrides}}
+        if not row[date_field]:
+            continue
+        period = month_start(row[date_field])
+        for dimension, key_field in keys.items():
+            key = "" if key_field is None else row[key_field]
+            if key is not None:
+                totals[period, dimension, str(key), measure] += sign * row[field]
+    return totals
+
+
+def apply_rollup_deltas(*changes):
+    """
+    Add the contributions to their rollup rows inside the current
+    transaction, so a rollback takes them back with the change itself.
+    """
+    rows = defaultdict(lambda: defaultdict(float))
+    for change in changes:
+        for (period, dimension, key, measure), amount in change.items():
+            rows[period, dimension, key][measure] += amount
+    rows = {
+        row: {
+            measure: amount
+            for measure, amount in measures.items()
+            if round(amount, ROLLUP_DECIMALS)
+        }
+        for row, measures in rows.items()
+    }
+    rows = {row: measures for row, measures in rows.items() if measures}
+    if not rows:
+        return
+    now = timezone.now()
+    touched = Q()
+    with transaction.atomic():
+        ReportRollup.objects.bulk_create(
+            [
+                ReportRollup(period=period, dimension=dimension, key=key)
+                for period, dimension, key in rows
+            ],
+            ignore_conflicts=True,
+        )
+        for (period, dimension, key), measures in rows.items():
+            row = Q(period=period, dimension=dimension, key=key)
+            # Sumar en SQL evita perder cambios de transacciones concurrentes
+            ReportRollup.objects.filter(row).update(
+                updated_at=now,
+                **{
+                    measure: Round(F(measure) + amount, ROLLUP_DECIMALS)
+                    for measure, amount in measures.items()
+                },
+            )
+            touched |= row
+        ReportRollup.objects.filter(touched, spend=0, revenue=0, weight=0).delete()
+
+
+def add_to_rollups(model, pks):
+    """Count rows inserted without signals, e.g. by bulk_create"""
+    apply_rollup_deltas(contributions(model, rollup_values(model, pk__in=pks)))
+
+
+def move_rollups(parent, pk, previous):
+    """
+    Move the rows under a parent from its `previous` values (field -> value)
+    to its current ones, e.g. to the new sales manager of an order.
+    """
+    relation, fields = ROLLUP_PARENTS[parent]
+    overrides = {fields[name]: value for name, value in previous.items()}
+    changes = []
+    for model in ROLLUP_SOURCES:
+        if overrides.keys() & rollup_fields(model):
+            rows = rollup_values(model, **{relation: pk})
+            changes.append(contributions(model, rows))
+            changes.append(contributions(model, rows, -1, **overrides))
+    apply_rollup_deltas(*changes)
+
+
+def parse_month(value):
+    """First day of a month given as YYYY-MM"""
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m").date()
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Mes inválido: {value}, use el formato YYYY-MM") from e
+
+
+def dimension_labels(dimension, keys):
+    """Readable name of each key of a dimension"""
+    if dimension == ReportRollup.SHOP:
+        names = Shop.objects.filter(id__in=keys).values_list("id", "name")
+    elif dimension == ReportRollup.BUYING_ACCOUNT:
+        names = BuyingAccounts.objects.filter(id__in=keys).values_list(
+            "id", "account_name"
+        )
+    elif dimension == ReportRollup.SALES_MANAGER:
+        names = (
+            (user_id, f"{name} {last_name}")
+            for user_id, name, last_name in CustomUser.objects.filter(
+                id__in=keys
+            ).values_list("id", "name", "last_name")
+        )
+    else:
+        return {"": "Total"}
+    return {str(key): name for key, name in names}
+
+
+def rollup_report(dimension, start=None, end=None, by_period=True):
+    """
+    Spend, revenue, delivered weight and delivery charges of a dimension,
+    read from the rollup table, per month or summed over the whole range.
+    """
+    if dimension not in dict(ReportRollup.DIMENSIONS):
+        raise ValueError(f"Dimensión desconocida: {dimension}")
+    rows = ReportRollup.objects.filter(dimension=dimension)
+    if start:
+        rows = rows.filter(period__gte=start)
+    if end:
+        rows = rows.filter(period__lte=end)
+    fields = ("period", "key") if by_period else ("key",)
+    rows = list(
+        rows.values(*fields)
+        .annotate(spend=Sum("spend"), revenue=Sum("revenue"), weight=Sum("weight"))
+        .order_by(*fields)
+    )
+    labels = dimension_labels(dimension, {row["key"] for row in rows})
+    cost_per_pound = get_common_information().cost_per_pound
+    return [
+        {
+            **row,
+            "label": labels.get(row["key"], ""),
+            "delivery_charges": row["weight"] * cost_per_pound,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,91 @@
+"Prueba de carga de escrituras concurrentes en SQLite"
+import copy
+import threading
+import time
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+ALIAS = "sqlite_stress"
+
+SETUP_SQL = [
+    "CREATE TABLE stress_counter (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)",
+    "CREATE TABLE stress_log (id INTEGER PRIMARY KEY, writer INTEGER NOT NULL)",
+    "INSERT INTO stress_counter (id, value) VALUES (1, 0)",
+]
+
+
+def register_database(path, options):
+    """Temporary connection alias for an SQLite file with the given OPTIONS"""
+    databases = {
+        "default": copy.deepcopy(settings.DATABASES["default"]),
+        ALIAS: {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": str(path),
+            "OPTIONS": options,
+        },
+    }
+    connections.settings[ALIAS] = connections.configure_settings(databases)[ALIAS]
+    return ALIAS
+
+
+def _write(alias, writer, writes, errors):
+    try:
+        for _ in range(writes):
+            try:
+                # Leer y luego escribir: con BEGIN DEFERRED dos transacciones
+                # chocan al pasar a escritura y una falla sin esperar
+                with transaction.atomic(using=alias):
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute("SELECT value FROM stress_counter WHERE id = 1")
+                        value = cursor.fetchone()[0]
+                        cursor.execute(
+                            "UPDATE stress_counter SET value = %s WHERE id = 1",
+                            [value + 1],
+                        )
+                        cursor.execute(
+                            "INSERT INTO stress_log (writer) VALUES (%s)", [writer]
+                        )
+            except OperationalError as e:
+                errors.append(str(e))
+    finally:
+        connections[alias].close()
+
+
+def run_writers(path, writers, writes, options=None):
+    """
+    Run `writers` threads, each with its own connection, committing `writes`
+    read-modify-write transactions on a fresh SQLite file. Returns the
+    commits, the errors and the elapsed seconds.
+    """
+    if options is None:
+        options = settings.SQLITE_OPTIONS
+    alias = register_database(path, options)
+    try:
+        with connections[alias].cursor() as cursor:
+            for statement in SETUP_SQL:
+                cursor.execute(statement)
+        errors = []
+        threads = [
+            threading.Thread(target=_write, args=(alias, writer, writes, errors))
+            for writer in range(writers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT value FROM stress_counter WHERE id = 1")
+            counter = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM stress_log")
+            logged = cursor.fetchone()[0]
+        return {
+            "committed": logged,
+            "counter": counter,
+            "errors": errors,
+            "seconds": elapsed,
+        }
+    finally:
+        connections[alias].close()
+        del connections.settings[alias]
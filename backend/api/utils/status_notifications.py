@@ -0,0 +1,111 @@
+"Avisos a los clientes de los cambios de estado"
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from api.models import CustomUser, OutboxEmail, StatusChangeEvent
+
+
+def record_status_changes(changes):
+    """
+    Queue status changes for the next digest with one insert. Each change is
+    (client_id, order_id, product_id, previous_status, status); product_id
+    is None for a change of the order itself.
+    """
+    now = timezone.now()
+    events = [
+        StatusChangeEvent(
+            client_id=client_id,
+            order_id=order_id,
+            product_id=product_id,
+            previous_status=previous_status,
+            status=status,
+            created_at=now,
+        )
+        for client_id, order_id, product_id, previous_status, status in changes
+        if client_id and previous_status != status
+    ]
+    StatusChangeEvent.objects.bulk_create(events)
+    return events
+
+
+def coalesce(events):
+    """
+    Net change of every product and order of each client: several changes
+    of the same line become one from its first status to its last, and
+    lines that went back to where they started are dropped.
+    """
+    clients = {}
+    for event in events:
+        lines = clients.setdefault(event["client_id"], {})
+        key = (event["order_id"], event["product_id"])
+        if key in lines:
+            lines[key]["status"] = event["status"]
+        else:
+            lines[key] = {
+                "order_id": event["order_id"],
+                "product": event["product__name"],
+                "previous_status": event["previous_status"],
+                "status": event["status"],
+            }
+    return {
+        client_id: [
+            line
+            for line in lines.values()
+            if line["previous_status"] != line["status"]
+        ]
+        for client_id, lines in clients.items()
+    }
+
+
+def send_status_digests(chunk_size=None):
+    """
+    Turn every pending status change into one digest email per client in the
+    outbox and mark the changes notified, in a single transaction.
+    Returns the number of changes read and of digests queued.
+    """
+    chunk_size = chunk_size or settings.STATUS_DIGEST_CHUNK_SIZE
+    with transaction.atomic():
+        events = list(
+            StatusChangeEvent.objects.filter(notified_at=None)
+            # Otro worker a la vez salta estas filas en vez de repetir el aviso
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("id")
+            .values(
+                "id",
+                "client_id",
+                "order_id",
+                "product_id",
+                "product__name",
+                "previous_status",
+                "status",
+            )
+            .iterator(chunk_size=chunk_size)
+        )
+        if not events:
+            return 0, 0
+        digests = {
+            client_id: lines
+            for client_id, lines in coalesce(events).items()
+            if lines
+        }
+        clients = CustomUser.objects.filter(id__in=digests).values_list(
+            "id", "email", "name"
+        )
+        OutboxEmail.objects.bulk_create(
+            [
+                OutboxEmail(
+                    kind=OutboxEmail.STATUS_DIGEST,
+                    to_email=email,
+                    context={"user_name": name, "changes": digests[client_id]},
+                )
+                for client_id, email, name in clients
+            ],
+            batch_size=chunk_size,
+        )
+        # Por ids leídos: un cambio confirmado durante la lectura no se pierde
+        now = timezone.now()
+        for start in range(0, len(events), chunk_size):
+            StatusChangeEvent.objects.filter(
+                id__in=[event["id"] for event in events[start : start + chunk_size]]
+            ).update(notified_at=now)
+    return len(events), len(digests)
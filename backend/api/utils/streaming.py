@@ -0,0 +1,53 @@
+"Respuestas JSON en streaming para exportaciones grandes"
+import json
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+STREAM_QUERY_PARAM = "stream"
+
+
+def is_stream_request(request):
+    """Whether the client asked for a streamed export with ?stream=true"""
+    return request.query_params.get(STREAM_QUERY_PARAM, "").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+
+
+def stream_json(queryset, serializer_class, context=None, chunk_size=500):
+    """
+    Yield the serialized queryset as a JSON array. Rows are read with
+    `.iterator(chunk_size=...)`, so prefetches run per chunk and only one
+    chunk is held in memory at a time.
+    """
+    yield "["
+    first = True
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) < chunk_size:
+            continue
+        yield _encode_chunk(chunk, serializer_class, context, first)
+        first = False
+        chunk = []
+    if chunk:
+        yield _encode_chunk(chunk, serializer_class, context, first)
+    yield "]"
+
+
+def _encode_chunk(chunk, serializer_class, context, first):
+    data = serializer_class(chunk, many=True, context=context or {}).data
+    encoded = ",".join(
+        json.dumps(item, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":"))
+        for item in data
+    )
+    return encoded if first else "," + encoded
+
+
+def streaming_json_response(queryset, serializer_class, context=None, chunk_size=500):
+    """StreamingHttpResponse with the queryset serialized as a JSON array"""
+    return StreamingHttpResponse(
+        stream_json(queryset, serializer_class, context, chunk_size),
+        content_type="application/json",
+    )
@@ -7,7 +7,9 @@ from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import api_view, action
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from django.conf import settings
 from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 from django.utils.crypto import get_random_string
@@ -30,10 +32,14 @@ from api.serializers import (
     ProductSerializer,
     ProductBuyedSerializer,
     ProductReceivedSerializer,
+    ProductDeliverySerializer,
     PackageSerializer,
     DeliverReceipSerializer,
+    AgentCommissionSerializer,
+    EvidenceImagesSerializer,
 )
 from api.models import (
+    AgentCommission,
     Order,
     ProductBuyed,
     Shop,
@@ -45,6 +51,7 @@ from api.models import (
     Package,
     DeliverReceip,
     EvidenceImages,
+    OutboxEmail,
 )
 from api.filters import (
     DeliverReceipFilter,
@@ -54,10 +61,33 @@ from api.filters import (
     ShoppingReceipFilter,
     UserFilter,
 )
-from api.utils.email_sender import send_email
+from api.permissions.roles import get_user_roles
+from api.utils.accounting_export import csv_lines, order_totals_rows
+from api.utils.agent_commissions import compute_commissions
+from api.utils.conditional_get import (
+    not_modified_response,
+    set_validators,
+    validators,
+)
+from api.utils.db_routing import read_from_replicas
+from api.utils.email_outbox import queue_email
+from api.utils.filter_cache import (
+    bump_model_versions_on_commit,
+    cached_filter,
+    track_model_versions,
+)
+from api.utils.image_uploads import (
+    create_pending_image,
+    destroy_image,
+    destroy_uploaded,
+    upload_batch,
+    upload_now,
+)
+from api.utils.product_status import update_product_statuses
+from api.utils.report_rollups import parse_month, rollup_report
+from api.utils.streaming import is_stream_request, streaming_json_response
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
-import cloudinary.uploader
 
 User = get_user_model()
 
@@ -85,34 +115,59 @@ class Protection(APIView):
         raise ValidationError({"message": "no_request"})
 
 
+class ReplicaReadMixin:
+    """
+    Let list, retrieve and *_filter actions, the actions in
+    `replica_actions` and the GET of plain views read from the replicas
+    once authentication and permission checks have read from the primary.
+    Anything the request writes sends its later reads back to the primary.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def reads_from_replica(self, request):
+        action = getattr(self, "action", None)
+        if action is None:
+            return request.method in ("GET", "HEAD")
+        return action in self.replica_actions or action.endswith("_filter")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.reads_from_replica(request):
+            read_from_replicas()
+
+
 # UserManagement
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     "Vista de usuario"
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticatedOrReadOnly | ReadOnlyorPost]
+    keyset_ordering = ("-date_joined", "-id")
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        try:
-            verify_secret = get_random_string(length=32)
-            send_email(
-                self.request.data["name"], self.request.data["email"], verify_secret
-            )
-        except Exception as e:
-            raise ValidationError({"error": str(e)}) from e
-        return serializer.save(
+        verify_secret = get_random_string(length=32)
+        user = serializer.save(
             verification_secret=verify_secret,
             sent_verification_email=True,
         )
+        # El worker send_outbox_emails lo envía tras el commit
+        queue_email(
+            OutboxEmail.VERIFICATION,
+            user.email,
+            user_name=self.request.data["name"],
+            verification_url=f"{settings.VERIFICATION_URL}{verify_secret}",
+        )
+        return user
 
     @action(detail=False, methods=["get"], permission_classes=[ReadOnly])
     def do_something(self, request):
         try:
-            for i in Product.objects.all():
-                i.set_status_aut()
+            update_product_statuses()
             return Response(status=status.HTTP_200_OK)
         except:
             raise ValidationError("fuuuuck")
@@ -121,8 +176,9 @@ class UserViewSet(viewsets.ModelViewSet):
     def user_filter(self, request):
         try:
             user_filtered = UserFilter(request.data, queryset=User.objects.all())
-            user_serialized = UserSerializer(user_filtered.qs, many=True)
-            return Response(user_serialized.data, status=status.HTTP_200_OK)
+            page = self.paginate_queryset(user_filtered.qs)
+            user_serialized = UserSerializer(page, many=True)
+            return self.get_paginated_response(user_serialized.data)
         except Exception as e:
             raise ValidationError({"message": "Error al filtrar usuarios"}) from e
 
@@ -134,17 +190,21 @@ class PasswordRecoverList(APIView):
         "Sender email password"
         password_secret = get_random_string(length=32)
         try:
-            user = User.objects.get(email=request.data["email"])
-            user.password_secret = password_secret
-            user.save()
-            print(
-                f"Porfavor ve a <a href='http://localhost:5173/recover-password/{password_secret}'>este link</a> para vambiar tu contraseña."
-            )
+            with transaction.atomic():
+                user = User.objects.get(email=request.data["email"])
+                user.password_secret = password_secret
+                user.save()
+                queue_email(
+                    OutboxEmail.PASSWORD_RECOVERY,
+                    user.email,
+                    user_name=user.name,
+                    recovery_url=f"{settings.PASSWORD_RECOVERY_URL}{password_secret}",
+                )
             return Response(
                 {"message": "Password recuperado"}, status=status.HTTP_200_OK
             )
         except Exception as e:
-            raise ValidationError({"message": "Email no existe" + e}) from e
+            raise ValidationError({"message": "Email no existe"}) from e
 
     def put(self, request, password_secret=None):
         """Update password"""
@@ -169,27 +229,163 @@ def verify_user(request, verification_secret):
     raise ValidationError({"message": "no_request"})
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class ConditionalGetMixin:
+    """
+    Answer list and detail requests with ETag and Last-Modified validators and
+    return 304 Not Modified, without serializing, when the client copy is
+    current. Models whose rows are serialized along with the view's go in
+    `conditional_models`.
+    """
+
+    conditional_models = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        track_model_versions(*cls.conditional_models)
+
+    def get_conditional_queryset(self):
+        """Rows behind a detail response"""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return self.get_queryset().filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+
+    def conditional_response(self, queryset, view_method, request, *args, **kwargs):
+        etag, last_modified = validators(request, queryset, self.conditional_models)
+        # Con dependencias o en listas, la fecha no ve cambios ni borrados ajenos
+        use_last_modified = not self.conditional_models and self.detail
+        response = not_modified_response(
+            request, etag, last_modified, use_last_modified
+        )
+        if response is None:
+            response = view_method(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return set_validators(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(
+            queryset, super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_conditional_queryset(), super().retrieve, request, *args, **kwargs
+        )
+
+
+class StreamingExportMixin:
+    """Stream list and filter responses as JSON when called with ?stream=true"""
+
+    stream_chunk_size = 500
+
+    def stream_response(self, queryset, context=None):
+        ordering = self.paginator.get_ordering(self.request, self)
+        return streaming_json_response(
+            queryset.order_by(*ordering),
+            self.get_serializer_class(),
+            context if context is not None else self.get_serializer_context(),
+            self.stream_chunk_size,
+        )
+
+    def list(self, request, *args, **kwargs):
+        if is_stream_request(request):
+            return self.stream_response(self.filter_queryset(self.get_queryset()))
+        return super().list(request, *args, **kwargs)
+
+
+class OrderViewSet(
+    ReplicaReadMixin,
+    ConditionalGetMixin,
+    StreamingExportMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Order.objects.all().prefetch_related("delivery_receipts", "products")
     serializer_class = OrderSerializer
     permission_classes = [AgentPermission & (IsAuthenticated | ReadOnlyorPost)]
+    conditional_models = (
+        User,
+        Shop,
+        Product,
+        ProductBuyed,
+        ProductReceived,
+        DeliverReceip,
+        CommonInformation,
+        EvidenceImages,
+    )
+    keyset_ordering = ("-creation_date", "-id")
+    keyset_orderings = {
+        "total_cost": ("products_total_cost", "id"),
+        "-total_cost": ("-products_total_cost", "-id"),
+    }
+    graph_actions = ("list", "retrieve")
+    replica_actions = ("list", "retrieve", "accounting_export")
+
+    def get_queryset(self):
+        if self.action in self.graph_actions:
+            return Order.objects.with_related_graph()
+        return super().get_queryset()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in self.graph_actions:
+            context.update(OrderSerializer.graph_context())
+        return context
 
     def perform_create(self, serializer):
         user = User.objects.get(id=self.request.user.id)
         return serializer.save(sales_manager=user)
 
     @action(detail=False, methods=["post"], permission_classes=[ReadOnly])
+    @cached_filter(
+        Order,
+        User,
+        Product,
+        Shop,
+        ProductBuyed,
+        ProductReceived,
+        DeliverReceip,
+        CommonInformation,
+        EvidenceImages,
+    )
     def order_filter(self, request):
         """Filtrar ordenes"""
         try:
-            order_filtered = OrderFilter(request.data, queryset=Order.objects.all())
-            order_serialized = OrderSerializer(order_filtered.qs, many=True)
-            return Response(order_serialized.data, status=status.HTTP_200_OK)
+            order_filtered = OrderFilter(
+                request.data, queryset=Order.objects.with_related_graph()
+            )
+            if is_stream_request(request):
+                return self.stream_response(
+                    order_filtered.qs, OrderSerializer.graph_context()
+                )
+            page = self.paginate_queryset(order_filtered.qs)
+            order_serialized = OrderSerializer(
+                page, many=True, context=OrderSerializer.graph_context()
+            )
+            return self.get_paginated_response(order_serialized.data)
+        except Exception as e:
+            raise ValidationError({"message": f"{e}"}) from e
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[AccountantPermission | AdminPermission],
+    )
+    def accounting_export(self, request):
+        """Totales contables por pedido en CSV"""
+        try:
+            orders = OrderFilter(request.query_params, queryset=Order.objects.all()).qs
+            response = StreamingHttpResponse(
+                csv_lines(order_totals_rows(orders)), content_type="text/csv"
+            )
         except Exception as e:
             raise ValidationError({"message": f"{e}"}) from e
+        response["Content-Disposition"] = 'attachment; filename="pedidos.csv"'
+        return response
 
 
-class ShopViewSet(viewsets.ModelViewSet):
+class ShopViewSet(ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Shop.objects.all()
     serializer_class = ShopSerializer
     permission_classes = [ReadOnly | AdminPermission]
@@ -203,13 +399,17 @@ class ShopViewSet(viewsets.ModelViewSet):
         return shop
 
 
-class BuyingAccountsViewsSet(viewsets.ModelViewSet):
+class BuyingAccountsViewsSet(
+    ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet
+):
     queryset = BuyingAccounts.objects.all()
     serializer_class = BuyingAccountsSerializer
     permission_classes = [ReadOnly | AdminPermission]
 
 
-class CommonInformationViewSet(viewsets.ModelViewSet):
+class CommonInformationViewSet(
+    ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet
+):
     queryset = CommonInformation.objects.all()
     serializer_class = CommonInformationSerializer
     permission_classes = [ReadOnly | AdminPermission]
@@ -217,57 +417,101 @@ class CommonInformationViewSet(viewsets.ModelViewSet):
     def get_object(self):
         return CommonInformation.get_instance()
 
+    def get_conditional_queryset(self):
+        # Siempre se responde con la única instancia, sea cual sea el id
+        return self.get_queryset()
+
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+class ProductViewSet(
+    ReplicaReadMixin,
+    ConditionalGetMixin,
+    StreamingExportMixin,
+    viewsets.ModelViewSet,
+):
+    queryset = Product.objects.select_related("shop", "order").prefetch_related(
+        "product_pictures"
+    )
     serializer_class = ProductSerializer
     permission_classes = [ReadOnly | AgentPermission]
+    conditional_models = (Shop, EvidenceImages)
+    keyset_ordering = ("id",)
 
     @action(detail=False, methods=["post"], permission_classes=[ReadOnlyorPost])
+    @cached_filter(Product, Order, Shop, EvidenceImages)
     def product_filter(self, request):
         """Filtrar productos"""
         try:
-            product_filtered = ProductFilter(
-                request.data, queryset=Product.objects.all()
-            )
-            product_serialized = ProductSerializer(product_filtered.qs, many=True)
+            product_filtered = ProductFilter(request.data, queryset=self.queryset.all())
+            if is_stream_request(request):
+                return self.stream_response(product_filtered.qs)
+            if request.data.get("q"):
+                # La búsqueda ya viene ordenada por relevancia y limitada
+                product_serialized = ProductSerializer(product_filtered.qs, many=True)
+                return Response(
+                    {"next": None, "previous": None, "results": product_serialized.data}
+                )
+            page = self.paginate_queryset(product_filtered.qs)
+            product_serialized = ProductSerializer(page, many=True)
 
-            return Response(product_serialized.data, status=status.HTTP_200_OK)
+            return self.get_paginated_response(product_serialized.data)
         except Exception as e:
             raise ValidationError({"message": f"{e}"}) from e
 
 
-class ShoppingReceipViewSet(viewsets.ModelViewSet):
-    queryset = ShoppingReceip.objects.all()
+class ShoppingReceipViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    queryset = ShoppingReceip.objects.with_related_graph()
     serializer_class = ShoppingReceipSerializer
     permission_classes = [ReadOnly | BuyerPermission]
+    keyset_ordering = ("-buy_date", "-id")
 
     def create(self, request, *args, **kwargs):
         with transaction.atomic():
             if "shopping_account" in request.data and "shop_of_buy" in request.data:
                 serializer = ShoppingReceipSerializer(data=request.data)
                 serializer.is_valid(raise_exception=True)
-                serializer.save()
+                receip = serializer.save()
                 try:
                     if "buyed_products" in request.data:
                         for product in request.data["buyed_products"]:
-                            product["shoping_receip"] = serializer.data["id"]
-                            product_serializer = ProductBuyedSerializer(data=product)
-                            product_serializer.is_valid(raise_exception=True)
-                            product_serializer.save()
-                            Product.objects.get(
-                                id=product["original_product"]
-                            ).set_status_aut()
-                    return Response(serializer.data, status=status.HTTP_201_CREATED)
+                            product["shoping_receip"] = receip.id
+                        product_serializer = ProductBuyedSerializer(
+                            data=request.data["buyed_products"], many=True
+                        )
+                        product_serializer.is_valid(raise_exception=True)
+                        buys = product_serializer.save()
+                        update_product_statuses(
+                            {buy.original_product_id for buy in buys}
+                        )
+                except ValidationError as e:
+                    raise ValidationError(
+                        {
+                            "message": "Error al procesar productos",
+                            "buyed_products": e.detail,
+                        }
+                    ) from e
                 except Exception as e:
                     raise ValidationError(
                         f"Error al procesar productos: {str(e)}"
                     ) from e
+                receip = self.get_queryset().get(id=receip.id)
+                return Response(
+                    ShoppingReceipSerializer(receip).data,
+                    status=status.HTTP_201_CREATED,
+                )
             return Response(
                 {"message": "Faltan datos"}, status=status.HTTP_400_BAD_REQUEST
             )
 
     @action(detail=False, methods=["post"], permission_classes=[ReadOnlyorPost])
+    @cached_filter(
+        ShoppingReceip,
+        ProductBuyed,
+        Product,
+        BuyingAccounts,
+        Shop,
+        EvidenceImages,
+        User,
+    )
     def shopping_reciep_filter(self, request):
         """Filtrar recibos de compra"""
         try:
@@ -292,23 +536,50 @@ class ShoppingReceipViewSet(viewsets.ModelViewSet):
                         )
             shopping_receip_filtered = ShoppingReceipFilter(
                 request.data,
-                queryset=ShoppingReceip.objects.all(),
-            )
-            shopping_receip_serialized = ShoppingReceipSerializer(
-                shopping_receip_filtered.qs, many=True
+                queryset=ShoppingReceip.objects.with_related_graph(),
             )
-            return Response(shopping_receip_serialized.data, status=status.HTTP_200_OK)
+            page = self.paginate_queryset(shopping_receip_filtered.qs)
+            shopping_receip_serialized = ShoppingReceipSerializer(page, many=True)
+            return self.get_paginated_response(shopping_receip_serialized.data)
         except Exception as e:
             raise ValidationError({"message": f"{e}"}) from e
 
 
-class ProductBuyedViewSet(viewsets.ModelViewSet):
+class ProductStatusMixin:
+    """Recompute product statuses after buys or receptions change"""
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        serializer.save()
+        update_product_statuses([serializer.instance.original_product_id])
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        previous_product_id = serializer.instance.original_product_id
+        serializer.save()
+        update_product_statuses(
+            [previous_product_id, serializer.instance.original_product_id]
+        )
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        product_id = instance.original_product_id
+        instance.delete()
+        update_product_statuses([product_id])
+
+
+class ProductBuyedViewSet(
+    ReplicaReadMixin, ProductStatusMixin, viewsets.ModelViewSet
+):
     queryset = ProductBuyed.objects.all()
     serializer_class = ProductBuyedSerializer
     permission_classes = [ReadOnly | AccountantPermission]
+    keyset_ordering = ("-buy_date", "-id")
 
 
-class ProductReceivedViewSet(viewsets.ModelViewSet):
+class ProductReceivedViewSet(
+    ReplicaReadMixin, ProductStatusMixin, viewsets.ModelViewSet
+):
     queryset = ProductReceived.objects.all()
     serializer_class = ProductReceivedSerializer
     permission_classes = [ReadOnly | LogisticalPermission]
@@ -324,54 +595,72 @@ class ProductReceivedViewSet(viewsets.ModelViewSet):
                         product["package_where_was_send"] = request.data[
                             "package_where_was_send"
                         ]
-                        product_serializer = ProductReceivedSerializer(data=product)
-                        product_serializer.is_valid(raise_exception=True)
-                        product_serializer.save()
-                        Product.objects.get(
-                            id=product["original_product"]
-                        ).set_status_aut()
+                    product_serializer = ProductReceivedSerializer(
+                        data=contained_products, many=True
+                    )
+                    product_serializer.is_valid(raise_exception=True)
+                    receptions = product_serializer.save()
+                    update_product_statuses(
+                        {reception.original_product_id for reception in receptions}
+                    )
                 return Response(
                     {"Message": "Product Creation success"},
                     status=status.HTTP_201_CREATED,
                 )
+            except ValidationError as e:
+                raise ValidationError(
+                    {
+                        "message": "Error al procesar productos",
+                        "contained_products": e.detail,
+                    }
+                ) from e
             except Exception as e:
                 raise ValidationError(f"Error al procesar productos: {str(e)}") from e
 
     @action(detail=False, methods=["patch"], permission_classes=[IsAuthenticated])
     def deliver_products(self, request):
+        if not "delivered_products" in request.data or (
+            not "deliver_receip" in request.data
+            or "package_where_was_send" in request.data
+        ):
+            raise ValidationError(
+                "Error al procesar productos: Argumentos incompletos o incorrectos"
+            )
         with transaction.atomic():
             try:
-                if "delivered_products" in request.data and (
-                    "deliver_receip" in request.data
-                    and not "package_where_was_send" in request.data
-                ):
-                    delivered_products = request.data["delivered_products"]
-                    for product in delivered_products:
-                        instance = ProductReceived.objects.get(id=product["id"])
-                        product["deliver_receip"] = request.data["deliver_receip"]
-                        product_serializer = ProductReceivedSerializer(
-                            instance, data=product, partial=True
-                        )
-                        product_serializer.is_valid(raise_exception=True)
-                        product_serializer.save()
-                        Product.objects.get(
-                            id=instance.original_product["id"]
-                        ).set_status_aut()
-                    return Response(
-                        {"Message": "Product Creation success"},
-                        status=status.HTTP_201_CREATED,
-                    )
-                raise ValidationError("Argumentos incompletos o incorrectos")
+                deliver_receip = DeliverReceip.objects.get(
+                    id=request.data["deliver_receip"]
+                )
+                product_serializer = ProductDeliverySerializer(
+                    data=request.data["delivered_products"], many=True
+                )
+                product_serializer.is_valid(raise_exception=True)
+                receptions = product_serializer.save(deliver_receip=deliver_receip)
+                update_product_statuses(
+                    {reception.original_product_id for reception in receptions}
+                )
+                return Response(
+                    {"Message": "Product Creation success"},
+                    status=status.HTTP_201_CREATED,
+                )
+            except ValidationError as e:
+                raise ValidationError(
+                    {
+                        "message": "Error al procesar productos",
+                        "delivered_products": e.detail,
+                    }
+                ) from e
             except Exception as e:
                 raise ValidationError(f"Error al procesar productos: {str(e)}") from e
 
 
-class PackageViewSet(viewsets.ModelViewSet):
+class PackageViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Package.objects.all()
     serializer_class = PackageSerializer
     permission_classes = [ReadOnly | LogisticalPermission]
 
     @action(detail=False, methods=["post"], permission_classes=[ReadOnlyorPost])
+    @cached_filter(Package, ProductReceived, Product, Shop, EvidenceImages)
     def package_filter(self, request):
         """Filtrar paquetes"""
         try:
@@ -398,34 +687,117 @@ class PackageViewSet(viewsets.ModelViewSet):
                 request.data,
                 queryset=Package.objects.all(),
             )
-            package_serialized = PackageSerializer(package_filtered.qs, many=True)
-            return Response(package_serialized.data, status=status.HTTP_200_OK)
+            page = self.paginate_queryset(package_filtered.qs)
+            package_serialized = PackageSerializer(page, many=True)
+            return self.get_paginated_response(package_serialized.data)
         except Exception as e:
             raise ValidationError({"message": f"{e}"}) from e
 
 
-class DeliverReceipViewSet(viewsets.ModelViewSet):
+class DeliverReceipViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = DeliverReceip.objects.all()
     serializer_class = DeliverReceipSerializer
     permission_classes = [ReadOnly | LogisticalPermission]
+    keyset_ordering = ("-deliver_date", "-id")
 
     @action(detail=False, methods=["post"], permission_classes=[ReadOnlyorPost])
+    @cached_filter(
+        DeliverReceip,
+        Order,
+        User,
+        ProductReceived,
+        Product,
+        Shop,
+        CommonInformation,
+        EvidenceImages,
+    )
     def deliver_reciep_filter(self, request):
         """Filtrar recibos de entrega"""
         try:
             deliver_receip_filtered = DeliverReceipFilter(
                 request.data, queryset=DeliverReceip.objects.all()
             )
-            deliver_receip_serialized = DeliverReceipSerializer(
-                deliver_receip_filtered.qs, many=True
-            )
+            page = self.paginate_queryset(deliver_receip_filtered.qs)
+            deliver_receip_serialized = DeliverReceipSerializer(page, many=True)
 
-            return Response(deliver_receip_serialized.data, status=status.HTTP_200_OK)
+            return self.get_paginated_response(deliver_receip_serialized.data)
         except Exception as e:
             raise ValidationError({"message": f"{e}"}) from e
 
 
+class AgentCommissionViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    """Comisiones mensuales de los agentes"""
+
+    queryset = AgentCommission.objects.all()
+    serializer_class = AgentCommissionSerializer
+    permission_classes = [AgentPermission | AccountantPermission | AdminPermission]
+    keyset_ordering = ("-period", "-id")
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        roles = get_user_roles(self.request)
+        if not (roles["is_accountant"] or roles["is_staff"]):
+            # Cada agente solo ve sus propias comisiones
+            queryset = queryset.filter(agent_id=self.request.user.id)
+        params = self.request.query_params
+        try:
+            if "agent" in params:
+                queryset = queryset.filter(agent_id=int(params["agent"]))
+            if "start" in params:
+                queryset = queryset.filter(period__gte=parse_month(params["start"]))
+            if "end" in params:
+                queryset = queryset.filter(period__lte=parse_month(params["end"]))
+        except ValueError as e:
+            raise ValidationError({"message": str(e)}) from e
+        return queryset
+
+    @action(
+        detail=False,
+        methods=["post"],
+        permission_classes=[AccountantPermission | AdminPermission],
+    )
+    def compute(self, request):
+        """Recalcular las comisiones de los pedidos que cambiaron"""
+        created, updated, deleted = compute_commissions(
+            full=bool(request.data.get("full"))
+        )
+        return Response({"created": created, "updated": updated, "deleted": deleted})
+
+
+class ReportRollupView(ReplicaReadMixin, APIView):
+    """Gastos e ingresos por tienda, cuenta de compra, agente y mes"""
+
+    permission_classes = [AccountantPermission | AdminPermission]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            report = rollup_report(
+                params.get("dimension", "total"),
+                start=parse_month(params["start"]) if "start" in params else None,
+                end=parse_month(params["end"]) if "end" in params else None,
+                by_period=params.get("group", "period") != "key",
+            )
+        except ValueError as e:
+            raise ValidationError({"message": str(e)}) from e
+        return Response({"results": report})
+
+
 class ImageUploadApiView(APIView):
+    def get(self, request, pk=None):
+        """Upload state of one image, or of the images in ?ids=1,2,3"""
+        if pk is not None:
+            images = EvidenceImages.objects.filter(pk=pk)
+            if not images:
+                raise ValidationError(f"La imagen {pk} no existe.")
+            return Response(EvidenceImagesSerializer(images[0]).data)
+        try:
+            ids = [int(value) for value in request.query_params["ids"].split(",")]
+        except (KeyError, ValueError) as e:
+            raise ValidationError("Indique los ids de las imágenes: ?ids=1,2,3") from e
+        images = EvidenceImages.objects.filter(pk__in=ids).order_by("pk")
+        return Response(EvidenceImagesSerializer(images, many=True).data)
+
     def post(self, request):
         if "image" in request.FILES:
             picture = request.FILES.get("image")
@@ -433,28 +805,110 @@ class ImageUploadApiView(APIView):
                 raise ValidationError(
                     "El archivo debe ser una imagen (.png, .jpg, .jpeg)."
                 )
+            if request.query_params.get("async") == "true":
+                # Se sube en segundo plano; el cliente consulta el estado
+                image = create_pending_image(picture)
+                return Response(
+                    EvidenceImagesSerializer(image).data,
+                    status=status.HTTP_202_ACCEPTED,
+                )
             try:
-                upload_result = cloudinary.uploader.upload(picture, quality=10)
-                print(upload_result)
-                image_url = upload_result["secure_url"]
+                image = upload_now(picture)
             except Exception as e:
                 raise ValidationError(str(e)) from e
-            image = EvidenceImages(
-                image_url=image_url, public_id=upload_result["public_id"]
-            )
-            image.save()
             return Response(
-                {"image_url": image_url, "public_id": upload_result["public_id"]},
+                {
+                    "image_url": image.image_url,
+                    "public_id": image.public_id,
+                    "thumbnail_url": image.thumbnail_url,
+                },
                 status=status.HTTP_201_CREATED,
             )
 
     def delete(self, request):
         if "public_id" in request.data:
             try:
-                EvidenceImages.objects.get(public_id=request.data["public_id"]).delete()
-                destroy_result = cloudinary.uploader.destroy(request.data["public_id"])
+                image = EvidenceImages.objects.get(public_id=request.data["public_id"])
+                destroy_result = destroy_image(image)
             except Exception as e:
                 raise ValidationError(str(e)) from e
             return Response(
                 {"destroy result": destroy_result}, status=status.HTTP_200_OK
             )
+
+
+class ImageBatchUploadApiView(APIView):
+    """Upload many images in one request, optionally attaching them"""
+
+    permission_classes = [LogisticalPermission | AdminPermission]
+    targets = {
+        "package": (Package, "package_picture"),
+        "deliver_receip": (DeliverReceip, "deliver_picture"),
+    }
+
+    def get_target(self, request):
+        """Package or delivery receipt the images are attached to, if any"""
+        chosen = [name for name in self.targets if request.data.get(name)]
+        if not chosen:
+            return None, None
+        if len(chosen) > 1:
+            raise ValidationError(
+                "Indique un paquete o un recibo de entrega, no ambos."
+            )
+        model, field = self.targets[chosen[0]]
+        value = request.data[chosen[0]]
+        try:
+            target = model.objects.filter(pk=value).first()
+        except (TypeError, ValueError):
+            target = None
+        if target is None:
+            raise ValidationError(f"El {chosen[0]} {value} no existe.")
+        return target, field
+
+    def post(self, request):
+        pictures = request.FILES.getlist("images")
+        if not pictures:
+            raise ValidationError("Adjunte las imágenes en el campo images.")
+        if len(pictures) > settings.IMAGE_BATCH_MAX_FILES:
+            raise ValidationError(
+                f"No se pueden subir más de {settings.IMAGE_BATCH_MAX_FILES} "
+                "imágenes a la vez."
+            )
+        target, field = self.get_target(request)
+
+        results = [{"name": picture.name} for picture in pictures]
+        valid = []
+        for result, picture in zip(results, pictures):
+            if picture.name.lower().endswith((".png", ".jpg", ".jpeg")):
+                valid.append((result, picture))
+            else:
+                result["error"] = "El archivo debe ser una imagen (.png, .jpg, .jpeg)."
+
+        uploads = upload_batch([picture for _result, picture in valid])
+        created = []
+        for (result, _picture), upload in zip(valid, uploads):
+            if isinstance(upload, Exception):
+                result["error"] = str(upload)
+            else:
+                created.append((result, EvidenceImages(**upload)))
+
+        try:
+            with transaction.atomic():
+                images = EvidenceImages.objects.bulk_create(
+                    [image for _result, image in created]
+                )
+                if target is not None and images:
+                    getattr(target, field).add(*images)
+                bump_model_versions_on_commit(EvidenceImages)
+        except Exception:
+            # Sin registros que las referencien, las subidas quedarían huérfanas
+            destroy_uploaded(
+                [upload for upload in uploads if not isinstance(upload, Exception)]
+            )
+            raise
+        for result, image in created:
+            result.update(EvidenceImagesSerializer(image).data)
+        return Response(
+            results,
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )